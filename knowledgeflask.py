@@ -0,0 +1,6604 @@
+"""
+KnowledgeFlask: Agenten mit versionierten Wissensbasen verwalten und durchsuchen (CLI, Server und Python-API).
+"""
+import argparse
+import bisect
+import functools
+import heapq
+import importlib
+import itertools
+import math
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from contextlib import closing, contextmanager, redirect_stdout
+from typing import TYPE_CHECKING
+
+try:
+    import fcntl # Prozessübergreifende Sperren (nur unter Unix verfügbar)
+except ImportError:
+    fcntl = None
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+class _LazyModule:
+    """
+    Platzhalter für ein Modul, das erst beim ersten Attributzugriff importiert wird.
+    Danach ersetzt er sich im Modul-Namensraum durch das echte Modul.
+    """
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attribute: str):
+        module = importlib.import_module(self._name)
+        globals()[self._name] = module
+        return getattr(module, attribute)
+
+# Nicht jeder Befehl braucht diese Module; 'agent list' z.B. keines davon (siehe 'startup-check')
+asyncio = _LazyModule("asyncio") # Nur für AsyncKnowledgeFlask
+datetime = _LazyModule("datetime")
+hashlib = _LazyModule("hashlib")
+json = _LazyModule("json")
+mmap = _LazyModule("mmap")
+platform = _LazyModule("platform")
+random = _LazyModule("random")
+shutil = _LazyModule("shutil")
+signal = _LazyModule("signal")
+sqlite3 = _LazyModule("sqlite3")
+tempfile = _LazyModule("tempfile")
+uuid = _LazyModule("uuid") # Für eindeutige Versions-IDs
+zipfile = _LazyModule("zipfile") # Nur für das Versionsarchiv
+
+# --- 0. Konfiguration und Konstanten ---
+# Basisverzeichnis für KnowledgeFlask-Daten
+# Standardmäßig im Benutzer-Home-Verzeichnis unter .knowledge_flask
+# Kann auch manuell gesetzt werden, z.B. os.path.join(os.getcwd(), "knowledge_flask_data")
+KNOWLEDGE_FLASK_BASE_DIR = os.path.join(os.path.expanduser("~"), ".knowledge_flask")
+
+AGENTS_DIR_NAME = "agents"
+AGENT_NAME_PATTERN = re.compile(r"[\w.-]+") # Erlaubte Agentennamen (werden zu Verzeichnisnamen)
+KNOWLEDGE_FILE_NAME = "knowledge.json"
+KNOWLEDGE_LOG_FILE_NAME = "knowledge.log.jsonl" # Append-only Segment-Log für neue Elemente
+KNOWLEDGE_INDEX_FILE_NAME = "knowledge.idx" # Persistierter Hash-Index (ein Digest pro Zeile)
+CHUNK_SOURCES_FILE_NAME = "chunk_sources.jsonl" # Herkunft importierter Chunks (Digest, Datei, Zeichen-Offsets)
+ROW_OFFSETS_FILE_NAME = "knowledge.offsets" # Byte-Offsets der Elementzeilen im Snapshot (uint64)
+ROW_OFFSETS_HEADER = struct.Struct("<QQQ") # Inode, Größe und mtime des Snapshots, zu dem die Offsets gehören
+# Alternatives Binärformat für den Snapshot (ersetzt knowledge.json, falls vorhanden)
+BINARY_KNOWLEDGE_FILE_NAME = "knowledge.bin"
+BINARY_STORE_MAGIC = b"KFBIN001"
+BINARY_STORE_HEADER = struct.Struct("<8sIIQQ") # Magic, Codec, Elemente pro Block, Elementanzahl, Offset der Blocktabelle
+BINARY_STORE_BLOCK_ITEMS = 256 # Elemente pro (einzeln komprimiertem) Block
+BINARY_CODECS = ("none", "zlib", "zstd")
+DEFAULT_BINARY_CODEC = "zlib"
+STORAGE_FORMATS = ("json", "binary")
+# Ab dieser Loggröße wird das Segment-Log in den Snapshot (knowledge.json) gefaltet
+KNOWLEDGE_LOG_COMPACTION_BYTES = 4 * 1024 * 1024
+IMPORT_FORMATS = ("auto", "jsonl", "text", "dir")
+CHUNK_STRATEGIES = ("fixed", "sentence", "heading")
+DEFAULT_CHUNK_STRATEGY = "sentence"
+DEFAULT_CHUNK_SIZE = 1000 # Maximale Zeichen je Chunk
+DEFAULT_CHUNK_OVERLAP = 100 # Zeichen, die ein Chunk höchstens mit seinem Vorgänger teilt
+DEFAULT_CHUNK_BATCH_SIZE = 500 # Chunks je Schreibvorgang
+CHUNK_READ_SIZE = 64 * 1024 # Zeichen je Leseblock
+GET_FORMATS = ("text", "jsonl")
+LOCK_FILE_NAME = ".lock" # Sperrdatei für fcntl.flock im Agentenverzeichnis
+INVERTED_INDEX_FILE_NAME = "inverted_index.sqlite"
+EMBEDDINGS_FILE_NAME = "embeddings.npy" # float32-Matrix (Elemente x Dimension), per mmap gelesen
+EMBEDDINGS_META_FILE_NAME = "embeddings.meta.json"
+NEAR_DUPLICATE_INDEX_FILE_NAME = "near_duplicates.sqlite" # LSH-Buckets (MinHash-Bänder) für Beinahe-Duplikate
+NEAR_DUPLICATE_CONFIG_FILE_NAME = "near_duplicates.config.json" # Modus und Schwellwert; fehlt sie, ist die Prüfung aus
+QUERY_CACHE_FILE_NAME = "query_cache.sqlite" # Optionale Platten-Stufe des Abfrage-Caches
+QUERY_CACHE_DIR_NAME = "query_cache" # Backend 'sqlite': je Agent ein Verzeichnis für query_cache.sqlite
+VERSION_CHUNK_MAP_FILE_NAME = "version_chunks.json" # Chunk-Plan des Snapshots für 'version diff ... live'
+# Abgeleitete Indizes, die ungültig werden, wenn der Snapshot ersetzt wird
+DERIVED_INDEX_FILE_NAMES = (
+    INVERTED_INDEX_FILE_NAME, EMBEDDINGS_FILE_NAME, EMBEDDINGS_META_FILE_NAME, NEAR_DUPLICATE_INDEX_FILE_NAME,
+    QUERY_CACHE_FILE_NAME, VERSION_CHUNK_MAP_FILE_NAME,
+)
+BM25_K1 = 1.5
+BM25_B = 0.75
+DEFAULT_TOP_K = 5
+QUERY_MODES = ("bm25", "dense")
+QUERY_CACHE_MODES = ("off", "memory", "disk")
+DEFAULT_QUERY_CACHE_MODE = "memory"
+QUERY_CACHE_MAX_ENTRIES = 1024 # Einträge im Speicher (LRU über alle Agenten)
+QUERY_CACHE_DISK_MAX_ENTRIES = 10000 # Einträge je Agent in query_cache.sqlite
+DEFAULT_EMBEDDER = "hashing"
+DEFAULT_EMBEDDING_DIMENSION = 256
+EMBEDDING_BATCH_SIZE = 4096 # Elemente pro Embedding-Batch beim Nachführen der Matrix
+EMBEDDING_SEARCH_BLOCK_ROWS = 65536 # Matrixzeilen pro Matrix-Vektor-Produkt bei der Suche
+NPY_HEADER_SIZE = 128 # Fester .npy-Header, damit die Zeilenzahl in-place aktualisiert werden kann
+NEAR_DUPLICATE_MODES = ("off", "flag", "skip") # Verhalten beim Hinzufügen: aus, nur melden, überspringen
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.8 # Jaccard-Ähnlichkeit der Shingles
+NEAR_DUPLICATE_SHINGLE_SIZE = 5 # Zeichen-n-Gramme über den normalisierten Text
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4 # MINHASH_BANDS * MINHASH_ROWS Bins pro Signatur (One-Permutation-Hashing)
+NEAR_DUPLICATE_MAX_CANDIDATES = 50 # Kandidaten, die pro Element exakt verglichen werden
+
+# Servermodus
+DEFAULT_SERVER_HOST = "127.0.0.1"
+DEFAULT_SERVER_PORT = 8765
+DEFAULT_SERVER_WORKERS = 8
+DEFAULT_SERVER_MEMORY_BUDGET_MB = 512 # Speicherbudget für im Speicher gehaltene Agenten
+
+# Flottenoperationen über alle Agenten (Prozesspool)
+FLEET_OPERATIONS = ("stats", "snapshot", "reindex", "verify")
+DEFAULT_FLEET_WORKERS = os.cpu_count() or 1
+
+# Geteilte Wissensbasen sehr großer Agenten (Shards unter <Agent>/shards/<Nummer>)
+SHARDS_DIR_NAME = "shards"
+SHARD_CONFIG_FILE_NAME = "shards.json" # Modus und Größe; fehlt sie, ist die Wissensbasis nicht geteilt
+SHARD_MODES = ("hash", "range") # Nach Digest verteilen bzw. Shards der Reihe nach auffüllen
+DEFAULT_SHARD_MODE = "hash"
+DEFAULT_SHARD_SIZE = 250000 # Elemente je Shard im Modus 'range'
+DEFAULT_SHARD_WORKERS = os.cpu_count() or 1
+SHARD_SPILL_FILE_NAME = "bulk_import.jsonl.tmp" # Zwischendatei je Shard beim Massenimport
+
+# Instrumentierung (--profile, --metrics-file, GET /metrics)
+METRICS_PREFIX = "knowledgeflask" # Präfix der Prometheus-Metriken
+
+# Benchmark-Suite (synthetische Korpora in einem temporären Basisverzeichnis)
+BENCH_OPERATIONS = (
+    "add_knowledge_bulk", "add_knowledge", "get_knowledge", "iter_knowledge", "query_bm25", "query_cached",
+    "create_version", "list_versions", "restore_version", "list_agents",
+)
+BENCH_AGENT_NAME = "bench"
+BENCH_VOCABULARY_SIZE = 5000
+BENCH_PAGE_SIZE = 10 # Elemente pro Seitenzugriff bei iter_knowledge
+DEFAULT_BENCH_ITEMS = 10000
+DEFAULT_BENCH_VERSIONS = 5
+DEFAULT_BENCH_AGENTS = 10
+DEFAULT_BENCH_SAMPLES = 200 # Messungen für kurze Operationen
+DEFAULT_BENCH_REPEAT = 3 # Messungen für Operationen über die gesamte Wissensbasis
+STARTUP_IMPORT_BUDGET_MS = 40 # Budget für die Summe der Importzeiten von 'agent list' (python -X importtime)
+STARTUP_CHECK_RUNS = 5
+# Module, die der Startpfad von 'agent list' nicht laden darf (erst bei Bedarf im jeweiligen Befehl)
+STARTUP_LAZY_MODULES = (
+    "asyncio", "concurrent.futures", "datetime", "hashlib", "http.server", "json", "multiprocessing", "numpy", "sqlite3", "tempfile", "uuid", "zipfile", "zstandard",
+) # shutil fehlt: argparse lädt es für die Breite der Hilfetexte
+VERSIONS_DIR_NAME = "versions"
+VERSION_METADATA_FILE_NAME = "version_meta.json"
+VERSION_MANIFEST_FILE_NAME = "manifest.json" # Liste der Chunk-Hashes einer Version
+OBJECTS_DIR_NAME = "objects" # Content-addressed Object-Store für Versions-Chunks
+VERSION_CHUNK_SIZE = 1024 # Mittlere Elemente pro Chunk; die Grenzen hängen vom Inhalt ab (siehe split_version_chunks)
+VERSION_CHUNK_MAX_ITEMS = 4 * VERSION_CHUNK_SIZE # Obergrenze, falls lange keine Grenze auftritt
+VERSION_CATALOG_FILE_NAME = "versions.sqlite" # Versionskatalog (eine Zeile pro Version)
+LIVE_VERSION_ID = "live" # Pseudo-Version für die aktuelle Wissensbasis (z.B. bei 'version diff')
+RETENTION_CONFIG_FILE_NAME = "retention.json" # Aufbewahrungsregeln; fehlt sie, bleiben alle Versionen erhalten
+RETENTION_RULES = ("keep_last", "keep_daily", "keep_weekly", "max_bytes")
+RETENTION_OPTIONS = ("auto", "archive") # Nach 'version create' automatisch ausdünnen; statt zu löschen archivieren
+VERSION_ARCHIVE_FILE_NAME = "versions_archive.zip" # Ausgedünnte Versionen (Manifeste und Chunks, komprimiert)
+
+# Asyncio-API (AsyncKnowledgeFlask)
+DEFAULT_ASYNC_WORKERS = 8 # Threads für blockierende Datei- und Datenbankzugriffe
+DEFAULT_ASYNC_MAX_PENDING = 256 # Aufträge, die gleichzeitig an den Thread-Pool übergeben sein dürfen
+
+# Speicher-Backends
+DEFAULT_STORAGE_BACKEND = "files" # Ohne SQLite-Datenbank im Basisverzeichnis
+SQLITE_STORE_FILE_NAME = "knowledgeflask.sqlite" # Agenten, Wissen, Volltextindex und Versionen in einer Datei (Backend 'sqlite')
+SQLITE_SCHEMA_VERSION = 2 # PRAGMA user_version der Datenbank
+SQLITE_BATCH_SIZE = 1000 # Zeilen je executemany
+SQLITE_CACHED_STATEMENTS = 256 # Vorbereitete Anweisungen, die die Verbindung zwischenspeichert
+
+# --- 1. Custom Exceptions ---
+class KnowledgeFlaskException(Exception):
+    """Basis-Exception für KnowledgeFlask-Fehler."""
+    pass
+
+class AgentNotFoundError(KnowledgeFlaskException):
+    """Wird ausgelöst, wenn ein angeforderter Agent nicht gefunden wird."""
+    def __init__(self, agent_name):
+        super().__init__(f"Agent '{agent_name}' wurde nicht gefunden.")
+        self.agent_name = agent_name
+
+class AgentAlreadyExistsError(KnowledgeFlaskException):
+    """Wird ausgelöst, wenn versucht wird, einen Agenten zu erstellen, der bereits existiert."""
+    def __init__(self, agent_name):
+        super().__init__(f"Agent '{agent_name}' existiert bereits.")
+        self.agent_name = agent_name
+
+class VersionNotFoundError(KnowledgeFlaskException):
+    """Wird ausgelöst, wenn eine angeforderte Version nicht gefunden wird."""
+    def __init__(self, version_id, agent_name=None):
+        msg = f"Version '{version_id}' wurde nicht gefunden."
+        if agent_name:
+            msg += f" für Agent '{agent_name}'."
+        super().__init__(msg)
+        self.version_id = version_id
+        self.agent_name = agent_name
+
+class KnowledgeBaseCorruptError(KnowledgeFlaskException):
+    """Wird ausgelöst, wenn die Wissensdatei eines Agenten nicht gelesen werden kann."""
+    def __init__(self, file_path, reason):
+        super().__init__(f"Wissensdatei '{file_path}' ist beschädigt: {reason}. Stelle eine Version wieder her, um sie zu reparieren.")
+        self.file_path = file_path
+
+# --- 2. Manager-Klassen ---
+
+class Metrics:
+    """
+    Prozessweite Zähler (geladene/geschriebene Bytes, geöffnete Dateien, gelesene
+    Elemente, ...) und Zeitmessungen der Manager-Methoden. Thread-sicher, damit
+    auch der Servermodus sie nutzen kann.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.timers = {} # Name -> [Aufrufe, Gesamtdauer, Maximaldauer] in Sekunden
+
+    def count(self, name: str, value: int = 1):
+        """Erhöht einen Zähler."""
+        with self._lock:
+            self.counters[name] += value
+
+    def record(self, name: str, seconds: float):
+        """Verbucht eine gemessene Dauer."""
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Misst die Dauer des umschlossenen Blocks."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """Gibt alle Zähler und Zeitmessungen als JSON-fähiges Dict zurück."""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timers": {
+                    name: {"calls": calls, "seconds": round(total, 6), "max_seconds": round(longest, 6)}
+                    for name, (calls, total, longest) in self.timers.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """Formatiert die Metriken im Prometheus-Textformat."""
+        data = self.snapshot()
+        lines = []
+        for name, value in sorted(data["counters"].items()):
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for suffix, key, kind in (("calls_total", "calls", "counter"), ("seconds_total", "seconds", "counter"),
+                                  ("seconds_max", "max_seconds", "gauge")):
+            metric = f"{METRICS_PREFIX}_operation_{suffix}"
+            lines.append(f"# TYPE {metric} {kind}")
+            lines += [f'{metric}{{operation="{name}"}} {timer[key]}' for name, timer in sorted(data["timers"].items())]
+        return "\n".join(lines) + "\n"
+
+    def format_breakdown(self) -> str:
+        """Formatiert die Metriken als Tabelle für --profile (langsamste Operationen zuerst)."""
+        data = self.snapshot()
+        lines = ["--- Profil ---", f"{'Operation':<40} {'Aufrufe':>8} {'Gesamt [ms]':>12} {'Max [ms]':>10}"]
+        for name, timer in sorted(data["timers"].items(), key=lambda entry: -entry[1]["seconds"]):
+            lines.append(f"{name:<40} {timer['calls']:>8} {timer['seconds'] * 1000:>12.2f} {timer['max_seconds'] * 1000:>10.2f}")
+        lines.append("Zähler:")
+        lines += [f"  {name:<38} {value:>12}" for name, value in sorted(data["counters"].items())]
+        return "\n".join(lines)
+
+    def write(self, file_path: str):
+        """Schreibt die Metriken atomar in eine Datei (JSON bei Endung .json, sonst Prometheus-Text)."""
+        content = json.dumps(self.snapshot(), indent=2) if file_path.endswith(".json") else self.to_prometheus()
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp" # Gleichzeitige Prozesse schreiben nicht in dieselbe Datei
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, file_path)
+        except OSError as e:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Metriken '{file_path}': {e}") from e
+
+METRICS = Metrics()
+
+def instrumented(name: str):
+    """Dekorator: misst jeden Aufruf der Methode unter dem angegebenen Namen."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def item_digest(knowledge_item: str) -> str:
+    """Berechnet den Hash-Digest eines Wissenselements (Schlüssel für die Duplikatprüfung)."""
+    return hashlib.blake2b(knowledge_item.encode('utf-8'), digest_size=16).hexdigest()
+
+def ordered_subsequence(items: list[str], order: list[str]) -> set[str]:
+    """
+    Gibt die größte Teilmenge von items zurück, die in order in derselben Reihenfolge
+    vorkommt (längste aufsteigende Teilfolge der Positionen in order). Nur die übrigen
+    Elemente müssen verschoben werden, um die Reihenfolge von order herzustellen.
+    """
+    rank = {item: position for position, item in enumerate(order)}
+    tail_ranks = [] # Kleinster End-Rang einer aufsteigenden Teilfolge der Länge k + 1
+    tails = [] # Zugehöriger Index in items
+    predecessors = [None] * len(items)
+    for index, item in enumerate(items):
+        length = bisect.bisect_left(tail_ranks, rank[item])
+        predecessors[index] = tails[length - 1] if length else None
+        if length == len(tails):
+            tail_ranks.append(rank[item])
+            tails.append(index)
+        else:
+            tail_ranks[length] = rank[item]
+            tails[length] = index
+    subsequence = set()
+    index = tails[-1] if tails else None
+    while index is not None:
+        subsequence.add(items[index])
+        index = predecessors[index]
+    return subsequence
+
+def insertion_points(inserted: list[tuple[int, str]], count: int) -> list[tuple[int, int, str]]:
+    """
+    Übersetzt eingefügte (Position, Element) in (bisherige Position, neue Position, Element):
+    die bisherige Position ist die des Elements, vor dem eingefügt wird. Ein Index über die
+    ersten count Elemente übernimmt nur Einfügungen bis direkt hinter sein letztes Element,
+    den Rest holt er wie angehängte Elemente per sync() nach.
+    """
+    return [(position - number, position, item) for number, (position, item) in enumerate(inserted) if position - number <= count]
+
+def _iter_jsonl_items(f, source: str) -> Iterator[str]:
+    """Liest Elemente aus JSONL: pro Zeile ein JSON-String oder ein Objekt mit Feld 'text'."""
+    for line_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise KnowledgeFlaskException(f"Ungültiges JSON in '{source}' (Zeile {line_number}): {e}") from e
+        if isinstance(data, dict):
+            data = data.get("text")
+        if data is None:
+            raise KnowledgeFlaskException(f"Eintrag ohne Text in '{source}' (Zeile {line_number}).")
+        yield str(data)
+
+def _iter_text_items(f) -> Iterator[str]:
+    """Liest Elemente aus Klartext: ein Element pro nicht-leerer Zeile."""
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line.strip():
+            yield line
+
+def _iter_directory_items(directory: str) -> Iterator[str]:
+    """Liest Elemente aus einem Verzeichnis: jede Datei ist ein Element."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            with open(os.path.join(root, file_name), 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+            if content:
+                yield content
+
+def iter_import_items(sources: list[str], input_format: str = "auto") -> Iterator[str]:
+    """
+    Streamt Wissenselemente aus Dateien, Verzeichnissen oder stdin ('-').
+    Formate: jsonl, text (ein Element pro Zeile), dir (eine Datei pro Element)
+    oder auto (anhand von Pfadtyp und Dateiendung).
+    """
+    for source in sources or ["-"]:
+        source_format = input_format
+        if source_format == "auto":
+            if source != "-" and os.path.isdir(source):
+                source_format = "dir"
+            elif source.endswith((".jsonl", ".ndjson")):
+                source_format = "jsonl"
+            else:
+                source_format = "text"
+        try:
+            if source_format == "dir":
+                if not os.path.isdir(source):
+                    raise KnowledgeFlaskException(f"Importquelle '{source}' ist kein Verzeichnis.")
+                yield from _iter_directory_items(source)
+            elif source == "-":
+                yield from (_iter_jsonl_items(sys.stdin, "stdin") if source_format == "jsonl" else _iter_text_items(sys.stdin))
+            else:
+                with open(source, 'r', encoding='utf-8') as f:
+                    yield from (_iter_jsonl_items(f, source) if source_format == "jsonl" else _iter_text_items(f))
+        except (IOError, UnicodeDecodeError) as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Importquelle '{source}': {e}") from e
+
+# Grenzen, hinter denen ein Chunk enden darf: Wortgrenzen, Satzenden bzw. Absätze, Zeilenenden
+_CHUNK_BOUNDARIES = {
+    "fixed": re.compile(r"\s+"),
+    "sentence": re.compile(r"(?<=[.!?])\s+|\r?\n[ \t]*\r?\n\s*"),
+    "heading": re.compile(r"\n"),
+}
+_HEADING_PATTERN = re.compile(r"#{1,6}(?:[ \t]|\r?\n|$)") # Markdown-Überschrift am Zeilenanfang
+
+def _iter_text_pieces(f, boundary: re.Pattern, max_length: int) -> Iterator[tuple[int, str]]:
+    """
+    Zerlegt einen Textstrom blockweise in lückenlose Stücke, die jeweils bis einschließlich
+    der nächsten Grenze reichen, und liefert (Zeichen-Offset, Stück). Stücke sind höchstens
+    max_length Zeichen lang; Text ohne Grenze wird entsprechend geteilt, damit der Puffer
+    begrenzt bleibt.
+    """
+    # Der Puffer behält das letzte bereits ausgegebene Zeichen, damit Lookbehinds (Satzende) greifen
+    buffer, buffer_start, position = "", 0, 0
+    while True:
+        block = f.read(CHUNK_READ_SIZE)
+        buffer += block
+        for match in boundary.finditer(buffer, position):
+            if block and match.end() == len(buffer):
+                break # Die Grenze kann sich im nächsten Block fortsetzen
+            for piece_start in range(position, match.end(), max_length): # Überlange Stücke teilen
+                yield buffer_start + piece_start, buffer[piece_start:min(match.end(), piece_start + max_length)]
+            position = match.end()
+        while len(buffer) - position > max_length:
+            yield buffer_start + position, buffer[position:position + max_length]
+            position += max_length
+        if not block:
+            if position < len(buffer): # Rest ist höchstens max_length lang
+                yield buffer_start + position, buffer[position:]
+            return
+        keep = max(0, position - 1)
+        buffer, buffer_start, position = buffer[keep:], buffer_start + keep, position - keep
+
+def _pack_chunks(pieces: Iterable[tuple[int, str]], size: int, overlap: int,
+                 starts_section: Callable[[str], object] = None) -> Iterator[tuple[int, str]]:
+    """
+    Fasst Stücke zu Chunks von höchstens size Zeichen zusammen. Ein neuer Chunk übernimmt die
+    letzten Stücke des vorigen, soweit sie zusammen höchstens overlap Zeichen lang sind;
+    beginnt ein Stück einen neuen Abschnitt (starts_section), gibt es keine Überlappung.
+    Liefert (Zeichen-Offset, Text) ohne umgebenden Leerraum.
+    """
+    window = []
+    length = 0
+    fresh = False # Enthält das Fenster noch nicht ausgegebene Stücke?
+
+    def chunk():
+        text = "".join(piece for _, piece in window)
+        stripped = text.lstrip()
+        return window[0][0] + len(text) - len(stripped), stripped.rstrip()
+
+    for start, piece in pieces:
+        section = starts_section is not None and starts_section(piece)
+        if window and (section or length + len(piece) > size):
+            if fresh:
+                chunk_start, text = chunk()
+                if text:
+                    yield chunk_start, text
+            fresh = False
+            if section:
+                window, length = [], 0
+            while window and (length > overlap or length + len(piece) > size):
+                length -= len(window.pop(0)[1])
+        window.append((start, piece))
+        length += len(piece)
+        fresh = True
+    if fresh:
+        chunk_start, text = chunk()
+        if text:
+            yield chunk_start, text
+
+def iter_chunks(f, source: str, strategy: str = DEFAULT_CHUNK_STRATEGY, size: int = DEFAULT_CHUNK_SIZE,
+                overlap: int = DEFAULT_CHUNK_OVERLAP) -> Iterator[dict]:
+    """
+    Zerlegt einen Textstrom gestreamt in Chunks und liefert je Chunk ein Dict mit
+    text, source, start und end (Zeichen-Offsets in der Quelle) sowie index.
+    Strategien: fixed (feste Größe an Wortgrenzen), sentence (ganze Sätze bzw. Absätze)
+    und heading (Markdown-Abschnitte, zu lange Abschnitte zeilenweise geteilt).
+    """
+    if strategy not in CHUNK_STRATEGIES:
+        raise KnowledgeFlaskException(f"Unbekannte Chunking-Strategie '{strategy}'. Erlaubt: {', '.join(CHUNK_STRATEGIES)}.")
+    if size <= 0 or not 0 <= overlap < size:
+        raise KnowledgeFlaskException(f"Ungültige Chunk-Größe {size} bzw. Überlappung {overlap} (0 <= Überlappung < Größe).")
+    pieces = _iter_text_pieces(f, _CHUNK_BOUNDARIES[strategy], size)
+    starts_section = _HEADING_PATTERN.match if strategy == "heading" else None
+    for index, (start, text) in enumerate(_pack_chunks(pieces, size, overlap, starts_section)):
+        yield {"text": text, "source": source, "start": start, "end": start + len(text), "index": index}
+
+def iter_source_chunks(sources: list[str], strategy: str = DEFAULT_CHUNK_STRATEGY, size: int = DEFAULT_CHUNK_SIZE,
+                       overlap: int = DEFAULT_CHUNK_OVERLAP) -> Iterator[dict]:
+    """Streamt die Chunks aus Dateien, Verzeichnissen (alle Dateien, sortiert) oder stdin ('-')."""
+    for source in sources or ["-"]:
+        if source == "-":
+            yield from iter_chunks(sys.stdin, "stdin", strategy, size, overlap)
+            continue
+        if os.path.isdir(source):
+            paths = []
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                paths.extend(os.path.join(root, file_name) for file_name in sorted(files))
+        else:
+            paths = [source]
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8', newline='') as f: # newline='': Offsets wie in der Datei
+                    yield from iter_chunks(f, path, strategy, size, overlap)
+            except (IOError, UnicodeDecodeError) as e:
+                raise KnowledgeFlaskException(f"Fehler beim Lesen der Quelle '{path}': {e}") from e
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_TEMP_FILE_PATTERN = re.compile(r"\.[0-9a-f]{32}\.tmp$") # Temporäre Dateien mit uuid4().hex im Namen
+
+def tokenize(text: str) -> list[str]:
+    """Zerlegt einen Text in kleingeschriebene Terme."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def query_cache_key(query_text: str, top_k: int, mode: str, embedder: str) -> tuple:
+    """Schlüssel einer Suche im QUERY_CACHE; für BM25 zählt nur die Menge der Terme."""
+    if mode == "bm25":
+        return (mode, top_k, " ".join(sorted(set(tokenize(query_text)))))
+    return (mode, top_k, embedder, query_text)
+
+class AgentLock:
+    """
+    Advisory-Sperre (fcntl.flock) auf ein Agentenverzeichnis. Schreiber halten sie
+    exklusiv, Leser geteilt. Pro Prozess gibt es eine Instanz je Agent: Leser mehrerer
+    Threads teilen sich die flock-Sperre und laufen gleichzeitig, Schreiber warten, bis
+    kein anderer Thread die Sperre hält (und haben Vorrang vor neu ankommenden Lesern).
+    Innerhalb eines Threads ist die Sperre reentrant; ein Thread, der sie geteilt hält,
+    kann sie nicht zu exklusiv erweitern (flock täte das nicht atomar). Ohne fcntl
+    (Windows) wird nur innerhalb des Prozesses gesperrt.
+    """
+    _instances: dict[str, "AgentLock"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, agent_path: str):
+        self.lock_file_path = os.path.join(agent_path, LOCK_FILE_NAME)
+        self._condition = threading.Condition(threading.Lock())
+        self._readers: dict[int, int] = {} # Thread -> Tiefe der geteilten Sperre
+        self._writer = None # Thread, der die Sperre exklusiv hält
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._fd = None
+
+    @classmethod
+    def for_agent(cls, agent_path: str) -> "AgentLock":
+        """Gibt die prozessweite Sperre eines Agentenverzeichnisses zurück."""
+        key = os.path.abspath(agent_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(key)
+            return cls._instances[key]
+
+    def _acquire_file(self, exclusive: bool):
+        """Öffnet die Sperrdatei und sperrt sie (Aufrufer hält _condition, kein anderer Thread hält die Sperre)."""
+        try:
+            self._fd = os.open(self.lock_file_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Sperrdatei '{self.lock_file_path}' konnte nicht geöffnet werden: {e}") from e
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            except BaseException:
+                os.close(self._fd)
+                self._fd = None
+                raise
+
+    def _release_file(self):
+        """Gibt die flock-Sperre frei, sobald kein Thread des Prozesses sie mehr hält (Aufrufer hält _condition)."""
+        if self._writer is None and not self._readers and self._fd is not None:
+            os.close(self._fd) # Schließen gibt die flock-Sperre frei
+            self._fd = None
+        self._condition.notify_all()
+
+    @contextmanager
+    def hold(self, exclusive: bool = True):
+        """Hält die Sperre für die Dauer des with-Blocks (exklusiv oder geteilt)."""
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1 # Innerhalb der exklusiven Sperre ist alles erlaubt
+                mode = "writer"
+            elif me in self._readers:
+                if exclusive:
+                    raise KnowledgeFlaskException(
+                        f"Die geteilte Sperre '{self.lock_file_path}' kann nicht zu exklusiv erweitert werden; "
+                        "die exklusive Sperre muss vor dem Lesen geholt werden."
+                    )
+                self._readers[me] += 1
+                mode = "reader"
+            elif exclusive:
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._condition.wait()
+                    self._acquire_file(exclusive=True)
+                finally:
+                    self._waiting_writers -= 1
+                self._writer, self._writer_depth = me, 1
+                mode = "writer"
+            else:
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+                if self._fd is None:
+                    self._acquire_file(exclusive=False)
+                self._readers[me] = 1
+                mode = "reader"
+        try:
+            yield
+        finally:
+            with self._condition:
+                if mode == "writer":
+                    self._writer_depth -= 1
+                    if self._writer_depth == 0:
+                        self._writer = None
+                        self._release_file()
+                else:
+                    self._readers[me] -= 1
+                    if self._readers[me] == 0:
+                        del self._readers[me]
+                        self._release_file()
+
+class GroupCommitter:
+    """
+    Group Commit für gleichzeitige Schreiber eines Prozesses: wartende Aufträge
+    werden gesammelt, und ein Thread schreibt sie als Leader mit einem einzigen
+    Commit (commit-Funktion: Elemente -> tatsächlich hinzugefügte Elemente).
+    """
+    def __init__(self, commit: Callable[[list[str]], list[str]]):
+        self.commit = commit
+        self._queue_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._pending: list[dict] = []
+        self.commits = 0
+
+    def submit(self, knowledge_items: Iterable[str]) -> list[str]:
+        """Reiht Elemente ein, wartet auf den gemeinsamen Commit und gibt die eigenen hinzugefügten Elemente zurück."""
+        ticket = {"items": list(knowledge_items), "added": [], "error": None, "done": False}
+        with self._queue_lock:
+            self._pending.append(ticket)
+        with self._commit_lock:
+            if not ticket["done"]:
+                with self._queue_lock:
+                    batch, self._pending = self._pending, []
+                self._commit_batch(batch)
+        if ticket["error"] is not None:
+            raise ticket["error"]
+        return ticket["added"]
+
+    @staticmethod
+    def assign_added(batch: list[dict], added: list[str]):
+        """Verteilt die hinzugefügten Elemente eines gemeinsamen Commits auf die Aufträge."""
+        # added ist eine geordnete Teilfolge der Eingabe: der Reihe nach den Aufträgen zuordnen
+        next_added = 0
+        for ticket in batch:
+            for item in ticket["items"]:
+                if next_added < len(added) and added[next_added] == item:
+                    ticket["added"].append(item)
+                    next_added += 1
+
+    def _commit_batch(self, batch: list[dict]):
+        """Schreibt alle gesammelten Aufträge in einem Commit und verteilt das Ergebnis."""
+        try:
+            added = self.commit([item for ticket in batch for item in ticket["items"]])
+            self.commits += 1
+            self.assign_added(batch, added)
+        except Exception as e:
+            for ticket in batch:
+                ticket["error"] = e
+        finally:
+            for ticket in batch:
+                ticket["done"] = True
+
+class QueryCache:
+    """
+    Cache für Suchergebnisse: LRU im Speicher, optional ergänzt um eine SQLite-Datei je Agent
+    (query_cache.sqlite), die auch zwischen CLI-Aufrufen erhalten bleibt. Schlüssel sind
+    Agent, Generation der Wissensbasis, Suchtext und Parameter. Die Generation besteht aus
+    Inode, Größe und Änderungszeit von Snapshot und Segment-Log, so dass Einträge auch nach
+    Änderungen durch andere Prozesse nicht mehr passen. Schreibende Operationen der
+    Wissensbasis verwerfen die Einträge des Agenten zusätzlich sofort (invalidate).
+    """
+    def __init__(self, mode: str = DEFAULT_QUERY_CACHE_MODE, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.mode = mode
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, list[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, mode: str):
+        """Setzt den Modus: off, memory (nur LRU) oder disk (LRU und SQLite-Datei je Agent)."""
+        if mode not in QUERY_CACHE_MODES:
+            raise KnowledgeFlaskException(f"Unbekannter Cache-Modus '{mode}'. Erlaubt: {', '.join(QUERY_CACHE_MODES)}.")
+        self.mode = mode
+        if mode == "off":
+            with self._lock:
+                self._entries.clear()
+
+    @staticmethod
+    def generation(*paths: str) -> tuple:
+        """Generation der Wissensbasis aus Inode, Größe und Änderungszeit ihrer Dateien."""
+        generation = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                generation.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                generation.append(None)
+        return tuple(generation)
+
+    def get(self, agent_path: str, generation: tuple, key: tuple) -> list[dict]:
+        """Gibt eine Kopie der gespeicherten Treffer zurück oder None."""
+        if self.mode == "off":
+            return None
+        memory_key = (agent_path, generation, key)
+        with self._lock:
+            results = self._entries.get(memory_key)
+            if results is not None:
+                self._entries.move_to_end(memory_key)
+                self.hits += 1
+        if results is None and self.mode == "disk":
+            results = self._disk_get(agent_path, generation, key)
+            if results is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(memory_key, results)
+        if results is None:
+            with self._lock:
+                self.misses += 1
+            METRICS.count("query_cache_misses")
+            return None
+        METRICS.count("query_cache_hits")
+        return [dict(result) for result in results]
+
+    def put(self, agent_path: str, generation: tuple, key: tuple, results: list[dict]):
+        """Speichert Treffer unter dem Schlüssel (im Modus disk auch in der Datei des Agenten)."""
+        if self.mode == "off":
+            return
+        with self._lock:
+            self._store((agent_path, generation, key), [dict(result) for result in results])
+        if self.mode == "disk":
+            self._disk_put(agent_path, generation, key, results)
+
+    def _store(self, memory_key: tuple, results: list[dict]):
+        """Legt einen Eintrag im LRU ab und verdrängt die ältesten (Aufrufer hält _lock)."""
+        self._entries[memory_key] = results
+        self._entries.move_to_end(memory_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, agent_path: str):
+        """Verwirft alle Einträge eines Agenten im Speicher und auf der Platte."""
+        with self._lock:
+            for memory_key in [memory_key for memory_key in self._entries if memory_key[0] == agent_path]:
+                del self._entries[memory_key]
+            self.invalidations += 1
+        try:
+            os.remove(os.path.join(agent_path, QUERY_CACHE_FILE_NAME))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Verwerfen des Abfrage-Caches von '{agent_path}': {e}") from e
+
+    def _disk_connect(self, agent_path: str) -> "sqlite3.Connection":
+        """Öffnet die Cache-Datei eines Agenten und legt das Schema bei Bedarf an."""
+        connection = sqlite3.connect(os.path.join(agent_path, QUERY_CACHE_FILE_NAME), timeout=30)
+        connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, generation TEXT, results TEXT, used REAL)")
+        return connection
+
+    def _disk_get(self, agent_path: str, generation: tuple, key: tuple) -> list[dict]:
+        """Liest einen Eintrag aus der Cache-Datei; Fehler der Datei gelten als Miss."""
+        try:
+            with closing(self._disk_connect(agent_path)) as connection, connection:
+                row = connection.execute("SELECT results FROM entries WHERE key = ? AND generation = ?",
+                                         (json.dumps(key), json.dumps(generation))).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), json.dumps(key)))
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row is not None else None
+
+    def _disk_put(self, agent_path: str, generation: tuple, key: tuple, results: list[dict]):
+        """Schreibt einen Eintrag in die Cache-Datei, verwirft ältere Generationen und begrenzt die Größe."""
+        try:
+            with closing(self._disk_connect(agent_path)) as connection, connection:
+                connection.execute("DELETE FROM entries WHERE generation != ?", (json.dumps(generation),))
+                connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                                   (json.dumps(key), json.dumps(generation), json.dumps(results, ensure_ascii=False), time.time()))
+                connection.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                                   (QUERY_CACHE_DISK_MAX_ENTRIES,))
+        except sqlite3.Error:
+            pass
+
+    def stats(self) -> dict:
+        """Gibt Kennzahlen des Caches zurück."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "mode": self.mode,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+QUERY_CACHE = QueryCache()
+
+def _import_zstandard():
+    """Importiert zstandard erst bei Bedarf (nur für den Codec 'zstd' nötig)."""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise KnowledgeFlaskException("Für den Codec 'zstd' wird das Paket zstandard benötigt (pip install zstandard).") from e
+    return zstandard
+
+class BinaryKnowledgeStore:
+    """
+    Kompakte Record-Datei für den Snapshot: Elemente werden in Blöcken zu je
+    BINARY_STORE_BLOCK_ITEMS gespeichert (Offset-Tabelle plus UTF-8-Daten, optional
+    per zlib/zstd komprimiert), gefolgt von einer Blocktabelle am Dateiende.
+    Die Datei wird per mmap geöffnet; ein Element wird erst beim Zugriff über
+    seinen Index decodiert, sodass Punktzugriffe nur einen Block berühren.
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = None
+        self._mmap = None
+        self._cached_block = (-1, None) # Zuletzt dekomprimierter Block
+
+    def open(self) -> "BinaryKnowledgeStore":
+        """Öffnet die Datei per mmap und liest den Header."""
+        try:
+            self._file = open(self.file_path, 'rb')
+            METRICS.count("files_opened")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, codec_id, self.block_items, self.item_count, self.table_offset = BINARY_STORE_HEADER.unpack_from(self._mmap)
+        except OSError as e:
+            self.close()
+            raise KnowledgeFlaskException(f"Fehler beim Öffnen der Wissensdatei '{self.file_path}': {e}") from e
+        except (ValueError, struct.error) as e: # ValueError: leere Datei lässt sich nicht mappen
+            self.close()
+            raise KnowledgeBaseCorruptError(self.file_path, e) from e
+        block_count = -(-self.item_count // self.block_items) if self.block_items else 0
+        if (magic != BINARY_STORE_MAGIC or codec_id >= len(BINARY_CODECS) or not self.block_items
+                or self.table_offset + 8 * (block_count + 1) > len(self._mmap)):
+            self.close()
+            raise KnowledgeBaseCorruptError(self.file_path, "ungültiger Header")
+        self.codec = BINARY_CODECS[codec_id]
+        return self
+
+    def close(self):
+        """Gibt Mapping und Dateihandle frei."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.item_count
+
+    def _block(self, block: int) -> tuple:
+        """Gibt Puffer und Startposition eines Blocks zurück (unkomprimiert direkt aus dem Mapping)."""
+        start, end = struct.unpack_from("<QQ", self._mmap, self.table_offset + 8 * block)
+        if self.codec == "none":
+            return self._mmap, start
+        if self._cached_block[0] != block:
+            data = self._mmap[start:end]
+            try:
+                if self.codec == "zlib":
+                    payload = zlib.decompress(data)
+                else:
+                    payload = _import_zstandard().ZstdDecompressor().decompress(data)
+            except Exception as e: # zlib.error bzw. zstandard.ZstdError
+                raise KnowledgeBaseCorruptError(self.file_path, e) from e
+            self._cached_block = (block, payload)
+        return self._cached_block[1], 0
+
+    def get(self, index: int) -> str:
+        """Decodiert das Element an Position index."""
+        if not 0 <= index < self.item_count:
+            raise IndexError(index)
+        block, slot = divmod(index, self.block_items)
+        buffer, base = self._block(block)
+        items_in_block = min(self.block_items, self.item_count - block * self.block_items)
+        data_start = base + 4 * (items_in_block + 1)
+        try:
+            low, high = struct.unpack_from("<II", buffer, base + 4 * slot)
+            return bytes(buffer[data_start + low:data_start + high]).decode('utf-8')
+        except (struct.error, UnicodeDecodeError) as e:
+            raise KnowledgeBaseCorruptError(self.file_path, e) from e
+
+    def iter_range(self, offset: int = 0, count: int = None) -> Iterator[str]:
+        """Decodiert count Elemente ab Position offset (blockweise, ohne alle zu laden)."""
+        stop = self.item_count if count is None else min(self.item_count, offset + count)
+        for index in range(max(0, offset), stop):
+            yield self.get(index)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_range()
+
+    @staticmethod
+    def write(file_path: str, knowledge_items: Iterable[str], codec: str = DEFAULT_BINARY_CODEC,
+              block_items: int = BINARY_STORE_BLOCK_ITEMS, before_replace: Callable[[str], None] = None) -> int:
+        """
+        Schreibt Elemente gestreamt in eine neue Record-Datei (temporäre Datei plus
+        os.replace) und gibt die Anzahl der geschriebenen Elemente zurück. before_replace
+        wird mit dem Pfad der fertigen, per fsync gesicherten temporären Datei aufgerufen.
+        """
+        if codec not in BINARY_CODECS:
+            raise KnowledgeFlaskException(f"Unbekannter Codec '{codec}'. Verfügbar: {', '.join(BINARY_CODECS)}.")
+        if codec == "zlib":
+            compress = zlib.compress
+        elif codec == "zstd":
+            compress = _import_zstandard().ZstdCompressor().compress
+        else:
+            compress = bytes
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        item_count = 0
+        block_offsets = []
+        iterator = iter(knowledge_items)
+        try:
+            with open(tmp_path, 'wb', buffering=1024 * 1024) as f:
+                position = f.write(BINARY_STORE_HEADER.pack(BINARY_STORE_MAGIC, 0, 0, 0, 0))
+                while True:
+                    encoded = [item.encode('utf-8') for item in itertools.islice(iterator, block_items)]
+                    if not encoded:
+                        break
+                    offsets = list(itertools.accumulate(map(len, encoded), initial=0))
+                    payload = struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(encoded)
+                    block_offsets.append(position)
+                    position += f.write(compress(payload))
+                    item_count += len(encoded)
+                block_offsets.append(position)
+                f.write(struct.pack(f"<{len(block_offsets)}Q", *block_offsets))
+                f.seek(0)
+                f.write(BINARY_STORE_HEADER.pack(
+                    BINARY_STORE_MAGIC, BINARY_CODECS.index(codec), block_items, item_count, position
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+            if before_replace is not None:
+                before_replace(tmp_path)
+            os.replace(tmp_path, file_path)
+            METRICS.count("files_opened")
+            METRICS.count("bytes_saved", os.path.getsize(file_path))
+        except OSError as e:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Wissensdatei '{file_path}': {e}") from e
+        return item_count
+
+class KnowledgeBaseManager:
+    """
+    Verwaltet die Wissensbasis eines einzelnen Agenten.
+    Die knowledge.json (bzw. die binäre knowledge.bin) ist der Snapshot, neue Elemente werden als JSONL-Zeilen
+    an ein Segment-Log angehängt. Ein persistierter Hash-Index erlaubt die
+    Duplikatprüfung, ohne die Wissensbasis zu laden. Schreibzugriffe laufen unter
+    der exklusiven Agentensperre, Lesezugriffe unter der geteilten.
+    """
+    def __init__(self, agent_path: str):
+        self.agent_path = agent_path
+        self.knowledge_file_path = os.path.join(agent_path, KNOWLEDGE_FILE_NAME)
+        self.log_file_path = os.path.join(agent_path, KNOWLEDGE_LOG_FILE_NAME)
+        self.index_file_path = os.path.join(agent_path, KNOWLEDGE_INDEX_FILE_NAME)
+        self.row_offsets_file_path = os.path.join(agent_path, ROW_OFFSETS_FILE_NAME)
+        self.binary_file_path = os.path.join(agent_path, BINARY_KNOWLEDGE_FILE_NAME)
+        self.chunk_sources_file_path = os.path.join(agent_path, CHUNK_SOURCES_FILE_NAME)
+        self._digests = None # Wird beim ersten Zugriff aus dem Hash-Index geladen
+        self._index_inode = None # Inode und Leseposition, um nur neue Zeilen nachzulesen
+        self._index_offset = 0
+        # Stelle sicher, dass das Agentenverzeichnis existiert
+        os.makedirs(self.agent_path, exist_ok=True)
+        self.lock = AgentLock.for_agent(agent_path)
+
+    def _uses_binary_store(self) -> bool:
+        """Prüft, ob der Snapshot im Binärformat (knowledge.bin) vorliegt."""
+        return os.path.exists(self.binary_file_path)
+
+    @property
+    def snapshot_file_path(self) -> str:
+        """Pfad des aktuellen Snapshots (knowledge.bin oder knowledge.json)."""
+        return self.binary_file_path if self._uses_binary_store() else self.knowledge_file_path
+
+    def exists(self) -> bool:
+        """Prüft, ob die Wissensbasis angelegt ist (Snapshot vorhanden)."""
+        return os.path.exists(self.snapshot_file_path)
+
+    def generation(self) -> tuple:
+        """Stand der Wissensbasis für den Abfrage-Cache (ändert sich mit Snapshot oder Segment-Log)."""
+        return QueryCache.generation(self.snapshot_file_path, self.log_file_path)
+
+    @instrumented("kb.load_snapshot")
+    def _load_knowledge_from_file(self) -> list[str]:
+        """Lädt den Snapshot der Wissensbasis aus der JSON- bzw. Binärdatei."""
+        if self._uses_binary_store():
+            with BinaryKnowledgeStore(self.binary_file_path) as store:
+                METRICS.count("bytes_loaded", os.path.getsize(self.binary_file_path))
+                METRICS.count("items_scanned", len(store))
+                return list(store)
+        if not os.path.exists(self.knowledge_file_path):
+            return []
+        try:
+            with open(self.knowledge_file_path, 'r', encoding='utf-8') as f:
+                METRICS.count("files_opened")
+                METRICS.count("bytes_loaded", os.fstat(f.fileno()).st_size)
+                with METRICS.timer("parse.snapshot"):
+                    data = json.load(f)
+                if not isinstance(data, list):
+                    raise KnowledgeBaseCorruptError(self.knowledge_file_path, "kein gültiges JSON-Array")
+                METRICS.count("items_scanned", len(data))
+                return [str(item) for item in data] # Stellen Sie sicher, dass alles Strings sind
+        except json.JSONDecodeError as e:
+            # Nicht als leer behandeln: der nächste Schreibvorgang würde sonst den Bestand verwerfen
+            raise KnowledgeBaseCorruptError(self.knowledge_file_path, e) from e
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Wissensdatei '{self.knowledge_file_path}': {e}") from e
+
+    def _iter_log_items(self) -> Iterator[str]:
+        """
+        Streamt die seit dem letzten Snapshot angehängten Elemente aus dem Segment-Log,
+        nach einem abgebrochenen Snapshot-Wechsel zuerst die des beiseitegelegten Logs.
+        """
+        for log_file_path in [*self._unpublished_logs(), self.log_file_path]:
+            yield from self._iter_log_file(log_file_path)
+
+    def _iter_log_file(self, log_file_path: str) -> Iterator[str]:
+        """Streamt die Elemente einer Segment-Log-Datei; unvollständige oder fehlerhafte Zeilen werden übersprungen."""
+        if not os.path.exists(log_file_path):
+            return
+        try:
+            with open(log_file_path, 'r', encoding='utf-8') as f:
+                METRICS.count("files_opened")
+                METRICS.count("bytes_loaded", os.fstat(f.fileno()).st_size)
+                for line_number, line in enumerate(f, start=1):
+                    METRICS.count("items_scanned")
+                    if not line.endswith("\n"):
+                        # Unvollständige letzte Zeile (abgebrochener Schreibvorgang)
+                        print(f"Warnung: Unvollständiger Eintrag in '{log_file_path}' (Zeile {line_number}) wird ignoriert.", file=sys.stderr)
+                        break
+                    try:
+                        yield str(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        print(f"Fehler beim Decodieren von '{log_file_path}' (Zeile {line_number}): {e}. Eintrag wird ignoriert.", file=sys.stderr)
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen des Segment-Logs '{log_file_path}': {e}") from e
+
+    def _retired_logs(self) -> list[tuple[str, int]]:
+        """Beiseitegelegte Segment-Logs als (Pfad, Inode des Snapshots, der sie ersetzen sollte)."""
+        prefix = KNOWLEDGE_LOG_FILE_NAME + "."
+        try:
+            names = os.listdir(self.agent_path)
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen des Agentenverzeichnisses '{self.agent_path}': {e}") from e
+        return [
+            (os.path.join(self.agent_path, name), int(name[len(prefix):]))
+            for name in names if name.startswith(prefix) and name[len(prefix):].isdigit()
+        ]
+
+    def _unpublished_logs(self) -> list[str]:
+        """Beiseitegelegte Logs, deren Snapshot nicht übernommen wurde; ihre Elemente gelten weiter."""
+        retired_logs = self._retired_logs()
+        if not retired_logs:
+            return []
+        try:
+            snapshot_inode = os.stat(self.snapshot_file_path).st_ino
+        except FileNotFoundError:
+            snapshot_inode = None
+        return sorted((path for path, inode in retired_logs if inode != snapshot_inode), key=os.path.getmtime)
+
+    def _retire_log(self, tmp_path: str):
+        """
+        Legt das Segment-Log unmittelbar vor der Übernahme eines Snapshots beiseite, der
+        seine Elemente bereits enthält. Der neue Name trägt die Inode des neuen Snapshots:
+        Ein Absturz vor os.replace lässt das Log gültig, einer danach macht es überholt;
+        so werden Elemente weder verloren noch doppelt gelesen (siehe _recover_log).
+        """
+        if os.path.exists(self.log_file_path):
+            os.replace(self.log_file_path, f"{self.log_file_path}.{os.stat(tmp_path).st_ino}")
+
+    def _recover_log(self):
+        """
+        Schließt Snapshot-Wechsel ab (nur unter der exklusiven Sperre): Beiseitegelegte Logs,
+        die der aktuelle Snapshot enthält, werden gelöscht, die übrigen wieder zum Segment-Log.
+        Temporäre Dateien abgebrochener Schreibvorgänge werden entfernt.
+        """
+        unpublished_logs = self._unpublished_logs()
+        for path, _ in self._retired_logs():
+            if path not in unpublished_logs:
+                self._remove_file(path)
+        try:
+            for path in unpublished_logs:
+                if os.path.exists(self.log_file_path):
+                    # Später angehängte Elemente hinter die des beiseitegelegten Logs
+                    with open(path, 'ab') as f, open(self.log_file_path, 'rb') as log:
+                        shutil.copyfileobj(log, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(path, self.log_file_path)
+            for name in os.listdir(self.agent_path):
+                if _TEMP_FILE_PATTERN.search(name):
+                    self._remove_file(os.path.join(self.agent_path, name))
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Wiederherstellen des Segment-Logs '{self.log_file_path}': {e}") from e
+
+    def _load_log_items(self) -> list[str]:
+        """Lädt die seit dem letzten Snapshot angehängten Elemente aus dem Segment-Log."""
+        return list(self._iter_log_items())
+
+    def _snapshot_signature(self) -> tuple[int, int, int]:
+        """Inode, Größe und mtime des Snapshots (ändern sich bei jedem os.replace)."""
+        stat = os.stat(self.knowledge_file_path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _write_row_offsets(self, offsets: list[int]):
+        """Speichert die Zeilen-Offsets des gerade geschriebenen Snapshots."""
+        tmp_path = f"{self.row_offsets_file_path}.{uuid.uuid4().hex}.tmp" # Leser bauen die Offsets unter der geteilten Sperre
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(ROW_OFFSETS_HEADER.pack(*self._snapshot_signature()))
+                f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            os.replace(tmp_path, self.row_offsets_file_path)
+        except OSError as e:
+            self._remove_file(tmp_path)
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Zeilen-Offsets '{self.row_offsets_file_path}': {e}") from e
+
+    def _build_row_offsets(self) -> bool:
+        """
+        Ermittelt die Zeilen-Offsets eines vorhandenen Snapshots (ein Element pro Zeile,
+        wie von json.dump(..., indent=2) erzeugt). Gibt False zurück, wenn der Snapshot
+        ein anderes Layout hat; dann wird er für Seitenzugriffe vollständig geladen.
+        """
+        offsets = []
+        try:
+            with open(self.knowledge_file_path, 'rb') as f:
+                position = 0
+                for line_number, line in enumerate(f):
+                    stripped = line.strip()
+                    if line_number == 0:
+                        valid = stripped in (b"[", b"[]")
+                    elif stripped == b"]":
+                        valid = True
+                    else:
+                        valid = stripped.startswith(b'"') and stripped.rstrip(b",").endswith(b'"')
+                        offsets.append(position)
+                    if not valid:
+                        return False
+                    position += len(line)
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Wissensdatei '{self.knowledge_file_path}': {e}") from e
+        self._write_row_offsets(offsets)
+        return True
+
+    def _snapshot_row_count(self) -> int:
+        """
+        Anzahl der Elemente im Snapshot laut Zeilen-Offsets (werden bei Bedarf aufgebaut);
+        -1, wenn der Snapshot keine Zeilen-Offsets unterstützt.
+        """
+        if self._uses_binary_store():
+            with BinaryKnowledgeStore(self.binary_file_path) as store:
+                return len(store)
+        if not os.path.exists(self.knowledge_file_path):
+            return 0
+        signature = self._snapshot_signature()
+        try:
+            with open(self.row_offsets_file_path, 'rb') as f:
+                if ROW_OFFSETS_HEADER.unpack(f.read(ROW_OFFSETS_HEADER.size)) == signature:
+                    return (os.fstat(f.fileno()).st_size - ROW_OFFSETS_HEADER.size) // 8
+        except (OSError, struct.error):
+            pass
+        if not self._build_row_offsets():
+            return -1
+        return self._snapshot_row_count()
+
+    def _iter_snapshot_rows(self, offset: int, count: int) -> Iterator[str]:
+        """Liest count Elemente ab Position offset direkt über die Zeilen-Offsets bzw. die Blocktabelle."""
+        if count <= 0:
+            return
+        if self._uses_binary_store():
+            with BinaryKnowledgeStore(self.binary_file_path) as store:
+                for item in store.iter_range(offset, count):
+                    METRICS.count("items_scanned")
+                    yield item
+            return
+        try:
+            with open(self.row_offsets_file_path, 'rb') as f:
+                f.seek(ROW_OFFSETS_HEADER.size + 8 * offset)
+                (start,) = struct.unpack("<Q", f.read(8))
+            METRICS.count("files_opened", 2)
+            with open(self.knowledge_file_path, 'rb') as f:
+                f.seek(start)
+                for _ in range(count):
+                    line = f.readline()
+                    METRICS.count("items_scanned")
+                    METRICS.count("bytes_loaded", len(line))
+                    yield str(json.loads(line.strip().rstrip(b",")))
+        except (OSError, struct.error, json.JSONDecodeError) as e:
+            raise KnowledgeBaseCorruptError(self.knowledge_file_path, e) from e
+
+    @instrumented("kb.write_snapshot")
+    def _write_snapshot(self, knowledge_data: Iterable[str]):
+        """
+        Schreibt den Snapshot im aktuellen Format (Binärdatei mit unverändertem Codec oder JSON).
+        Der neue Snapshot ersetzt auch das Segment-Log: es wird vor der Übernahme beiseitegelegt
+        (siehe _retire_log); der Aufrufer schließt den Wechsel mit _recover_log() ab.
+        """
+        QUERY_CACHE.invalidate(self.agent_path)
+        self._recover_log()
+        if not self._uses_binary_store():
+            self._write_json_snapshot(knowledge_data)
+            return
+        try:
+            with BinaryKnowledgeStore(self.binary_file_path) as store:
+                codec = store.codec
+        except KnowledgeBaseCorruptError:
+            codec = DEFAULT_BINARY_CODEC # Beschädigte Datei wird ohnehin ersetzt
+        BinaryKnowledgeStore.write(self.binary_file_path, knowledge_data, codec, before_replace=self._retire_log)
+
+    def _write_json_snapshot(self, knowledge_data: Iterable[str]):
+        """
+        Schreibt den Snapshot der Wissensbasis gestreamt in eine temporäre Datei
+        und übernimmt ihn atomar per os.replace, nachdem das Segment-Log beiseitegelegt
+        wurde. Das Format entspricht json.dump(..., indent=2), also ein Element pro Zeile;
+        die Byte-Offsets der Zeilen werden dabei gleich mitgeschrieben.
+        """
+        tmp_path = f"{self.knowledge_file_path}.{uuid.uuid4().hex}.tmp"
+        offsets = []
+        try:
+            with open(tmp_path, 'wb', buffering=1024 * 1024) as f:
+                position = f.write(b"[")
+                for item in knowledge_data:
+                    position += f.write(b",\n" if offsets else b"\n")
+                    offsets.append(position)
+                    position += f.write(b"  " + json.dumps(item, ensure_ascii=False).encode('utf-8'))
+                position += f.write(b"\n]" if offsets else b"]")
+                f.flush()
+                os.fsync(f.fileno())
+            self._retire_log(tmp_path)
+            os.replace(tmp_path, self.knowledge_file_path)
+            METRICS.count("files_opened")
+            METRICS.count("bytes_saved", position)
+        except (IOError, OSError) as e:
+            self._remove_file(tmp_path)
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Wissensdatei '{self.knowledge_file_path}': {e}") from e
+        self._write_row_offsets(offsets)
+
+    def _remove_file(self, path: str):
+        """Entfernt eine Datei der Wissensbasis, falls vorhanden."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Löschen der Datei '{path}': {e}") from e
+
+    def _save_knowledge_to_file(self, knowledge_data: list[str]):
+        """Ersetzt die gesamte Wissensbasis (Snapshot, Segment-Log und Indizes)."""
+        with self.lock.hold():
+            self._write_snapshot(knowledge_data)
+            self._recover_log()
+            self._remove_derived_indexes()
+            self._write_digest_index(knowledge_data)
+
+    def _remove_derived_indexes(self):
+        """Entfernt abgeleitete Indizes; sie werden beim nächsten Zugriff neu aufgebaut."""
+        for file_name in DERIVED_INDEX_FILE_NAMES:
+            self._remove_file(os.path.join(self.agent_path, file_name))
+
+    def _discard_log(self):
+        """
+        Verwirft Segment-Log und Indizes, z.B. nachdem der Snapshot von außen
+        ersetzt wurde. Die Indizes werden beim nächsten Zugriff neu aufgebaut.
+        """
+        with self.lock.hold():
+            QUERY_CACHE.invalidate(self.agent_path)
+            for file_path in [self.log_file_path, *(path for path, _ in self._retired_logs())]:
+                self._remove_file(file_path)
+            self._remove_file(self.index_file_path)
+            self._remove_file(self.row_offsets_file_path)
+            self._remove_derived_indexes()
+            self._digests = None
+
+    def _write_digest_index(self, knowledge_data: list[str]):
+        """Schreibt den Hash-Index für die übergebenen Elemente neu."""
+        self._write_digest_index_from_digests({item_digest(item) for item in knowledge_data})
+
+    def _write_digest_index_from_digests(self, digests: set[str]):
+        """Schreibt den Hash-Index aus einer Menge von Digests atomar neu."""
+        tmp_path = f"{self.index_file_path}.{uuid.uuid4().hex}.tmp" # Auch Leser schreiben einen fehlenden Index
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(f"{digest}\n" for digest in digests)
+            os.replace(tmp_path, self.index_file_path)
+        except OSError as e:
+            self._remove_file(tmp_path)
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Hash-Index '{self.index_file_path}': {e}") from e
+        self._digests = digests
+        self._index_inode = os.stat(self.index_file_path).st_ino
+        self._index_offset = os.path.getsize(self.index_file_path)
+        METRICS.count("files_opened")
+        METRICS.count("bytes_saved", self._index_offset)
+
+    @instrumented("kb.load_digest_index")
+    def _load_digest_index(self) -> set[str]:
+        """
+        Lädt den Hash-Index; fehlt er (z.B. bei älteren Agenten), wird er aufgebaut.
+        Ist er bereits geladen, werden nur die seither (auch von anderen Prozessen)
+        angehängten Zeilen nachgelesen.
+        """
+        if not os.path.exists(self.index_file_path):
+            self._write_digest_index(self.get_knowledge())
+            return self._digests
+        try:
+            stat = os.stat(self.index_file_path)
+            if self._digests is None or stat.st_ino != self._index_inode or stat.st_size < self._index_offset:
+                self._digests, self._index_offset = set(), 0
+            with open(self.index_file_path, 'rb') as f:
+                f.seek(self._index_offset)
+                tail = f.read()
+            METRICS.count("files_opened")
+            METRICS.count("bytes_loaded", len(tail))
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen des Hash-Index '{self.index_file_path}': {e}") from e
+        complete = tail[:tail.rfind(b"\n") + 1] # Nur vollständige Zeilen übernehmen
+        self._digests.update(complete.decode('ascii').split())
+        self._index_inode = stat.st_ino
+        self._index_offset += len(complete)
+        return self._digests
+
+    def _repair_tail(self, path: str):
+        """Schneidet eine unvollständige letzte Zeile (abgebrochener Schreibvorgang) ab."""
+        try:
+            with open(path, 'r+b') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size == 0:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                position = size
+                while position > 0:
+                    block_start = max(0, position - 65536)
+                    f.seek(block_start)
+                    newline = f.read(position - block_start).rfind(b"\n")
+                    if newline >= 0:
+                        f.truncate(block_start + newline + 1)
+                        return
+                    position = block_start
+                f.truncate(0)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Reparieren von '{path}': {e}") from e
+
+    @instrumented("kb.append_to_log")
+    def _append_to_log(self, entries: list[tuple[str, str]]):
+        """Hängt Elemente in einem Schreibvorgang an das Segment-Log und ihre Digests an den Hash-Index an."""
+        QUERY_CACHE.invalidate(self.agent_path)
+        self._recover_log()
+        self._repair_tail(self.log_file_path)
+        self._repair_tail(self.index_file_path)
+        try:
+            with open(self.log_file_path, 'a', encoding='utf-8') as f:
+                start = f.tell()
+                f.writelines(json.dumps(item, ensure_ascii=False) + "\n" for item, _ in entries)
+                METRICS.count("bytes_saved", f.tell() - start)
+                f.flush()
+                os.fsync(f.fileno()) # Erst danach gilt das Hinzufügen als bestätigt
+            with open(self.index_file_path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{digest}\n" for _, digest in entries)
+            METRICS.count("files_opened", 2)
+            METRICS.count("bytes_saved", 33 * len(entries)) # Hash-Index: 32 Hex-Zeichen plus Zeilenumbruch
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Anhängen an das Segment-Log '{self.log_file_path}': {e}") from e
+        if os.path.getsize(self.log_file_path) >= KNOWLEDGE_LOG_COMPACTION_BYTES:
+            self.compact()
+
+    @instrumented("kb.compact")
+    def compact(self) -> bool:
+        """
+        Faltet das Segment-Log in den Snapshot (knowledge.json).
+        Gibt True zurück, wenn ein Log vorhanden war.
+        """
+        with self.lock.hold():
+            self._recover_log()
+            if not os.path.exists(self.log_file_path):
+                return False
+            self._write_snapshot(self.iter_knowledge()) # Gestreamt, der alte Snapshot bleibt bis os.replace lesbar
+            self._recover_log()
+            return True
+
+    @contextmanager
+    def _open_near_duplicate_index(self, knowledge: Sequence):
+        """
+        Liefert für die Dauer des with-Blocks (Index, Konfiguration), wenn die Beinahe-Duplikat-Prüfung
+        für den Agenten eingeschaltet ist, den Index auf dem Stand von knowledge; sonst (None, None).
+        Ohne knowledge wird nicht geprüft. Die Verbindung des Index wird danach geschlossen.
+        """
+        if knowledge is None:
+            yield None, None
+            return
+        with closing(NearDuplicateIndex(self.agent_path)) as near_duplicates:
+            config = near_duplicates.load_config()
+            if config is None:
+                yield None, None
+                return
+            near_duplicates.sync(knowledge, save=False)
+            yield near_duplicates, config
+
+    def _update_inverted_index(self, previous_count: int, added_items: Iterable[str]):
+        """
+        Führt den invertierten Index für angehängte Elemente fort, sofern er genau den
+        Stand vor dem Anhängen abdeckt; für eine leere Wissensbasis wird er angelegt.
+        Ein veralteter oder fehlender Index wird erst bei der nächsten Suche nachgeholt.
+        """
+        if previous_count and not os.path.exists(os.path.join(self.agent_path, INVERTED_INDEX_FILE_NAME)):
+            return
+        with closing(InvertedIndex(self.agent_path)) as inverted_index:
+            if inverted_index.doc_count == previous_count:
+                inverted_index.add_documents(added_items)
+                inverted_index.save()
+
+    @instrumented("kb.append_knowledge")
+    def append_knowledge(self, knowledge_items: Iterable[str], check_near_duplicates: bool = True) -> list[str]:
+        """
+        Hängt Elemente ohne Ausgabe an das Segment-Log an (ein Schreibvorgang) und gibt
+        die tatsächlich hinzugefügten zurück; Duplikate werden übersprungen, Beinahe-Duplikate
+        je nach Konfiguration gemeldet oder übersprungen.
+        """
+        with self.lock.hold():
+            digests = self._load_digest_index()
+            new_digests = set()
+            entries = []
+            for item in knowledge_items:
+                METRICS.count("dedup_checks")
+                digest = item_digest(item)
+                if digest in digests or digest in new_digests:
+                    continue
+                new_digests.add(digest)
+                entries.append((item, digest))
+            knowledge = KnowledgeView(self) if entries and check_near_duplicates else None
+            with self._open_near_duplicate_index(knowledge) as (near_duplicates, config):
+                if near_duplicates is not None:
+                    base_count, pending = len(knowledge), []
+
+                    def get_text(position: int) -> str:
+                        return knowledge[position] if position < base_count else pending[position - base_count]
+
+                    admitted = []
+                    for item, digest in entries:
+                        if near_duplicates.admit(item, get_text, config["mode"], config["threshold"]):
+                            pending.append(item)
+                            admitted.append((item, digest))
+                    entries = admitted
+                if entries:
+                    previous_count = len(digests)
+                    self._append_to_log(entries)
+                    digests.update(digest for _, digest in entries)
+                    if near_duplicates is not None:
+                        near_duplicates.save()
+                    self._update_inverted_index(previous_count, (item for item, _ in entries))
+            return [item for item, _ in entries]
+
+    @instrumented("kb.add_knowledge")
+    def add_knowledge(self, knowledge_item: str) -> bool:
+        """Fügt ein Wissenselement hinzu, prüft über den Hash-Index auf Duplikate."""
+        if not self.append_knowledge([knowledge_item]):
+            print(f"Wissen '{knowledge_item[:50]}...' ist bereits vorhanden.")
+            return False
+        print(f"Wissen hinzugefügt: '{knowledge_item[:50]}...'")
+        return True
+
+    @instrumented("kb.apply_delta")
+    def apply_delta(self, removed_items: Iterable[str], added_items: Iterable[str], order: Iterable[str] = None) -> tuple[int, int]:
+        """
+        Wendet eine Änderungsmenge auf die Wissensbasis an. Hinzukommende Elemente
+        werden an das Segment-Log angehängt (die Indizes holen sie inkrementell nach);
+        entfernte Elemente werden aus Snapshot und Indizes gestrichen, ohne die
+        Indizes neu aufzubauen. Verbleibende Elemente behalten ihre Reihenfolge.
+        Mit order (z.B. den Elementen einer wiederhergestellten Version) entsteht diese
+        Reihenfolge: Ist der verbleibende Bestand ihr Anfang, werden die übrigen Elemente
+        angehängt, sonst an ihren Positionen eingefügt (abweichend geordnete Elemente werden
+        dazu verschoben, siehe ordered_subsequence); die Indizes rücken dabei wie beim
+        Entfernen nur Positionen nach.
+        Gibt (entfernt, hinzugefügt) zurück.
+        """
+        removed_items = set(removed_items)
+        removed_positions = set()
+        inserted = []
+        with self.lock.hold():
+            knowledge = self.get_knowledge() if removed_items or order is not None else None
+            moved = set()
+            if order is not None:
+                order = list(order)
+                order_set = set(order)
+                removed_items.update(item for item in knowledge if item not in order_set)
+                kept = [item for item in knowledge if item not in removed_items]
+                if order[:len(kept)] == kept:
+                    added_items = order[len(kept):]
+                else:
+                    # Einfügen mitten in den Bestand: Elemente außerhalb der gemeinsamen Reihenfolge
+                    # werden entfernt und wie die fehlenden an ihrer Position eingefügt
+                    stable = ordered_subsequence(kept, order)
+                    moved = set(kept) - stable
+                    removed_items |= moved
+                    inserted = [(position, item) for position, item in enumerate(order) if item not in stable]
+                    added_items = []
+            if removed_items or inserted:
+                digests = self._load_digest_index()
+                removed_positions = {position for position, item in enumerate(knowledge) if item in removed_items}
+                if inserted:
+                    self._write_snapshot(order)
+                else:
+                    self._write_snapshot(item for position, item in enumerate(knowledge) if position not in removed_positions)
+                self._recover_log()
+                self._remove_from_derived_indexes(removed_positions)
+                self._insert_into_derived_indexes(inserted)
+                digests.difference_update(item_digest(item) for item in removed_items)
+                digests.update(item_digest(item) for _, item in inserted)
+                self._write_digest_index_from_digests(digests)
+            # Wiederhergestellte Elemente nicht als Beinahe-Duplikate verwerfen
+            added = self.append_knowledge(added_items, check_near_duplicates=False)
+            return len(removed_positions) - len(moved), len(inserted) - len(moved) + len(added)
+
+    def _remove_from_derived_indexes(self, removed_positions: set[int]):
+        """Streicht entfernte Positionen aus den abgeleiteten Indizes."""
+        if os.path.exists(os.path.join(self.agent_path, INVERTED_INDEX_FILE_NAME)):
+            with closing(InvertedIndex(self.agent_path)) as inverted_index:
+                inverted_index.remove_documents(removed_positions)
+        if os.path.exists(os.path.join(self.agent_path, NEAR_DUPLICATE_INDEX_FILE_NAME)):
+            with closing(NearDuplicateIndex(self.agent_path)) as near_duplicates:
+                near_duplicates.remove_documents(removed_positions)
+        try:
+            embedding_index = EmbeddingIndex.open_existing(self.agent_path)
+            if embedding_index:
+                embedding_index.remove_rows(removed_positions)
+        except KnowledgeFlaskException:
+            # Ohne NumPy oder registrierten Embedder nicht fortschreibbar: neu aufbauen lassen
+            self._remove_file(os.path.join(self.agent_path, EMBEDDINGS_FILE_NAME))
+            self._remove_file(os.path.join(self.agent_path, EMBEDDINGS_META_FILE_NAME))
+
+    def _insert_into_derived_indexes(self, inserted: list[tuple[int, str]]):
+        """Fügt Elemente an ihren Positionen in die abgeleiteten Indizes ein (Gegenstück zu _remove_from_derived_indexes)."""
+        if not inserted:
+            return
+        if os.path.exists(os.path.join(self.agent_path, INVERTED_INDEX_FILE_NAME)):
+            with closing(InvertedIndex(self.agent_path)) as inverted_index:
+                inverted_index.insert_documents(inserted)
+        if os.path.exists(os.path.join(self.agent_path, NEAR_DUPLICATE_INDEX_FILE_NAME)):
+            with closing(NearDuplicateIndex(self.agent_path)) as near_duplicates:
+                near_duplicates.insert_documents(inserted)
+        try:
+            embedding_index = EmbeddingIndex.open_existing(self.agent_path)
+            if embedding_index:
+                embedding_index.insert_rows(inserted)
+        except KnowledgeFlaskException:
+            self._remove_file(os.path.join(self.agent_path, EMBEDDINGS_FILE_NAME))
+            self._remove_file(os.path.join(self.agent_path, EMBEDDINGS_META_FILE_NAME))
+
+    @instrumented("kb.add_knowledge_bulk")
+    def add_knowledge_bulk(self, knowledge_items: Iterable[str]) -> tuple[int, int]:
+        """
+        Fügt viele Wissenselemente in einem Durchgang hinzu. Die Elemente werden
+        gestreamt, über den Hash-Index dedupliziert und zusammen mit dem Bestand
+        in einen neuen Snapshot geschrieben, der atomar übernommen wird.
+        Gibt (hinzugefügt, übersprungen) zurück.
+        """
+        with self.lock.hold():
+            return self._add_knowledge_bulk(knowledge_items)
+
+    def _add_knowledge_bulk(self, knowledge_items: Iterable[str]) -> tuple[int, int]:
+        digests = set(self._load_digest_index()) # Kopie: bei einem Fehler bleibt der Index unverändert
+        new_digests = []
+        skipped = 0
+        knowledge = self.get_knowledge()
+        with self._open_near_duplicate_index(knowledge) as (near_duplicates, config):
+            pending = [] # Neue Elemente, nur für den Ähnlichkeitsvergleich gehalten
+
+            def get_text(position: int) -> str:
+                return knowledge[position] if position < len(knowledge) else pending[position - len(knowledge)]
+
+            def new_items():
+                nonlocal skipped
+                for item in knowledge_items:
+                    item = str(item)
+                    digest = item_digest(item)
+                    if digest in digests:
+                        skipped += 1
+                        continue
+                    if near_duplicates is not None:
+                        if not near_duplicates.admit(item, get_text, config["mode"], config["threshold"]):
+                            skipped += 1
+                            continue
+                        pending.append(item)
+                    digests.add(digest)
+                    new_digests.append(digest)
+                    yield item
+
+            self._write_snapshot(itertools.chain(knowledge, new_items()))
+            if near_duplicates is not None:
+                near_duplicates.save()
+        self._recover_log()
+        self._repair_tail(self.index_file_path)
+        try:
+            with open(self.index_file_path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{digest}\n" for digest in new_digests)
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Hash-Index '{self.index_file_path}': {e}") from e
+        self._digests = digests
+        if new_digests:
+            self._update_inverted_index(len(knowledge), self.iter_knowledge(len(knowledge), len(new_digests)))
+        return len(new_digests), skipped
+
+    @instrumented("kb.add_chunks")
+    def add_chunks(self, chunks: Iterable[dict], batch_size: int = DEFAULT_CHUNK_BATCH_SIZE) -> tuple[int, int]:
+        """
+        Schreibt Chunks (siehe iter_chunks) stapelweise über append_knowledge in das
+        Segment-Log und vermerkt die Herkunft der hinzugefügten in chunk_sources.jsonl.
+        Es wird immer nur ein Stapel im Speicher gehalten; jeder Stapel ist ein eigener Commit.
+        Gibt (hinzugefügt, übersprungen) zurück.
+        """
+        chunks = iter(chunks)
+        added = skipped = 0
+        while True:
+            batch = list(itertools.islice(chunks, max(1, batch_size)))
+            if not batch:
+                return added, skipped
+            stored = set(self.append_knowledge([chunk["text"] for chunk in batch]))
+            records = []
+            for chunk in batch:
+                if chunk["text"] in stored:
+                    stored.discard(chunk["text"]) # Gleicher Text im selben Stapel: nur das erste Vorkommen
+                    records.append(chunk)
+            self._append_chunk_sources(records)
+            added += len(records)
+            skipped += len(batch) - len(records)
+
+    def _append_chunk_sources(self, chunks: list[dict]):
+        """Hängt Digest, Quelle und Zeichen-Offsets der Chunks an chunk_sources.jsonl an."""
+        self._append_chunk_source_records([{"digest": item_digest(chunk["text"]), "source": chunk["source"],
+                                            "start": chunk["start"], "end": chunk["end"]} for chunk in chunks])
+
+    def _append_chunk_source_records(self, records: list[dict]):
+        """Hängt fertige Herkunftseinträge (digest, source, start, end) an chunk_sources.jsonl an."""
+        if not records:
+            return
+        self._repair_tail(self.chunk_sources_file_path)
+        try:
+            with open(self.chunk_sources_file_path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+            METRICS.count("files_opened")
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Chunk-Herkunft '{self.chunk_sources_file_path}': {e}") from e
+
+    def load_chunk_sources(self) -> dict[str, dict]:
+        """Gibt die Herkunft importierter Chunks zurück (Digest -> source, start, end)."""
+        sources = {}
+        try:
+            with open(self.chunk_sources_file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    sources[entry.pop("digest")] = entry
+        except FileNotFoundError:
+            pass
+        except (IOError, json.JSONDecodeError, KeyError) as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Chunk-Herkunft '{self.chunk_sources_file_path}': {e}") from e
+        return sources
+
+    @instrumented("kb.get_knowledge")
+    def get_knowledge(self) -> list[str]:
+        """Gibt die gesamte Wissensbasis (Snapshot und Segment-Log) zurück."""
+        with self.lock.hold(exclusive=False):
+            return self._load_knowledge_from_file() + self._load_log_items()
+
+    def knowledge_segments(self) -> list[list[str]]:
+        """Die Elemente als Liste von Segmenten (hier genau eines; vgl. ShardedKnowledgeBase)."""
+        return [self.get_knowledge()]
+
+    def version_chunk_map(self) -> list[tuple[str, int, int]]:
+        """
+        (Hash, Start, Anzahl) der Versions-Chunks der Wissensbasis, wie sie create_version ablegt.
+        Die abgeschlossenen Chunks des Snapshots kommen aus dem Zwischenspeicher; neu zerlegt
+        werden nur der offene letzte Chunk des Snapshots und das Segment-Log.
+        """
+        with self.lock.hold(exclusive=False):
+            chunk_map, start = self._snapshot_chunk_map()
+            for chunk in split_version_chunks(self.iter_knowledge(start)):
+                chunk_map.append((hashlib.sha256(serialize_version_chunk(chunk)).hexdigest(), start, len(chunk)))
+                start += len(chunk)
+            return chunk_map
+
+    def _snapshot_chunk_map(self) -> tuple[list[tuple[str, int, int]], int]:
+        """
+        Abgeschlossene Versions-Chunks des Snapshots und Start des offenen letzten Chunks.
+        Beides wird je Snapshot-Stand (Inode, Größe, Änderungszeit) in version_chunks.json
+        zwischengespeichert, ändert sich also nur beim Kompaktieren oder Ersetzen.
+        """
+        try:
+            stat = os.stat(self.snapshot_file_path)
+        except FileNotFoundError:
+            return [], 0
+        signature = [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+        cache_file_path = os.path.join(self.agent_path, VERSION_CHUNK_MAP_FILE_NAME)
+        try:
+            with open(cache_file_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached["signature"] == signature:
+                return [tuple(entry) for entry in cached["chunks"]], cached["tail_start"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass # Fehlt oder veraltet: neu zerlegen
+        snapshot_count = self._snapshot_row_count()
+        if snapshot_count < 0:
+            snapshot_count = len(self._load_knowledge_from_file())
+        chunk_map, start = [], 0
+        for chunk in split_version_chunks(self.iter_knowledge(0, snapshot_count)):
+            if not _ends_version_chunk(chunk):
+                break # Offener letzter Chunk: setzt sich im Segment-Log fort
+            chunk_map.append((hashlib.sha256(serialize_version_chunk(chunk)).hexdigest(), start, len(chunk)))
+            start += len(chunk)
+        tmp_path = f"{cache_file_path}.{uuid.uuid4().hex}.tmp" # Auch Leser schreiben den Zwischenspeicher
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"signature": signature, "chunks": chunk_map, "tail_start": start}, f)
+            os.replace(tmp_path, cache_file_path)
+        except OSError:
+            self._remove_file(tmp_path) # Nur ein Zwischenspeicher
+        return chunk_map, start
+
+    def iter_knowledge(self, offset: int = 0, limit: int = None) -> Iterator[str]:
+        """
+        Streamt einen Ausschnitt der Wissensbasis, ohne sie vollständig zu laden:
+        Snapshot-Elemente werden über die Zeilen-Offsets direkt angesprungen, danach
+        folgt das (in der Größe begrenzte) Segment-Log. Die geteilte Sperre wird
+        gehalten, bis der Iterator erschöpft oder geschlossen ist.
+        """
+        if limit is not None and limit <= 0:
+            return
+        with self.lock.hold(exclusive=False):
+            snapshot_count = self._snapshot_row_count()
+            if snapshot_count < 0:
+                snapshot = self._load_knowledge_from_file()
+                snapshot_count = len(snapshot)
+                snapshot_rows = iter(snapshot[offset:])
+            else:
+                snapshot_rows = self._iter_snapshot_rows(offset, max(0, snapshot_count - offset))
+            rows = itertools.chain(
+                snapshot_rows,
+                itertools.islice(self._iter_log_items(), max(0, offset - snapshot_count), None)
+            )
+            yield from itertools.islice(rows, limit)
+
+    @instrumented("kb.count_knowledge")
+    def count_knowledge(self) -> int:
+        """Gibt die Anzahl der Elemente zurück, ohne die Wissensbasis zu laden."""
+        with self.lock.hold(exclusive=False):
+            snapshot_count = self._snapshot_row_count()
+            if snapshot_count < 0:
+                snapshot_count = len(self._load_knowledge_from_file())
+            return snapshot_count + sum(1 for _ in self._iter_log_items())
+
+    @instrumented("kb.remove_near_duplicates")
+    def remove_near_duplicates(self, threshold: float = None, dry_run: bool = False) -> list[dict]:
+        """
+        Sucht Beinahe-Duplikate im Bestand (das erste Vorkommen bleibt erhalten) und
+        entfernt sie, sofern nicht dry_run. Gibt die gefundenen Duplikate zurück.
+        """
+        with self.lock.hold():
+            with closing(NearDuplicateIndex(self.agent_path, load=False)) as scan:
+                config = scan.load_config()
+                if threshold is None:
+                    threshold = config["threshold"] if config else DEFAULT_NEAR_DUPLICATE_THRESHOLD
+                knowledge = self.get_knowledge()
+                kept = [] # Position im Bestand je Position im Scan-Index
+                duplicates = []
+                for position, item in enumerate(knowledge):
+                    match = scan.find_or_add(item, lambda candidate: knowledge[kept[candidate]], threshold)
+                    if match is None:
+                        kept.append(position)
+                    else:
+                        duplicates.append({"position": position, "item": item,
+                                           "duplicate_of": kept[match[0]], "similarity": round(match[1], 3)})
+                if duplicates and not dry_run:
+                    self.apply_delta([duplicate["item"] for duplicate in duplicates], [])
+                    if config is not None:
+                        scan.save() # Entspricht genau dem bereinigten Bestand
+                return duplicates
+
+    @instrumented("kb.rebuild_indexes")
+    def rebuild_indexes(self) -> int:
+        """
+        Baut Hash-Index, Zeilen-Offsets, invertierten Index und (falls vorhanden)
+        die Embedding-Matrix vollständig neu auf. Gibt die Anzahl der Elemente zurück.
+        """
+        with self.lock.hold():
+            knowledge = self.get_knowledge()
+            embedding_index = EmbeddingIndex.open_existing(self.agent_path)
+            self._remove_derived_indexes()
+            self._write_digest_index(knowledge)
+            if os.path.exists(self.knowledge_file_path) and not self._uses_binary_store():
+                self._build_row_offsets()
+            with closing(InvertedIndex(self.agent_path, load=False)) as inverted_index:
+                inverted_index.rebuild(knowledge)
+            if embedding_index is not None:
+                embedding_index.sync(knowledge)
+        return len(knowledge)
+
+    @instrumented("kb.verify")
+    def verify(self) -> list[str]:
+        """Prüft Snapshot, Segment-Log und Hash-Index auf Konsistenz und gibt gefundene Probleme zurück."""
+        with self.lock.hold(exclusive=False):
+            try:
+                knowledge = self.get_knowledge()
+            except KnowledgeBaseCorruptError as e:
+                return [str(e)]
+            problems = []
+            duplicates = len(knowledge) - len(set(knowledge))
+            if duplicates:
+                problems.append(f"{duplicates} doppelte Elemente in der Wissensbasis.")
+            if os.path.exists(self.index_file_path):
+                self._digests = None
+                if self._load_digest_index() != {item_digest(item) for item in knowledge}:
+                    problems.append(f"Hash-Index '{self.index_file_path}' passt nicht zur Wissensbasis.")
+            return problems
+
+    @instrumented("kb.query")
+    def query(self, query_text: str, top_k: int = DEFAULT_TOP_K, mode: str = "bm25",
+              embedder: str = DEFAULT_EMBEDDER) -> list[dict]:
+        """
+        Durchsucht die Wissensbasis: 'bm25' über den invertierten Index, 'dense'
+        über die Embedding-Matrix. Gibt die besten top_k Treffer absteigend nach Score zurück.
+        Ist der Index aktuell, wird unter der geteilten Sperre gesucht; sonst wird er unter
+        der exklusiven Sperre nachgeführt, damit gleichzeitige Suchen und Schreiber ihn
+        nicht gleichzeitig fortschreiben. Wiederholte Anfragen auf demselben Stand
+        beantwortet der QUERY_CACHE.
+        """
+        if mode not in QUERY_MODES:
+            raise KnowledgeFlaskException(f"Unbekannter Suchmodus '{mode}'. Verfügbar: {', '.join(QUERY_MODES)}.")
+        generation = self.generation()
+        cache_key = query_cache_key(query_text, top_k, mode, embedder)
+        results = QUERY_CACHE.get(self.agent_path, generation, cache_key)
+        if results is not None:
+            return results
+        with self.lock.hold(exclusive=False):
+            results = self._search_index(query_text, top_k, mode, embedder, sync=False)
+        if results is None:
+            with self.lock.hold():
+                results = self._search_index(query_text, top_k, mode, embedder, sync=True)
+        QUERY_CACHE.put(self.agent_path, generation, cache_key, results)
+        return results
+
+    def _search_index(self, query_text: str, top_k: int, mode: str, embedder: str, sync: bool) -> list[dict]:
+        """Sucht über den Index des Modus; einen veralteten Index führt nur sync=True nach (sonst None)."""
+        knowledge = KnowledgeView(self)
+        index = InvertedIndex(self.agent_path) if mode == "bm25" else EmbeddingIndex(self.agent_path, get_embedder(embedder))
+        try:
+            if not index.is_current(knowledge):
+                if not sync:
+                    return None
+                index.sync(knowledge)
+            return [
+                {"position": position, "score": score, "item": knowledge[position]}
+                for position, score in index.search(query_text, top_k)
+            ]
+        finally:
+            if mode == "bm25":
+                index.close()
+
+    @instrumented("kb.migrate_format")
+    def migrate_format(self, storage_format: str, codec: str = DEFAULT_BINARY_CODEC) -> int:
+        """
+        Schreibt Snapshot und Segment-Log im Zielformat ('json' oder 'binary') neu und
+        gibt die Anzahl der Elemente zurück. Die Reihenfolge bleibt erhalten, daher
+        bleiben Hash-Index und abgeleitete Indizes gültig.
+        """
+        if storage_format not in STORAGE_FORMATS:
+            raise KnowledgeFlaskException(f"Unbekanntes Speicherformat '{storage_format}'. Verfügbar: {', '.join(STORAGE_FORMATS)}.")
+        with self.lock.hold():
+            QUERY_CACHE.invalidate(self.agent_path)
+            self._recover_log()
+            # Nach binary -> json gilt der neue Snapshot erst ohne knowledge.bin; bis dahin bleibt das beiseitegelegte Log gültig
+            if storage_format == "binary":
+                item_count = BinaryKnowledgeStore.write(self.binary_file_path, self.iter_knowledge(), codec,
+                                                        before_replace=self._retire_log)
+                self._remove_file(self.knowledge_file_path)
+                self._remove_file(self.row_offsets_file_path)
+            else:
+                self._write_json_snapshot(self.iter_knowledge())
+                self._remove_file(self.binary_file_path)
+                item_count = self._snapshot_row_count()
+            self._recover_log()
+            return item_count
+
+    def delete_knowledge_base_file(self):
+        """Löscht die Wissensbasis-Datei samt Segment-Log und Hash-Index."""
+        with self.lock.hold():
+            self._discard_log()
+            for file_path in (self.knowledge_file_path, self.binary_file_path):
+                if os.path.exists(file_path):
+                    try:
+                        os.remove(file_path)
+                        print(f"Wissensdatei '{os.path.basename(file_path)}' gelöscht.")
+                    except OSError as e:
+                        raise KnowledgeFlaskException(f"Fehler beim Löschen der Wissensdatei '{file_path}': {e}") from e
+
+class KnowledgeView(Sequence):
+    """
+    Schreibgeschützte Sequenz-Sicht auf die Wissensbasis, die Elemente und
+    Ausschnitte bei Bedarf über iter_knowledge() liest. Damit holen die Indizes
+    nur neue Elemente nach und Treffer werden einzeln gelesen.
+    """
+    def __init__(self, kb_manager: "KnowledgeBaseManager"):
+        self.kb_manager = kb_manager
+        self._length = None
+
+    def __len__(self) -> int:
+        if self._length is None:
+            self._length = self.kb_manager.count_knowledge()
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            return list(self.kb_manager.iter_knowledge(start, max(0, stop - start)))
+        if index < 0:
+            index += len(self)
+        items = list(self.kb_manager.iter_knowledge(index, 1))
+        if not items:
+            raise IndexError(index)
+        return items[0]
+
+class InvertedIndex:
+    """
+    Persistierter invertierter Index (Term -> Postings mit Termfrequenzen) für die
+    BM25-Suche über die Wissensbasis eines Agenten. Dokument-IDs sind die Positionen
+    der Elemente in der Wissensbasis. Postings und Dokumentlängen liegen in einer
+    SQLite-Datenbank mit Index auf dem Term, sodass eine Suche nur die Postings der
+    Anfrageterme liest und neue Elemente nur ihre eigenen Zeilen schreiben. Wie beim
+    Beinahe-Duplikat-Index werden neue Einträge bis save() im Speicher gesammelt.
+    """
+    def __init__(self, agent_path: str, load: bool = True):
+        self.index_file_path = os.path.join(agent_path, INVERTED_INDEX_FILE_NAME)
+        self.doc_count = 0
+        self.total_length = 0
+        self.pending_postings: dict[str, list[tuple[int, int]]] = {} # Noch nicht gespeicherte Einträge
+        self.pending_documents: list[tuple[int, str]] = [] # (Länge, Digest) der ungespeicherten Elemente
+        self._conn = None
+        self._persisted = load and os.path.exists(self.index_file_path) # Gespeicherte Einträge mitverwenden
+        if self._persisted:
+            self._load()
+
+    def _connect(self) -> "sqlite3.Connection":
+        """Öffnet die Index-Datenbank (einmal pro Instanz) und legt das Schema bei Bedarf an."""
+        if self._conn is None:
+            try:
+                # Der Servermodus hält den Index über Anfragen (Threads) hinweg, serialisiert durch LoadedAgent.lock
+                self._conn = sqlite3.connect(self.index_file_path, check_same_thread=False)
+                self._conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, position INTEGER NOT NULL, frequency INTEGER NOT NULL)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS postings_by_term ON postings (term)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS documents (position INTEGER NOT NULL, length INTEGER NOT NULL, digest TEXT NOT NULL)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS documents_by_position ON documents (position)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS state (doc_count INTEGER NOT NULL, total_length INTEGER NOT NULL)")
+                METRICS.count("files_opened")
+            except sqlite3.Error as e:
+                raise KnowledgeFlaskException(f"Fehler beim Öffnen des Index '{self.index_file_path}': {e}") from e
+        return self._conn
+
+    @instrumented("index.bm25.load")
+    def _load(self):
+        """Liest nur die Kennzahlen des Index; ein beschädigter Index wird verworfen und neu aufgebaut."""
+        try:
+            row = self._connect().execute("SELECT doc_count, total_length FROM state").fetchone()
+        except (KnowledgeFlaskException, sqlite3.DatabaseError) as e:
+            print(f"Fehler beim Lesen des Index '{self.index_file_path}': {e}. Index wird neu aufgebaut.", file=sys.stderr)
+            self.close()
+            try:
+                os.remove(self.index_file_path)
+            except OSError:
+                pass
+            self._reset()
+            return
+        self.doc_count, self.total_length = row if row else (0, 0)
+
+    def close(self):
+        """Schließt die Datenbankverbindung."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @instrumented("index.bm25.save")
+    def save(self):
+        """
+        Schreibt die gesammelten Einträge in einer Transaktion; ohne geladenen Stand wird
+        der Index ersetzt. Hat ein anderer Schreiber den gespeicherten Index inzwischen
+        fortgeführt, gilt dessen Stand und die gesammelten Einträge werden verworfen.
+        """
+        conn = self._connect()
+        first_position = self.doc_count - len(self.pending_documents)
+        try:
+            with conn:
+                if self._persisted:
+                    row = conn.execute("SELECT doc_count FROM state").fetchone()
+                    if (row[0] if row else 0) != first_position:
+                        self.pending_postings = {}
+                        self.pending_documents = []
+                        self._load()
+                        return
+                else:
+                    conn.execute("DELETE FROM postings")
+                    conn.execute("DELETE FROM documents")
+                conn.executemany(
+                    "INSERT INTO postings (term, position, frequency) VALUES (?, ?, ?)",
+                    ((term, position, frequency) for term, postings in self.pending_postings.items()
+                     for position, frequency in postings)
+                )
+                conn.executemany(
+                    "INSERT INTO documents (position, length, digest) VALUES (?, ?, ?)",
+                    ((first_position + offset, length, digest) for offset, (length, digest) in enumerate(self.pending_documents))
+                )
+                conn.execute("DELETE FROM state")
+                conn.execute("INSERT INTO state (doc_count, total_length) VALUES (?, ?)", (self.doc_count, self.total_length))
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Index '{self.index_file_path}': {e}") from e
+        self.pending_postings = {}
+        self.pending_documents = []
+        self._persisted = True
+
+    def _reset(self):
+        """Leert den Index; der gespeicherte Stand wird beim nächsten save() ersetzt."""
+        self.doc_count = 0
+        self.total_length = 0
+        self.pending_postings = {}
+        self.pending_documents = []
+        self._persisted = False
+
+    def add_documents(self, knowledge_items: Iterable[str]):
+        """Indexiert Elemente, die an die Wissensbasis angehängt wurden."""
+        for item in knowledge_items:
+            terms = tokenize(item)
+            for term, frequency in Counter(terms).items():
+                self.pending_postings.setdefault(term, []).append((self.doc_count, frequency))
+            self.pending_documents.append((len(terms), item_digest(item)))
+            self.doc_count += 1
+            self.total_length += len(terms)
+
+    def remove_documents(self, removed_positions: set[int]):
+        """
+        Streicht Elemente aus dem Index und rückt die Positionen der übrigen nach,
+        ohne deren Text erneut zu tokenisieren.
+        """
+        removed_positions = sorted(position for position in removed_positions if position < self.doc_count)
+        if not removed_positions:
+            return
+        self.save()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS removed (position INTEGER PRIMARY KEY)")
+                conn.execute("DELETE FROM removed")
+                conn.executemany("INSERT INTO removed (position) VALUES (?)", ((position,) for position in removed_positions))
+                removed_length = conn.execute(
+                    "SELECT COALESCE(SUM(length), 0) FROM documents WHERE position IN (SELECT position FROM removed)"
+                ).fetchone()[0]
+                for table in ("postings", "documents"):
+                    conn.execute(f"DELETE FROM {table} WHERE position IN (SELECT position FROM removed)")
+                    conn.execute(
+                        f"UPDATE {table} SET position = position - "
+                        f"(SELECT COUNT(*) FROM removed WHERE removed.position < {table}.position)"
+                    )
+                self.doc_count -= len(removed_positions)
+                self.total_length -= removed_length
+                conn.execute("UPDATE state SET doc_count = ?, total_length = ?", (self.doc_count, self.total_length))
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Index '{self.index_file_path}': {e}") from e
+
+    def insert_documents(self, inserted: list[tuple[int, str]]):
+        """
+        Fügt Elemente an den angegebenen Positionen (aufsteigend, nach dem Einfügen) ein
+        und rückt die Positionen der übrigen nach, ohne deren Text erneut zu tokenisieren.
+        """
+        points = insertion_points(inserted, self.doc_count)
+        if not points:
+            return
+        self.save()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS inserted (position INTEGER NOT NULL)")
+                conn.execute("DELETE FROM inserted")
+                conn.executemany("INSERT INTO inserted (position) VALUES (?)", ((before,) for before, _, _ in points))
+                for table in ("postings", "documents"):
+                    conn.execute(
+                        f"UPDATE {table} SET position = position + "
+                        f"(SELECT COUNT(*) FROM inserted WHERE inserted.position <= {table}.position)"
+                    )
+                added_length = 0
+                for _, position, item in points:
+                    terms = tokenize(item)
+                    conn.executemany("INSERT INTO postings (term, position, frequency) VALUES (?, ?, ?)",
+                                     ((term, position, frequency) for term, frequency in Counter(terms).items()))
+                    conn.execute("INSERT INTO documents (position, length, digest) VALUES (?, ?, ?)",
+                                 (position, len(terms), item_digest(item)))
+                    added_length += len(terms)
+                conn.execute("UPDATE state SET doc_count = ?, total_length = ?",
+                             (self.doc_count + len(points), self.total_length + added_length))
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Index '{self.index_file_path}': {e}") from e
+        self.doc_count += len(points)
+        self.total_length += added_length
+
+    def last_digest(self) -> str:
+        """Digest des zuletzt indexierten Elements (None bei leerem Index)."""
+        if self.pending_documents:
+            return self.pending_documents[-1][1]
+        if not self.doc_count or not self._persisted:
+            return None
+        try:
+            row = self._connect().execute("SELECT digest FROM documents WHERE position = ?", (self.doc_count - 1,)).fetchone()
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen des Index '{self.index_file_path}': {e}") from e
+        return row[0] if row else None
+
+    def is_current(self, knowledge: Sequence) -> bool:
+        """Prüft, ob der Index genau die Elemente von knowledge abdeckt (Anzahl und letztes Element)."""
+        return self.doc_count == len(knowledge) and (
+            not self.doc_count or self.last_digest() == item_digest(knowledge[self.doc_count - 1])
+        )
+
+    @instrumented("index.bm25.sync")
+    def sync(self, knowledge: Sequence, save: bool = True) -> int:
+        """
+        Bringt den Index auf den Stand der Wissensbasis und gibt die Anzahl neu
+        indexierter Elemente zurück. Passt das zuletzt indexierte Element nicht mehr
+        (Wissensbasis kürzer oder umgeschrieben), wird er neu aufgebaut.
+        Mit save=False bleiben die neuen Einträge bis save() im Speicher.
+        """
+        if self.doc_count > len(knowledge) or (
+            self.doc_count and self.last_digest() != item_digest(knowledge[self.doc_count - 1])
+        ):
+            self._reset()
+        new_items = knowledge[self.doc_count:]
+        if new_items:
+            self.add_documents(new_items)
+            if save:
+                self.save()
+        return len(new_items)
+
+    def rebuild(self, knowledge: Iterable[str]):
+        """Baut den Index vollständig neu auf."""
+        self._reset()
+        self.add_documents(knowledge)
+        self.save()
+
+    def _postings(self, terms: list[str]) -> dict[str, list[tuple[int, int, int]]]:
+        """Liest (Position, Frequenz, Dokumentlänge) für die gegebenen Terme, gespeichert und ungespeichert."""
+        postings = {term: [] for term in terms}
+        if self._persisted and terms:
+            try:
+                rows = self._connect().execute(
+                    "SELECT p.term, p.position, p.frequency, d.length FROM postings p "
+                    f"JOIN documents d ON d.position = p.position WHERE p.term IN ({','.join('?' * len(terms))})",
+                    terms
+                ).fetchall()
+            except sqlite3.Error as e:
+                raise KnowledgeFlaskException(f"Fehler beim Lesen des Index '{self.index_file_path}': {e}") from e
+            for term, position, frequency, length in rows:
+                postings[term].append((position, frequency, length))
+        first_pending = self.doc_count - len(self.pending_documents)
+        for term in terms:
+            postings[term].extend(
+                (position, frequency, self.pending_documents[position - first_pending][0])
+                for position, frequency in self.pending_postings.get(term, ())
+            )
+        return postings
+
+    @instrumented("index.bm25.search")
+    def search(self, query_text: str, top_k: int = DEFAULT_TOP_K) -> list[tuple[int, float]]:
+        """
+        BM25-Scoring über die Postings der Anfrageterme und Top-k-Auswahl per Heap.
+        Gelesen werden nur die Postings der Anfrageterme; die Laufzeit hängt von deren
+        Anzahl ab, nicht von der Korpusgröße.
+        """
+        doc_count = self.doc_count
+        if doc_count == 0 or top_k <= 0:
+            return []
+        average_length = self.total_length / doc_count or 1.0
+        scores: dict[int, float] = {}
+        for postings in self._postings(sorted(set(tokenize(query_text)))).values():
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency, length in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        # Bei gleichem Score gewinnt die frühere Position, unabhängig von der Lesereihenfolge der Postings
+        return heapq.nlargest(top_k, scores.items(), key=lambda entry: (entry[1], -entry[0]))
+
+class NearDuplicateIndex:
+    """
+    LSH-Index für Beinahe-Duplikate: Jedes Element wird normalisiert (Kleinschreibung,
+    Leerraum), in Zeichen-Shingles zerlegt und per One-Permutation-MinHash signiert.
+    Die Signatur wird in Bänder zerlegt; Elemente mit einem gemeinsamen Band-Bucket
+    sind Kandidaten, die anschließend exakt per Jaccard-Ähnlichkeit geprüft werden.
+    Die Buckets liegen in einer SQLite-Tabelle mit Index auf dem Schlüssel, sodass
+    eine Prüfung nur die eigenen Bänder liest. Wie beim invertierten Index sind die
+    Dokument-IDs die Positionen der Elemente; neue Einträge werden bis save() im
+    Speicher gesammelt.
+    """
+    def __init__(self, agent_path: str, load: bool = True):
+        self.index_file_path = os.path.join(agent_path, NEAR_DUPLICATE_INDEX_FILE_NAME)
+        self.config_file_path = os.path.join(agent_path, NEAR_DUPLICATE_CONFIG_FILE_NAME)
+        self.item_count = 0
+        self.buckets: dict[int, list[int]] = {} # Noch nicht gespeicherte Einträge
+        self._conn = None
+        self._persisted = load and os.path.exists(self.index_file_path) # Gespeicherte Einträge mitverwenden
+        if self._persisted:
+            try:
+                row = self._connect().execute("SELECT item_count FROM state").fetchone()
+                self.item_count = row[0] if row else 0
+            except (sqlite3.Error, KnowledgeFlaskException) as e:
+                # Unlesbarer Index: verwerfen, sync() baut ihn aus der Wissensbasis neu auf
+                print(f"Warnung: Duplikat-Index '{self.index_file_path}' ist unlesbar und wird neu aufgebaut: {e}", file=sys.stderr)
+                self.close()
+                try:
+                    os.remove(self.index_file_path)
+                except FileNotFoundError:
+                    pass
+                self._reset()
+
+    def load_config(self):
+        """Gibt {'mode', 'threshold'} zurück oder None, wenn die Prüfung ausgeschaltet ist."""
+        if not os.path.exists(self.config_file_path):
+            return None
+        try:
+            with open(self.config_file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Duplikat-Konfiguration '{self.config_file_path}': {e}") from e
+
+    def configure(self, mode: str, threshold: float = DEFAULT_NEAR_DUPLICATE_THRESHOLD):
+        """Schaltet die Prüfung beim Hinzufügen ein ('flag', 'skip') oder aus ('off')."""
+        if mode not in NEAR_DUPLICATE_MODES:
+            raise KnowledgeFlaskException(f"Unbekannter Modus '{mode}'. Verfügbar: {', '.join(NEAR_DUPLICATE_MODES)}.")
+        if not 0 < threshold <= 1:
+            raise KnowledgeFlaskException("Der Schwellwert muss zwischen 0 und 1 liegen.")
+        try:
+            if mode == "off":
+                for path in (self.config_file_path, self.index_file_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return
+            with open(self.config_file_path, 'w', encoding='utf-8') as f:
+                json.dump({"mode": mode, "threshold": threshold}, f)
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Duplikat-Konfiguration '{self.config_file_path}': {e}") from e
+
+    def _connect(self) -> "sqlite3.Connection":
+        """Öffnet die Index-Datenbank (einmal pro Instanz) und legt das Schema bei Bedarf an."""
+        if self._conn is None:
+            try:
+                self._conn = sqlite3.connect(self.index_file_path)
+                self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (key INTEGER NOT NULL, position INTEGER NOT NULL)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_by_key ON buckets (key)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS state (item_count INTEGER NOT NULL)")
+                METRICS.count("files_opened")
+            except sqlite3.Error as e:
+                raise KnowledgeFlaskException(f"Fehler beim Öffnen des Duplikat-Index '{self.index_file_path}': {e}") from e
+        return self._conn
+
+    def close(self):
+        """Schließt die Datenbankverbindung."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @instrumented("index.lsh.save")
+    def save(self):
+        """Schreibt die gesammelten Einträge in einer Transaktion; ohne geladenen Stand wird der Index ersetzt."""
+        conn = self._connect()
+        try:
+            with conn:
+                if not self._persisted:
+                    conn.execute("DELETE FROM buckets")
+                conn.executemany(
+                    "INSERT INTO buckets (key, position) VALUES (?, ?)",
+                    ((key, position) for key, positions in self.buckets.items() for position in positions)
+                )
+                conn.execute("DELETE FROM state")
+                conn.execute("INSERT INTO state (item_count) VALUES (?)", (self.item_count,))
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Duplikat-Index '{self.index_file_path}': {e}") from e
+        self.buckets = {}
+        self._persisted = True
+
+    def _reset(self):
+        """Leert den Index; der gespeicherte Stand wird beim nächsten save() ersetzt."""
+        self.item_count = 0
+        self.buckets = {}
+        self._persisted = False
+
+    @staticmethod
+    def shingles(text: str) -> set[str]:
+        """Zerlegt den normalisierten Text in überlappende Zeichen-n-Gramme."""
+        normalized = " ".join(text.lower().split())
+        if len(normalized) <= NEAR_DUPLICATE_SHINGLE_SIZE:
+            return {normalized} if normalized else set()
+        return {normalized[i:i + NEAR_DUPLICATE_SHINGLE_SIZE] for i in range(len(normalized) - NEAR_DUPLICATE_SHINGLE_SIZE + 1)}
+
+    @staticmethod
+    def similarity(shingles: set[str], other: set[str]) -> float:
+        """Jaccard-Ähnlichkeit zweier Shingle-Mengen."""
+        if not shingles or not other:
+            return 0.0
+        return len(shingles & other) / len(shingles | other)
+
+    @staticmethod
+    def band_keys(shingles: set[str]) -> list[int]:
+        """
+        Berechnet die MinHash-Signatur per One-Permutation-Hashing (ein Hash pro Shingle,
+        Minimum je Bin, leere Bins per Rotation aufgefüllt) und gibt ihre Band-Schlüssel
+        (Bandnummer in den oberen, Hash der Zeilen in den unteren 32 Bit) zurück.
+        """
+        bin_count = MINHASH_BANDS * MINHASH_ROWS
+        bins = [None] * bin_count
+        for shingle in shingles:
+            value = zlib.crc32(shingle.encode('utf-8'))
+            slot, value = value % bin_count, value // bin_count
+            if bins[slot] is None or value < bins[slot]:
+                bins[slot] = value
+        if all(value is None for value in bins):
+            return []
+        value_range = 2 ** 32 // bin_count
+        signature = []
+        for slot in range(bin_count):
+            distance = 0
+            while bins[(slot + distance) % bin_count] is None:
+                distance += 1
+            signature.append(bins[(slot + distance) % bin_count] + distance * value_range)
+        return [
+            (band << 32) | zlib.crc32(struct.pack(f"<{MINHASH_ROWS}I", *signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]))
+            for band in range(MINHASH_BANDS)
+        ]
+
+    def _add_keys(self, keys: list[int]):
+        """Trägt das nächste Element (Position item_count) in seine Buckets ein."""
+        for key in keys:
+            self.buckets.setdefault(key, []).append(self.item_count)
+        self.item_count += 1
+
+    def add_documents(self, knowledge_items: Iterable[str]):
+        """Indexiert Elemente, die an die Wissensbasis angehängt wurden."""
+        for item in knowledge_items:
+            self._add_keys(self.band_keys(self.shingles(item)))
+
+    def remove_documents(self, removed_positions: set[int]):
+        """Streicht Elemente aus den Buckets und rückt die Positionen der übrigen nach."""
+        removed_positions = sorted(position for position in removed_positions if position < self.item_count)
+        if not removed_positions:
+            return
+        self.save()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS removed (position INTEGER PRIMARY KEY)")
+                conn.execute("DELETE FROM removed")
+                conn.executemany("INSERT INTO removed (position) VALUES (?)", ((position,) for position in removed_positions))
+                conn.execute("DELETE FROM buckets WHERE position IN (SELECT position FROM removed)")
+                conn.execute(
+                    "UPDATE buckets SET position = position - "
+                    "(SELECT COUNT(*) FROM removed WHERE removed.position < buckets.position)"
+                )
+                self.item_count -= len(removed_positions)
+                conn.execute("UPDATE state SET item_count = ?", (self.item_count,))
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Duplikat-Index '{self.index_file_path}': {e}") from e
+
+    def insert_documents(self, inserted: list[tuple[int, str]]):
+        """Fügt Elemente an den angegebenen Positionen (aufsteigend, nach dem Einfügen) ein und rückt die übrigen nach."""
+        points = insertion_points(inserted, self.item_count)
+        if not points:
+            return
+        self.save()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS inserted (position INTEGER NOT NULL)")
+                conn.execute("DELETE FROM inserted")
+                conn.executemany("INSERT INTO inserted (position) VALUES (?)", ((before,) for before, _, _ in points))
+                conn.execute(
+                    "UPDATE buckets SET position = position + "
+                    "(SELECT COUNT(*) FROM inserted WHERE inserted.position <= buckets.position)"
+                )
+                conn.executemany(
+                    "INSERT INTO buckets (key, position) VALUES (?, ?)",
+                    ((key, position) for _, position, item in points for key in self.band_keys(self.shingles(item)))
+                )
+                conn.execute("UPDATE state SET item_count = ?", (self.item_count + len(points),))
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Duplikat-Index '{self.index_file_path}': {e}") from e
+        self.item_count += len(points)
+
+    @instrumented("index.lsh.sync")
+    def sync(self, knowledge: Sequence, save: bool = True) -> int:
+        """Indexiert nur neu hinzugekommene Elemente; ist die Wissensbasis kürzer, wird neu aufgebaut."""
+        if len(knowledge) < self.item_count:
+            self._reset()
+        new_items = knowledge[self.item_count:]
+        if new_items:
+            self.add_documents(new_items)
+            if save:
+                self.save()
+        return len(new_items)
+
+    def _find(self, shingles: set[str], keys: list[int], get_text: Callable[[int], str], threshold: float):
+        """Prüft die Kandidaten mit den meisten gemeinsamen Bändern exakt; gibt (Position, Ähnlichkeit) oder None zurück."""
+        shared = Counter()
+        for key in keys:
+            shared.update(self.buckets.get(key, ()))
+        if self._persisted and keys:
+            try:
+                rows = self._connect().execute(
+                    f"SELECT position FROM buckets WHERE key IN ({','.join('?' * len(keys))})", keys
+                ).fetchall()
+            except sqlite3.Error as e:
+                raise KnowledgeFlaskException(f"Fehler beim Lesen des Duplikat-Index '{self.index_file_path}': {e}") from e
+            shared.update(row[0] for row in rows)
+        best = None
+        for position, _ in shared.most_common(NEAR_DUPLICATE_MAX_CANDIDATES):
+            similarity = self.similarity(shingles, self.shingles(get_text(position)))
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (position, similarity)
+        return best
+
+    def find(self, text: str, get_text: Callable[[int], str], threshold: float = DEFAULT_NEAR_DUPLICATE_THRESHOLD):
+        """Sucht das ähnlichste indexierte Element ab dem Schwellwert; get_text liefert den Text zu einer Position."""
+        shingles = self.shingles(text)
+        return self._find(shingles, self.band_keys(shingles), get_text, threshold)
+
+    def find_or_add(self, text: str, get_text: Callable[[int], str], threshold: float = DEFAULT_NEAR_DUPLICATE_THRESHOLD):
+        """Wie find; ohne Treffer wird der Text als nächstes Element (Position item_count) indexiert."""
+        shingles = self.shingles(text)
+        keys = self.band_keys(shingles)
+        match = self._find(shingles, keys, get_text, threshold)
+        if match is None:
+            self._add_keys(keys)
+        return match
+
+    def admit(self, knowledge_item: str, get_text: Callable[[int], str], mode: str, threshold: float) -> bool:
+        """
+        Prüft ein neues Element vor dem Anhängen. Beinahe-Duplikate werden gemeldet und
+        im Modus 'skip' abgelehnt (False); aufgenommene Elemente werden indexiert.
+        """
+        shingles = self.shingles(knowledge_item)
+        keys = self.band_keys(shingles)
+        match = self._find(shingles, keys, get_text, threshold)
+        if match is not None:
+            METRICS.count("near_duplicates")
+            action = "übersprungen" if mode == "skip" else "trotzdem hinzugefügt"
+            print(f"Hinweis: '{knowledge_item[:50]}...' ähnelt Element {match[0] + 1} "
+                  f"(Ähnlichkeit {match[1]:.2f}) und wurde {action}.", file=sys.stderr)
+            if mode == "skip":
+                return False
+        self._add_keys(keys)
+        return True
+
+def _import_numpy():
+    """Importiert NumPy erst bei Bedarf (nur für die semantische Suche nötig)."""
+    try:
+        import numpy
+    except ImportError as e:
+        raise KnowledgeFlaskException("Für die semantische Suche wird NumPy benötigt (pip install numpy).") from e
+    return numpy
+
+class Embedder(ABC):
+    """Abstrakte Basisklasse für Embedder: bildet Texte auf float32-Vektoren fester Dimension ab."""
+    name = "base"
+
+    def __init__(self, dimension: int = DEFAULT_EMBEDDING_DIMENSION):
+        self.dimension = dimension
+
+    @abstractmethod
+    def embed(self, texts: list[str]):
+        """Gibt eine (len(texts), dimension)-Matrix vom Typ float32 zurück."""
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministischer, lokaler Embedder per Feature-Hashing der Terme
+    (mit Vorzeichen-Hashing), L2-normalisiert. Benötigt kein Netzwerk.
+    """
+    name = "hashing"
+
+    def embed(self, texts: list[str]):
+        np = _import_numpy()
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                value = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), "little")
+                vectors[row, value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+# Registrierte Embedder; weitere können über register_embedder() ergänzt werden
+EMBEDDERS: dict[str, type] = {HashingEmbedder.name: HashingEmbedder}
+
+def register_embedder(embedder_class: type):
+    """Registriert eine Embedder-Klasse unter ihrem Namen."""
+    EMBEDDERS[embedder_class.name] = embedder_class
+
+def get_embedder(name: str = DEFAULT_EMBEDDER, dimension: int = DEFAULT_EMBEDDING_DIMENSION) -> Embedder:
+    """Erzeugt einen registrierten Embedder."""
+    if name not in EMBEDDERS:
+        raise KnowledgeFlaskException(f"Unbekannter Embedder '{name}'. Verfügbar: {', '.join(sorted(EMBEDDERS))}.")
+    return EMBEDDERS[name](dimension)
+
+class EmbeddingIndex:
+    """
+    Dichte Embedding-Matrix eines Agenten als .npy-Datei (float32, Zeile = Position
+    des Elements). Die Datei wird per np.load(mmap_mode='r') gelesen und nur am Ende
+    erweitert; der Header hat eine feste Größe und wird nach dem Anhängen aktualisiert.
+    """
+    def __init__(self, agent_path: str, embedder: Embedder):
+        self.embedder = embedder
+        self.matrix_file_path = os.path.join(agent_path, EMBEDDINGS_FILE_NAME)
+        self.meta_file_path = os.path.join(agent_path, EMBEDDINGS_META_FILE_NAME)
+
+    @classmethod
+    def open_existing(cls, agent_path: str):
+        """Öffnet eine vorhandene Matrix mit dem Embedder aus ihren Metadaten (sonst None)."""
+        meta_file_path = os.path.join(agent_path, EMBEDDINGS_META_FILE_NAME)
+        if not (os.path.exists(meta_file_path) and os.path.exists(os.path.join(agent_path, EMBEDDINGS_FILE_NAME))):
+            return None
+        try:
+            with open(meta_file_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Embedding-Metadaten '{meta_file_path}': {e}") from e
+        return cls(agent_path, get_embedder(meta["embedder"], meta["dimension"]))
+
+    def _header(self, rows: int) -> bytes:
+        """Erzeugt einen .npy-Header (Version 1.0) fester Größe."""
+        header = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d, %d), }" % (rows, self.embedder.dimension)
+        header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + "\n"
+        return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode('latin1')
+
+    def _is_compatible(self) -> bool:
+        """Prüft, ob die gespeicherte Matrix mit dem aktuellen Embedder erzeugt wurde."""
+        if not (os.path.exists(self.matrix_file_path) and os.path.exists(self.meta_file_path)):
+            return False
+        try:
+            with open(self.meta_file_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return False
+        return meta == {"embedder": self.embedder.name, "dimension": self.embedder.dimension}
+
+    def _create(self):
+        """Legt eine leere Matrix samt Metadaten an."""
+        try:
+            with open(self.matrix_file_path, 'wb') as f:
+                f.write(self._header(0))
+            with open(self.meta_file_path, 'w', encoding='utf-8') as f:
+                json.dump({"embedder": self.embedder.name, "dimension": self.embedder.dimension}, f)
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Anlegen der Embedding-Matrix '{self.matrix_file_path}': {e}") from e
+
+    def row_count(self) -> int:
+        """Anzahl der gespeicherten Zeilen laut Dateigröße."""
+        data_bytes = os.path.getsize(self.matrix_file_path) - NPY_HEADER_SIZE
+        return data_bytes // (4 * self.embedder.dimension)
+
+    def _append(self, vectors, rows_before: int):
+        """Hängt Zeilen an die Matrix an, ohne die vorhandenen neu zu schreiben."""
+        np = _import_numpy()
+        try:
+            with open(self.matrix_file_path, 'r+b') as f:
+                f.seek(NPY_HEADER_SIZE + rows_before * 4 * self.embedder.dimension)
+                f.write(np.ascontiguousarray(vectors, dtype='<f4').tobytes())
+                f.truncate()
+                # Header erst nach den Daten aktualisieren: ein Abbruch hinterlässt höchstens überzählige Bytes
+                f.seek(0)
+                f.write(self._header(rows_before + len(vectors)))
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Erweitern der Embedding-Matrix '{self.matrix_file_path}': {e}") from e
+
+    def remove_rows(self, removed_positions: set[int]):
+        """
+        Streicht Zeilen aus der Matrix, ohne Embeddings neu zu berechnen. Liegen alle
+        entfernten Zeilen am Ende (typisches Zurückrollen), wird die Datei nur gekürzt.
+        """
+        np = _import_numpy()
+        rows = self.row_count()
+        removed = sorted(position for position in removed_positions if position < rows)
+        if not removed:
+            return
+        row_bytes = 4 * self.embedder.dimension
+        kept_rows = rows - len(removed)
+        try:
+            if removed[0] == kept_rows:
+                with open(self.matrix_file_path, 'r+b') as f:
+                    f.truncate(NPY_HEADER_SIZE + kept_rows * row_bytes)
+                    f.seek(0)
+                    f.write(self._header(kept_rows))
+                return
+            matrix = np.load(self.matrix_file_path, mmap_mode='r')
+            keep = np.ones(rows, dtype=bool)
+            keep[removed] = False
+            tmp_path = f"{self.matrix_file_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(self._header(kept_rows))
+                for start in range(0, rows, EMBEDDING_SEARCH_BLOCK_ROWS):
+                    block = matrix[start:start + EMBEDDING_SEARCH_BLOCK_ROWS]
+                    f.write(np.ascontiguousarray(block[keep[start:start + EMBEDDING_SEARCH_BLOCK_ROWS]], dtype='<f4').tobytes())
+            del matrix
+            os.replace(tmp_path, self.matrix_file_path)
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Kürzen der Embedding-Matrix '{self.matrix_file_path}': {e}") from e
+
+    def insert_rows(self, inserted: list[tuple[int, str]]):
+        """
+        Fügt Zeilen für Elemente an den angegebenen Positionen (aufsteigend, nach dem Einfügen)
+        ein; berechnet werden nur die Embeddings der eingefügten Elemente.
+        """
+        np = _import_numpy()
+        rows = self.row_count()
+        points = insertion_points(inserted, rows)
+        if not points:
+            return
+        vectors = np.ascontiguousarray(self.embedder.embed([item for _, _, item in points]), dtype='<f4')
+        boundaries = [before for before, _, _ in points] + [rows]
+        try:
+            matrix = np.load(self.matrix_file_path, mmap_mode='r')
+            tmp_path = f"{self.matrix_file_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(self._header(rows + len(points)))
+                start = 0
+                for number, stop in enumerate(boundaries):
+                    for block_start in range(start, stop, EMBEDDING_SEARCH_BLOCK_ROWS):
+                        block = matrix[block_start:min(stop, block_start + EMBEDDING_SEARCH_BLOCK_ROWS)]
+                        f.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+                    if number < len(points):
+                        f.write(vectors[number].tobytes())
+                    start = stop
+            del matrix
+            os.replace(tmp_path, self.matrix_file_path)
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Erweitern der Embedding-Matrix '{self.matrix_file_path}': {e}") from e
+
+    def is_current(self, knowledge: Sequence) -> bool:
+        """Prüft, ob die Matrix mit dem aktuellen Embedder genau eine Zeile je Element enthält."""
+        return self._is_compatible() and self.row_count() == len(knowledge)
+
+    @instrumented("index.dense.sync")
+    def sync(self, knowledge: list[str]) -> int:
+        """
+        Berechnet Embeddings nur für Elemente, die seit dem letzten Stand hinzugekommen
+        sind, und gibt deren Anzahl zurück. Passt die Matrix nicht (anderer Embedder,
+        mehr Zeilen als Elemente), wird sie neu aufgebaut.
+        """
+        if not self._is_compatible() or self.row_count() > len(knowledge):
+            self._create()
+        rows = self.row_count()
+        for start in range(rows, len(knowledge), EMBEDDING_BATCH_SIZE):
+            batch = knowledge[start:start + EMBEDDING_BATCH_SIZE]
+            self._append(self.embedder.embed(batch), start)
+        return len(knowledge) - rows
+
+    @instrumented("index.dense.search")
+    def search(self, query_text: str, top_k: int = DEFAULT_TOP_K) -> list[tuple[int, float]]:
+        """
+        Kosinus-Ähnlichkeit per blockweisem Matrix-Vektor-Produkt über die
+        memory-mapped Matrix; Top-k je Block per argpartition, danach zusammengeführt.
+        """
+        np = _import_numpy()
+        if top_k <= 0 or not os.path.exists(self.matrix_file_path):
+            return []
+        matrix = np.load(self.matrix_file_path, mmap_mode='r')
+        query_vector = self.embedder.embed([query_text])[0]
+        best_positions = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, matrix.shape[0], EMBEDDING_SEARCH_BLOCK_ROWS):
+            scores = matrix[start:start + EMBEDDING_SEARCH_BLOCK_ROWS] @ query_vector
+            if len(scores) > top_k:
+                candidates = np.argpartition(scores, -top_k)[-top_k:]
+            else:
+                candidates = np.arange(len(scores))
+            best_positions = np.concatenate([best_positions, candidates + start])
+            best_scores = np.concatenate([best_scores, scores[candidates]])
+            if len(best_scores) > top_k:
+                keep = np.argpartition(best_scores, -top_k)[-top_k:]
+                best_positions, best_scores = best_positions[keep], best_scores[keep]
+        order = np.argsort(-best_scores, kind="stable")
+        return [(int(best_positions[i]), float(best_scores[i])) for i in order]
+
+class ObjectStore:
+    """
+    Content-addressed Speicher: Objekte werden unter dem SHA-256 ihres Inhalts
+    (zlib-komprimiert) in objects/<2 Zeichen>/<Hash> abgelegt und damit von
+    allen Versionen gemeinsam genutzt.
+    """
+    def __init__(self, objects_dir: str):
+        self.objects_dir = objects_dir
+
+    def _get_object_path(self, digest: str) -> str:
+        """Gibt den Pfad zu einem Objekt zurück."""
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        """Speichert ein Objekt, sofern es noch nicht existiert, und gibt seinen Hash zurück."""
+        digest = hashlib.sha256(data).hexdigest()
+        object_path = self._get_object_path(digest)
+        if os.path.exists(object_path):
+            return digest
+        tmp_path = f"{object_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                METRICS.count("files_opened")
+                METRICS.count("bytes_saved", f.write(zlib.compress(data)))
+            os.replace(tmp_path, object_path)
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Objekts '{digest}': {e}") from e
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Liest ein Objekt."""
+        try:
+            with open(self._get_object_path(digest), 'rb') as f:
+                data = f.read()
+            METRICS.count("files_opened")
+            METRICS.count("bytes_loaded", len(data))
+            return zlib.decompress(data)
+        except (OSError, zlib.error) as e:
+            raise KnowledgeFlaskException(f"Objekt '{digest}' fehlt oder ist beschädigt: {e}") from e
+
+    def size(self, digest: str) -> int:
+        """Gibt die (komprimierte) Größe eines Objekts auf der Platte zurück (0, falls es fehlt)."""
+        try:
+            return os.path.getsize(self._get_object_path(digest))
+        except OSError:
+            return 0
+
+    def collect_garbage(self, referenced: set[str]) -> int:
+        """Löscht alle nicht referenzierten Objekte und gibt deren Anzahl zurück."""
+        removed = 0
+        if not os.path.isdir(self.objects_dir):
+            return removed
+        for prefix in os.listdir(self.objects_dir):
+            METRICS.count("directories_listed")
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for digest in os.listdir(prefix_dir):
+                if digest not in referenced:
+                    try:
+                        os.remove(os.path.join(prefix_dir, digest))
+                        removed += 1
+                    except OSError as e:
+                        raise KnowledgeFlaskException(f"Fehler beim Löschen des Objekts '{digest}': {e}") from e
+        return removed
+
+def version_filter_conditions(since: str = None, until: str = None, description: str = None) -> tuple[list[str], list]:
+    """SQL-Bedingungen und Parameter für Zeitraum- und Beschreibungsfilter beim Auflisten von Versionen."""
+    conditions, params = [], []
+    if since:
+        conditions.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        conditions.append("timestamp < ?")
+        params.append(until)
+    if description:
+        conditions.append("description LIKE ? ESCAPE '\\'")
+        params.append("%" + description.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    return conditions, params
+
+def normalize_retention_policy(policy: dict) -> dict:
+    """Prüft Aufbewahrungsregeln und Optionen; nicht gesetzte Regeln fehlen im Ergebnis."""
+    normalized = {}
+    for rule in RETENTION_RULES:
+        value = policy.get(rule)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise KnowledgeFlaskException(f"Die Aufbewahrungsregel '{rule}' muss eine nicht-negative ganze Zahl sein.")
+        normalized[rule] = value
+    for option in RETENTION_OPTIONS:
+        if policy.get(option):
+            normalized[option] = True
+    return normalized
+
+def select_versions_to_prune(versions: list[dict], policy: dict,
+                             version_objects: Callable[[str], dict[str, int]]) -> list[dict]:
+    """
+    Wendet Aufbewahrungsregeln an und gibt die zu entfernenden Versionen zurück (älteste zuerst).
+    keep_last behält die N neuesten Versionen, keep_daily und keep_weekly die jeweils neueste
+    der N jüngsten Tage bzw. ISO-Wochen mit Versionen; die Regeln wirken unabhängig voneinander.
+    max_bytes verwirft danach so lange die ältesten behaltenen Versionen, bis deren Objekte
+    (laut version_objects: Digest -> Bytes, gemeinsame zählen einmal) ins Budget passen.
+    Die neueste Version und Versionen ohne lesbaren Zeitstempel bleiben immer erhalten.
+    """
+    if not any(rule in policy for rule in RETENTION_RULES):
+        raise KnowledgeFlaskException("Keine Aufbewahrungsregel angegeben (keep_last, keep_daily, keep_weekly oder max_bytes).")
+    keep, dated = set(), []
+    for version in versions:
+        try:
+            dated.append((datetime.datetime.fromisoformat(version["timestamp"]), version))
+        except (TypeError, ValueError): # z.B. 'Unbekannt' bei fehlenden Metadaten
+            keep.add(version["id"])
+    dated.sort(key=lambda entry: entry[0], reverse=True)
+
+    if any(rule in policy for rule in ("keep_last", "keep_daily", "keep_weekly")):
+        keep.update(version["id"] for _, version in dated[:policy.get("keep_last", 0)])
+        for rule, period in (("keep_daily", lambda timestamp: timestamp.date()),
+                             ("keep_weekly", lambda timestamp: timestamp.isocalendar()[:2])):
+            periods = set()
+            for timestamp, version in dated:
+                if len(periods) >= policy.get(rule, 0):
+                    break
+                if period(timestamp) not in periods:
+                    periods.add(period(timestamp))
+                    keep.add(version["id"])
+    else:
+        keep.update(version["id"] for _, version in dated)
+    if dated:
+        keep.add(dated[0][1]["id"])
+
+    if "max_bytes" in policy:
+        objects, total, over_budget = set(), 0, False
+        for position, (_, version) in enumerate(dated):
+            if version["id"] not in keep:
+                continue
+            if not over_budget:
+                sizes = version_objects(version["id"])
+                total += sum(size for digest, size in sizes.items() if digest not in objects)
+                objects.update(sizes)
+                over_budget = total > policy["max_bytes"] and position > 0
+            if over_budget:
+                keep.discard(version["id"])
+    return [version for _, version in reversed(dated) if version["id"] not in keep]
+
+def format_retention_policy(policy: dict) -> str:
+    """Kurzdarstellung von Aufbewahrungsregeln, z.B. 'keep_last=10, keep_daily=7, auto'."""
+    parts = [f"{rule}={policy[rule]}" for rule in RETENTION_RULES if rule in policy]
+    return ", ".join(parts + [option for option in RETENTION_OPTIONS if policy.get(option)])
+
+class VersionArchive:
+    """
+    Komprimiertes Archiv ausgelagerter Versionen eines Agenten (versions_archive.zip): je Version
+    ein Manifest mit Metadaten unter versions/<id>.json, die Chunks dedupliziert unter objects/<hash>.
+    Archivierte Versionen stehen nicht mehr im Versionskatalog, lassen sich aber weiterhin
+    vergleichen und wiederherstellen. Änderungen werden an einer Kopie vorgenommen und atomar
+    übernommen, so dass ein Abbruch das bestehende Archiv nicht beschädigt.
+    """
+    def __init__(self, archive_file_path: str):
+        self.archive_file_path = archive_file_path
+
+    def exists(self) -> bool:
+        """Prüft, ob bereits Versionen archiviert wurden."""
+        return os.path.exists(self.archive_file_path)
+
+    def _read(self) -> "zipfile.ZipFile":
+        """Öffnet das Archiv zum Lesen."""
+        try:
+            METRICS.count("files_opened")
+            return zipfile.ZipFile(self.archive_file_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise KnowledgeFlaskException(f"Versionsarchiv '{self.archive_file_path}' konnte nicht gelesen werden: {e}") from e
+
+    @contextmanager
+    def _rewrite(self, copy_existing: bool = True):
+        """Liefert eine temporäre Kopie des Archivs zum Schreiben und ersetzt das Archiv danach atomar."""
+        tmp_path = f"{self.archive_file_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            if copy_existing and self.exists():
+                shutil.copyfile(self.archive_file_path, tmp_path)
+            with zipfile.ZipFile(tmp_path, 'a', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+                yield archive
+            os.replace(tmp_path, self.archive_file_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Versionsarchivs '{self.archive_file_path}': {e}") from e
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def add(self, entries: Iterable[tuple[dict, dict, Callable[[str], bytes]]]) -> int:
+        """
+        Archiviert Versionen als (Metadaten, Manifest, Chunk-Leser); nur noch nicht enthaltene
+        Chunks werden geschrieben. Gibt die Anzahl archivierter Versionen zurück.
+        """
+        count = 0
+        with self._rewrite() as archive:
+            names = set(archive.namelist())
+            for metadata, manifest, read_chunk in entries:
+                for digest in manifest["chunks"]:
+                    if f"objects/{digest}" not in names:
+                        archive.writestr(f"objects/{digest}", read_chunk(digest))
+                        names.add(f"objects/{digest}")
+                archive.writestr(f"versions/{metadata['id']}.json", json.dumps({**metadata, **manifest}, ensure_ascii=False))
+                count += 1
+        return count
+
+    def manifest(self, version_id: str) -> dict:
+        """Gibt Metadaten und Manifest einer archivierten Version zurück oder None."""
+        if not self.exists():
+            return None
+        with self._read() as archive:
+            try:
+                return json.loads(archive.read(f"versions/{version_id}.json"))
+            except KeyError:
+                return None
+
+    def read_chunks(self, digests: Iterable[str]) -> dict[str, list[str]]:
+        """Liest Chunks aus dem Archiv (Digest -> Elemente)."""
+        with self._read() as archive:
+            try:
+                return {digest: json.loads(archive.read(f"objects/{digest}")) for digest in digests}
+            except (KeyError, zipfile.BadZipFile, zlib.error) as e:
+                raise KnowledgeFlaskException(f"Chunk fehlt oder ist beschädigt im Versionsarchiv '{self.archive_file_path}': {e}") from e
+
+    def list(self) -> list[dict]:
+        """Listet die archivierten Versionen (Metadaten, neueste zuerst)."""
+        if not self.exists():
+            return []
+        with self._read() as archive:
+            versions = []
+            for name in archive.namelist():
+                if name.startswith("versions/"):
+                    manifest = json.loads(archive.read(name))
+                    versions.append({"id": manifest["id"], "timestamp": manifest["timestamp"], "description": manifest["description"]})
+        return sorted(versions, key=lambda version: version["timestamp"], reverse=True)
+
+    def remove(self, version_id: str) -> bool:
+        """Entfernt eine Version und nicht mehr referenzierte Chunks aus dem Archiv."""
+        if self.manifest(version_id) is None:
+            return False
+        with self._read() as source:
+            manifests = [json.loads(source.read(name)) for name in source.namelist() if name.startswith("versions/")]
+            manifests = [manifest for manifest in manifests if manifest["id"] != version_id]
+            if not manifests:
+                os.remove(self.archive_file_path)
+                return True
+            referenced = {f"objects/{digest}" for manifest in manifests for digest in manifest["chunks"]}
+            with self._rewrite(copy_existing=False) as archive:
+                for name in source.namelist():
+                    if name in referenced:
+                        archive.writestr(name, source.read(name))
+                for manifest in manifests:
+                    archive.writestr(f"versions/{manifest['id']}.json", json.dumps(manifest, ensure_ascii=False))
+        return True
+
+class VersionCatalog:
+    """
+    SQLite-Katalog aller Versionen eines Agenten. Ersetzt das Öffnen jeder
+    version_meta.json beim Auflisten; über den Index auf dem Zeitstempel
+    sind Seiten und Zeitbereiche ohne Scan aller Versionen abrufbar.
+    """
+    def __init__(self, catalog_file_path: str):
+        self.catalog_file_path = catalog_file_path
+
+    def exists(self) -> bool:
+        """Prüft, ob der Katalog bereits angelegt wurde."""
+        return os.path.exists(self.catalog_file_path)
+
+    def _connect(self) -> "sqlite3.Connection":
+        """Öffnet den Katalog und legt das Schema bei Bedarf an."""
+        try:
+            conn = sqlite3.connect(self.catalog_file_path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions ("
+                "id TEXT PRIMARY KEY, timestamp TEXT NOT NULL, description TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS versions_by_timestamp ON versions (timestamp)")
+            return conn
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Öffnen des Versionskatalogs '{self.catalog_file_path}': {e}") from e
+
+    def add(self, metadata: dict):
+        """Trägt eine Version ein."""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO versions (id, timestamp, description) VALUES (?, ?, ?)",
+                    (metadata["id"], metadata["timestamp"], metadata["description"])
+                )
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Versionskatalogs '{self.catalog_file_path}': {e}") from e
+
+    def remove(self, version_id: str):
+        """Trägt eine Version aus (wie remove_many)."""
+        self.remove_many([version_id])
+
+    def remove_many(self, version_ids: list[str]):
+        """
+        Trägt mehrere Versionen in einer Transaktion aus. Die Verzeichnisse entfernt der
+        Aufrufer erst nach dem Commit, damit die Transaktion nicht auf das Dateisystem wartet.
+        """
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany("DELETE FROM versions WHERE id = ?", [(version_id,) for version_id in version_ids])
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben des Versionskatalogs '{self.catalog_file_path}': {e}") from e
+
+    def rebuild(self, entries: Iterable[dict]):
+        """Ersetzt den gesamten Katalog in einer Transaktion."""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM versions")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO versions (id, timestamp, description) VALUES (:id, :timestamp, :description)",
+                    entries
+                )
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Neuaufbau des Versionskatalogs '{self.catalog_file_path}': {e}") from e
+
+    def count(self) -> int:
+        """Gibt die Anzahl der eingetragenen Versionen zurück."""
+        try:
+            with closing(self._connect()) as conn:
+                return conn.execute("SELECT COUNT(*) FROM versions").fetchone()[0]
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen des Versionskatalogs '{self.catalog_file_path}': {e}") from e
+
+    def list(self, limit: int = None, offset: int = 0, since: str = None, until: str = None,
+             description: str = None) -> list[dict]:
+        """
+        Listet Versionen absteigend nach Zeitstempel. since (inklusive) und until
+        (exklusive) grenzen den Zeitraum ein, description filtert per Teilstring.
+        """
+        conditions, params = version_filter_conditions(since, until, description)
+        sql = "SELECT id, timestamp, description FROM versions"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
+        params += [limit if limit is not None else -1, offset]
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen des Versionskatalogs '{self.catalog_file_path}': {e}") from e
+        return [{"id": row[0], "timestamp": row[1], "description": row[2]} for row in rows]
+
+def _ends_version_chunk(chunk: list[str]) -> bool:
+    """Prüft, ob ein Versions-Chunk nach seinem letzten Element endet (Grenze oder Obergrenze erreicht)."""
+    return len(chunk) >= VERSION_CHUNK_MAX_ITEMS or int(item_digest(chunk[-1])[:8], 16) % VERSION_CHUNK_SIZE == 0
+
+def split_version_chunks(knowledge_items: Iterable[str]) -> Iterator[list[str]]:
+    """
+    Zerlegt Elemente inhaltsabhängig in Versions-Chunks: Ein Chunk endet nach einem Element,
+    dessen Digest modulo VERSION_CHUNK_SIZE null ist (im Mittel also nach VERSION_CHUNK_SIZE
+    Elementen), spätestens nach VERSION_CHUNK_MAX_ITEMS. Einfügen oder Entfernen ändert damit
+    nur den betroffenen Chunk, die folgenden behalten ihren Hash.
+    """
+    chunk = []
+    for item in knowledge_items:
+        chunk.append(item)
+        if _ends_version_chunk(chunk):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def serialize_version_chunk(chunk: list[str]) -> bytes:
+    """Serialisiert einen Chunk deterministisch; sein SHA-256 ist der Schlüssel im Object-Store."""
+    return json.dumps(chunk, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+class VersionManager:
+    """
+    Verwaltet Versionen der Wissensbasis eines Agenten.
+    Jede Version ist ein Manifest aus Chunk-Hashes; die Chunks liegen
+    dedupliziert im gemeinsamen Object-Store des Agenten.
+    """
+    def __init__(self, agent_path: str, shard_workers: int = DEFAULT_SHARD_WORKERS):
+        self.agent_path = agent_path
+        self.shard_workers = shard_workers # Worker-Prozesse für geteilte Wissensbasen
+        self.versions_dir = os.path.join(agent_path, VERSIONS_DIR_NAME)
+        self.knowledge_file_path = os.path.join(agent_path, KNOWLEDGE_FILE_NAME)
+        self.object_store = ObjectStore(os.path.join(agent_path, OBJECTS_DIR_NAME))
+        self.catalog = VersionCatalog(os.path.join(agent_path, VERSION_CATALOG_FILE_NAME))
+        self.archive = VersionArchive(os.path.join(agent_path, VERSION_ARCHIVE_FILE_NAME))
+        self.retention_file_path = os.path.join(agent_path, RETENTION_CONFIG_FILE_NAME)
+        os.makedirs(self.versions_dir, exist_ok=True)
+        # Versionen anlegen hält die Sperre geteilt, Chunks löschen exklusiv (siehe create_version)
+        self.lock = AgentLock.for_agent(agent_path)
+
+    def _get_version_path(self, version_id: str) -> str:
+        """Gibt den vollständigen Pfad zu einem Versionsverzeichnis zurück."""
+        return os.path.join(self.versions_dir, version_id)
+
+    def _get_version_metadata_file_path(self, version_path: str) -> str:
+        """Gibt den Pfad zur Metadaten-Datei einer Version zurück."""
+        return os.path.join(version_path, VERSION_METADATA_FILE_NAME)
+
+    def _load_version_metadata(self, version_path: str) -> dict:
+        """Lädt Metadaten für eine bestimmte Version."""
+        metadata_file = self._get_version_metadata_file_path(version_path)
+        if not os.path.exists(metadata_file):
+            return {} # Keine Metadaten vorhanden
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"Fehler beim Decodieren der Metadaten '{metadata_file}': {e}. Leere Metadaten werden zurückgegeben.", file=sys.stderr)
+            return {}
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Metadaten '{metadata_file}': {e}") from e
+
+    def _save_version_metadata(self, version_path: str, metadata: dict):
+        """Speichert Metadaten für eine bestimmte Version."""
+        metadata_file = self._get_version_metadata_file_path(version_path)
+        try:
+            with open(metadata_file, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, indent=2, ensure_ascii=False)
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Metadaten '{metadata_file}': {e}") from e
+
+    def _get_manifest_file_path(self, version_path: str) -> str:
+        """Gibt den Pfad zum Manifest einer Version zurück."""
+        return os.path.join(version_path, VERSION_MANIFEST_FILE_NAME)
+
+    def _load_manifest(self, version_path: str) -> dict:
+        """Lädt das Manifest einer Version."""
+        manifest_file = self._get_manifest_file_path(version_path)
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                METRICS.count("files_opened")
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            raise KnowledgeFlaskException(f"Manifest '{manifest_file}' konnte nicht gelesen werden: {e}") from e
+
+    def _load_version_items(self, version_id: str) -> list[str]:
+        """
+        Lädt die Elemente einer Version aus ihren Chunks im Object-Store (bzw. im Versionsarchiv).
+        Ältere Versionen mit vollständiger Kopie der knowledge.json werden weiterhin gelesen.
+        """
+        version_path = self._get_version_path(version_id)
+        if not os.path.exists(version_path):
+            chunks, inline = self._get_archived_chunks(version_id)
+            return [item for digest in chunks for item in inline[digest]]
+
+        if os.path.exists(self._get_manifest_file_path(version_path)):
+            manifest = self._load_manifest(version_path)
+            items = []
+            for digest in manifest.get("chunks", []):
+                items.extend(json.loads(self.object_store.get(digest)))
+            return items
+
+        version_knowledge_file = os.path.join(version_path, KNOWLEDGE_FILE_NAME)
+        if not os.path.exists(version_knowledge_file):
+            raise KnowledgeFlaskException(f"Wissensdatei für Version '{version_id}' nicht gefunden. Version ist möglicherweise korrupt.")
+        return KnowledgeBaseManager(version_path)._load_knowledge_from_file()
+
+    @instrumented("version.create")
+    def create_version(self, description: str = None) -> str:
+        """
+        Erstellt eine neue Version der Wissensbasis.
+        Zerlegt sie in Chunks, legt nur noch unbekannte Chunks im Object-Store ab
+        und speichert Manifest und Metadaten. Geteilte Wissensbasen werden unter einer Sperre
+        Shard für Shard parallel gesichert (Chunks je Shard).
+        Bereits vorhandene Chunks werden nur referenziert; damit die Garbage Collection sie
+        nicht vor dem Schreiben des Manifests löscht, bleibt die geteilte Sperre bis dahin gehalten.
+        """
+        kb_manager = open_knowledge_base(self.agent_path, self.shard_workers)
+        if not kb_manager.exists():
+            raise KnowledgeFlaskException("Keine Wissensbasis vorhanden, um eine Version zu erstellen.")
+
+        with self.lock.hold(exclusive=False):
+            if isinstance(kb_manager, ShardedKnowledgeBase):
+                item_count, chunks = kb_manager.snapshot_chunks(self.object_store)
+            else:
+                knowledge = kb_manager.get_knowledge()
+                item_count, chunks = len(knowledge), self.store_chunks(self.object_store, knowledge)
+
+            version_id = str(uuid.uuid4()) # Eindeutige ID für die Version
+            version_path = self._get_version_path(version_id)
+            os.makedirs(version_path, exist_ok=True)
+
+            manifest_file = self._get_manifest_file_path(version_path)
+            tmp_path = f"{manifest_file}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"item_count": item_count, "chunks": chunks}, f, indent=2)
+                os.replace(tmp_path, manifest_file)
+            except IOError as e:
+                raise KnowledgeFlaskException(f"Fehler beim Schreiben des Manifests für Version '{version_id}': {e}") from e
+
+            metadata = {
+                "id": version_id,
+                "timestamp": datetime.datetime.now().isoformat(),
+                "description": description if description else "Keine Beschreibung"
+            }
+            self._save_version_metadata(version_path, metadata)
+            self._ensure_catalog()
+            self.catalog.add(metadata)
+        policy = self.load_retention_policy() # Ausdünnen braucht die exklusive Sperre
+        if policy.get("auto"):
+            self.prune(policy)
+        return version_id
+
+    @classmethod
+    def store_chunks(cls, object_store: ObjectStore, knowledge: list[str]) -> list[str]:
+        """Legt die Chunks der Elemente im Object-Store ab und gibt ihre Hashes zurück."""
+        return [object_store.put(data) for data in cls._serialize_chunks(knowledge)]
+
+    @staticmethod
+    def _serialize_chunks(knowledge: Iterable[str]) -> Iterator[bytes]:
+        """Zerlegt Elemente inhaltsabhängig in Chunks (siehe split_version_chunks) und serialisiert sie."""
+        for chunk in split_version_chunks(knowledge):
+            yield serialize_version_chunk(chunk)
+
+    def _get_chunks(self, version_id: str) -> tuple[list[str], Callable[[str], list[str]]]:
+        """
+        Gibt die Chunk-Hashes einer Version (oder der Live-Wissensbasis) zurück, dazu eine
+        Funktion, die die Elemente eines Chunks liest. Für 'live' stammen die Hashes aus dem
+        Chunk-Plan der Wissensbasis; gelesen werden nur die tatsächlich angeforderten Chunks.
+        """
+        if version_id == LIVE_VERSION_ID:
+            # Je Shard eigene Chunks, wie sie create_version ablegt
+            kb_manager = open_knowledge_base(self.agent_path, self.shard_workers)
+            chunk_map = kb_manager.version_chunk_map()
+            ranges = {digest: (start, count) for digest, start, count in chunk_map}
+            return [digest for digest, _, _ in chunk_map], lambda digest: list(kb_manager.iter_knowledge(*ranges[digest]))
+        version_path = self._get_version_path(version_id)
+        if os.path.exists(self._get_manifest_file_path(version_path)):
+            return self._load_manifest(version_path).get("chunks", []), lambda digest: json.loads(self.object_store.get(digest))
+        if not os.path.exists(version_path):
+            chunks, inline = self._get_archived_chunks(version_id)
+            return chunks, inline.__getitem__
+        # Ältere Version mit vollständiger Kopie der knowledge.json
+        chunks, inline = [], {}
+        for chunk in split_version_chunks(self._load_version_items(version_id)):
+            digest = hashlib.sha256(serialize_version_chunk(chunk)).hexdigest()
+            chunks.append(digest)
+            inline[digest] = chunk
+        return chunks, inline.__getitem__
+
+    def _get_archived_chunks(self, version_id: str) -> tuple[list[str], dict[str, list[str]]]:
+        """Chunk-Hashes und -Inhalte einer archivierten Version."""
+        manifest = self.archive.manifest(version_id)
+        if manifest is None:
+            raise VersionNotFoundError(version_id)
+        return manifest["chunks"], self.archive.read_chunks(set(manifest["chunks"]))
+
+    @instrumented("version.diff")
+    def diff(self, from_version_id: str, to_version_id: str) -> dict:
+        """
+        Vergleicht zwei Versionen (oder eine Version mit 'live'). Gemeinsame Chunks werden
+        übersprungen; da die Chunk-Grenzen vom Inhalt abhängen, ändert eine Einfügung oder
+        Entfernung nur ihren eigenen Chunk. Gelesen werden nur die geänderten Chunks, für
+        'live' über den zwischengespeicherten Chunk-Plan (siehe version_chunk_map), sodass der
+        Aufwand von der Änderungsmenge abhängt. Gibt {'added': [...], 'removed': [...]} zurück.
+        """
+        with self.lock.hold(exclusive=False): # Chunk-Plan und Lesen der Live-Chunks auf demselben Stand
+            from_chunks, read_from = self._get_chunks(from_version_id)
+            to_chunks, read_to = self._get_chunks(to_version_id)
+            shared = set(from_chunks) & set(to_chunks)
+
+            def changed_items(chunks, read_chunk):
+                items = []
+                for digest in chunks:
+                    if digest not in shared:
+                        items.extend(read_chunk(digest))
+                return items
+
+            old_items = changed_items(from_chunks, read_from)
+            new_items = changed_items(to_chunks, read_to)
+        old_set, new_set = set(old_items), set(new_items)
+        return {
+            "added": [item for item in new_items if item not in old_set],
+            "removed": [item for item in old_items if item not in new_set],
+        }
+
+    @instrumented("version.restore")
+    def restore_version(self, version_id: str):
+        """
+        Stellt eine frühere Version der Wissensbasis wieder her.
+        Wendet nur die Differenz zur Live-Wissensbasis auf Speicher und Indizes an;
+        die Reihenfolge der Elemente ist danach die der Version (siehe apply_delta).
+        """
+        kb_manager = open_knowledge_base(self.agent_path, self.shard_workers)
+        with kb_manager.lock.hold():
+            try:
+                delta = self.diff(LIVE_VERSION_ID, version_id)
+            except KnowledgeBaseCorruptError:
+                # Die Live-Wissensbasis ist unlesbar: vollständig aus der Version neu aufbauen
+                kb_manager._save_knowledge_to_file(self._load_version_items(version_id))
+                print(f"Wissensbasis von Version '{version_id}' vollständig neu aufgebaut.")
+                return
+            removed, added = kb_manager.apply_delta(delta["removed"], delta["added"], order=self._load_version_items(version_id))
+        print(f"Wissensbasis von Version '{version_id}' erfolgreich wiederhergestellt ({added} hinzugefügt, {removed} entfernt).")
+
+    @instrumented("version.collect_garbage")
+    def collect_garbage(self) -> int:
+        """
+        Entfernt Chunks, die von keiner Version mehr referenziert werden. Läuft unter der
+        exklusiven Sperre, damit keine gerade entstehende Version ihre Chunks verliert.
+        """
+        with self.lock.hold():
+            referenced = set()
+            for version_id in os.listdir(self.versions_dir):
+                version_path = self._get_version_path(version_id)
+                if os.path.exists(self._get_manifest_file_path(version_path)):
+                    referenced.update(self._load_manifest(version_path).get("chunks", []))
+            return self.object_store.collect_garbage(referenced)
+
+    def _scan_versions(self) -> list[dict]:
+        """Liest die Metadaten aller Versionen aus dem Verzeichnisbaum."""
+        versions = []
+        if not os.path.exists(self.versions_dir):
+            return versions
+
+        METRICS.count("directories_listed")
+        for version_id in os.listdir(self.versions_dir):
+            version_path = self._get_version_path(version_id)
+            if os.path.isdir(version_path):
+                metadata = self._load_version_metadata(version_path)
+                if metadata: # Stelle sicher, dass Metadaten geladen wurden
+                    versions.append(metadata)
+                else:
+                    versions.append({"id": version_id, "timestamp": "Unbekannt", "description": "Metadaten fehlen/fehlerhaft"})
+        return versions
+
+    def _ensure_catalog(self):
+        """Baut den Versionskatalog auf, falls er noch nicht existiert (z.B. bei älteren Agenten)."""
+        if not self.catalog.exists():
+            self.rebuild_catalog()
+
+    @instrumented("version.rebuild_catalog")
+    def rebuild_catalog(self) -> int:
+        """Baut den Versionskatalog aus dem Verzeichnisbaum neu auf und gibt die Anzahl der Versionen zurück."""
+        versions = self._scan_versions()
+        self.catalog.rebuild(versions)
+        return len(versions)
+
+    @instrumented("version.list")
+    def list_versions(self, limit: int = None, offset: int = 0, since: str = None, until: str = None,
+                      description: str = None) -> list[dict]:
+        """
+        Listet Versionen mit Metadaten aus dem Versionskatalog auf (neueste zuerst).
+        Unterstützt Seiten (limit/offset), Zeiträume (since/until) und einen Beschreibungsfilter.
+        """
+        self._ensure_catalog()
+        return self.catalog.list(limit, offset, since, until, description)
+
+    def count_versions(self) -> int:
+        """Gibt die Anzahl der Versionen laut Versionskatalog zurück."""
+        self._ensure_catalog()
+        return self.catalog.count()
+
+    def verify(self) -> list[str]:
+        """
+        Prüft alle Versionen: Manifest lesbar, alle Chunks vorhanden, Hash und
+        Elementanzahl stimmen. Gibt gefundene Probleme zurück.
+        """
+        problems = []
+        for version_id in sorted(os.listdir(self.versions_dir)):
+            version_path = self._get_version_path(version_id)
+            if not os.path.exists(self._get_manifest_file_path(version_path)):
+                if not os.path.exists(os.path.join(version_path, KNOWLEDGE_FILE_NAME)):
+                    problems.append(f"Version '{version_id}': weder Manifest noch Wissensdatei vorhanden.")
+                continue
+            try:
+                manifest = self._load_manifest(version_path)
+                item_count = 0
+                for digest in manifest.get("chunks", []):
+                    data = self.object_store.get(digest)
+                    if hashlib.sha256(data).hexdigest() != digest:
+                        problems.append(f"Version '{version_id}': Chunk '{digest}' hat einen falschen Hash.")
+                    item_count += len(json.loads(data))
+                if item_count != manifest.get("item_count", item_count):
+                    problems.append(f"Version '{version_id}': {item_count} statt {manifest['item_count']} Elemente.")
+            except (KnowledgeFlaskException, json.JSONDecodeError) as e:
+                problems.append(f"Version '{version_id}': {e}")
+        return problems
+
+    def list_archived_versions(self) -> list[dict]:
+        """Listet die archivierten Versionen auf (neueste zuerst)."""
+        return self.archive.list()
+
+    def load_retention_policy(self) -> dict:
+        """Lädt die Aufbewahrungsregeln des Agenten ({} wenn keine festgelegt sind)."""
+        if not os.path.exists(self.retention_file_path):
+            return {}
+        try:
+            with open(self.retention_file_path, 'r', encoding='utf-8') as f:
+                return normalize_retention_policy(json.load(f))
+        except (json.JSONDecodeError, IOError) as e:
+            raise KnowledgeFlaskException(f"Aufbewahrungsregeln '{self.retention_file_path}' konnten nicht gelesen werden: {e}") from e
+
+    def configure_retention(self, policy: dict) -> dict:
+        """Speichert Aufbewahrungsregeln; ohne Regeln wird die Konfiguration entfernt."""
+        policy = normalize_retention_policy(policy)
+        try:
+            if not any(rule in policy for rule in RETENTION_RULES):
+                if os.path.exists(self.retention_file_path):
+                    os.remove(self.retention_file_path)
+                return {}
+            with open(self.retention_file_path, 'w', encoding='utf-8') as f:
+                json.dump(policy, f, indent=2)
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Aufbewahrungsregeln '{self.retention_file_path}': {e}") from e
+        return policy
+
+    def _version_objects(self, version_id: str) -> dict[str, int]:
+        """Objekte einer Version mit ihrer Größe auf der Platte (für max_bytes)."""
+        version_path = self._get_version_path(version_id)
+        if os.path.exists(self._get_manifest_file_path(version_path)):
+            return {digest: self.object_store.size(digest) for digest in self._load_manifest(version_path).get("chunks", [])}
+        knowledge_file = os.path.join(version_path, KNOWLEDGE_FILE_NAME)
+        return {knowledge_file: os.path.getsize(knowledge_file) if os.path.exists(knowledge_file) else 0}
+
+    def _archive_entry(self, version: dict) -> tuple[dict, dict, Callable[[str], bytes]]:
+        """Metadaten, Manifest und Chunk-Leser einer Version für das Archiv."""
+        version_path = self._get_version_path(version["id"])
+        if os.path.exists(self._get_manifest_file_path(version_path)):
+            manifest = self._load_manifest(version_path)
+            return version, {"item_count": manifest.get("item_count", 0), "chunks": manifest.get("chunks", [])}, self.object_store.get
+        # Ältere Version ohne Manifest: Chunks wie beim Erstellen serialisieren
+        chunks, read_items = self._get_chunks(version["id"])
+        item_count = sum(len(read_items(digest)) for digest in chunks)
+
+        def read_chunk(digest: str) -> bytes:
+            return serialize_version_chunk(read_items(digest))
+
+        return version, {"item_count": item_count, "chunks": chunks}, read_chunk
+
+    @instrumented("version.prune")
+    def prune(self, policy: dict = None, archive: bool = None, dry_run: bool = False) -> dict:
+        """
+        Dünnt die Versionen nach Aufbewahrungsregeln aus (Standard: die gespeicherten). Die
+        verworfenen Versionen werden in einer Transaktion aus dem Katalog ausgetragen, danach
+        aus dem Verzeichnisbaum entfernt und mit archive=True vorher ins Versionsarchiv
+        übernommen; anschließend läuft die Garbage Collection einmal. Die Auswahl geschieht unter
+        derselben exklusiven Sperre (mit dry_run unter der geteilten), damit keine inzwischen
+        entstandene oder gelöschte Version sie veralten lässt. Gibt die verworfenen Versionen und Kennzahlen zurück.
+        """
+        policy = normalize_retention_policy(self.load_retention_policy() if policy is None else policy)
+        archive = policy.get("archive", False) if archive is None else archive
+        with self.lock.hold(exclusive=not dry_run):
+            self._ensure_catalog()
+            versions = self.catalog.list()
+            pruned = select_versions_to_prune(versions, policy, self._version_objects)
+            result = {"pruned": pruned, "kept": len(versions) - len(pruned), "archived": False, "removed_objects": 0}
+            if dry_run or not pruned:
+                return result
+            if archive:
+                self.archive.add(self._archive_entry(version) for version in pruned)
+                result["archived"] = True
+            version_ids = [version["id"] for version in pruned]
+            self.catalog.remove_many(version_ids)
+            for version_id in version_ids:
+                self._remove_version_dir(version_id)
+            result["removed_objects"] = self.collect_garbage()
+        return result
+
+    def _remove_version_dir(self, version_id: str) -> bool:
+        """
+        Entfernt das Verzeichnis einer bereits ausgetragenen Version (best effort). Bleibt es
+        liegen, hält sein Manifest die Chunks weiter fest; ein erneutes delete_version räumt es auf.
+        """
+        try:
+            shutil.rmtree(self._get_version_path(version_id))
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            print(f"Warnung: Version '{version_id}' ist ausgetragen, ihr Verzeichnis konnte aber nicht entfernt werden: {e}")
+            return False
+
+    @instrumented("version.delete")
+    def delete_version(self, version_id: str):
+        """Löscht eine bestimmte Version."""
+        version_path = self._get_version_path(version_id)
+        with self.lock.hold():
+            if not os.path.exists(version_path):
+                if not self.archive.remove(version_id):
+                    raise VersionNotFoundError(version_id)
+                print(f"Archivierte Version '{version_id}' erfolgreich gelöscht.")
+                return
+
+            self._ensure_catalog()
+            self.catalog.remove(version_id)
+            if self._remove_version_dir(version_id):
+                print(f"Version '{version_id}' erfolgreich gelöscht.")
+
+            removed = self.collect_garbage()
+        if removed:
+            print(f"{removed} nicht mehr referenzierte Chunks entfernt.")
+
+def shard_index(digest: str, shard_count: int) -> int:
+    """Shard eines Elements im Modus 'hash' (aus den ersten 8 Hex-Zeichen seines Digests)."""
+    return int(digest[:8], 16) % shard_count
+
+def normalize_shard_config(config: dict) -> dict:
+    """Prüft eine Shard-Konfiguration ({'mode', 'shards'} bzw. {'mode', 'shard_size'}) und gibt sie bereinigt zurück."""
+    mode = config.get("mode") or DEFAULT_SHARD_MODE
+    if mode not in SHARD_MODES:
+        raise KnowledgeFlaskException(f"Unbekannter Shard-Modus '{mode}'. Verfügbar: {', '.join(SHARD_MODES)}.")
+    key = "shards" if mode == "hash" else "shard_size"
+    value = config.get(key) if mode == "hash" else config.get(key) or DEFAULT_SHARD_SIZE
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise KnowledgeFlaskException(f"'{key}' muss für den Shard-Modus '{mode}' eine positive ganze Zahl sein, nicht {value!r}.")
+    return {"mode": mode, key: value}
+
+def format_shard_config(config: dict) -> str:
+    """Kurzdarstellung einer Shard-Konfiguration, z.B. 'hash, 8 Shards'."""
+    if config["mode"] == "hash":
+        return f"hash, {config['shards']} Shards"
+    return f"range, {config['shard_size']} Elemente je Shard"
+
+def load_shard_config(agent_path: str) -> dict:
+    """
+    Lädt die Shard-Konfiguration eines Agenten (None, wenn seine Wissensbasis nicht geteilt ist).
+    Maßgeblich ist die Kopie im Shard-Verzeichnis, die mit ihm per Umbenennung übernommen wird;
+    shards.json im Agentenverzeichnis zeigt nur an, dass die Wissensbasis geteilt ist.
+    """
+    config_file_path = os.path.join(agent_path, SHARD_CONFIG_FILE_NAME)
+    if not os.path.exists(config_file_path):
+        return None
+    if os.path.exists(os.path.join(agent_path, SHARDS_DIR_NAME, SHARD_CONFIG_FILE_NAME)):
+        config_file_path = os.path.join(agent_path, SHARDS_DIR_NAME, SHARD_CONFIG_FILE_NAME)
+    try:
+        with open(config_file_path, 'r', encoding='utf-8') as f:
+            return normalize_shard_config(json.load(f))
+    except (json.JSONDecodeError, IOError, AttributeError) as e:
+        raise KnowledgeFlaskException(f"Shard-Konfiguration '{config_file_path}' konnte nicht gelesen werden: {e}") from e
+
+def save_shard_config(directory: str, config: dict):
+    """Schreibt eine Shard-Konfiguration als shards.json in ein Verzeichnis (über eine temporäre Datei)."""
+    config_file_path = os.path.join(directory, SHARD_CONFIG_FILE_NAME)
+    tmp_path = f"{config_file_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_path, config_file_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def open_knowledge_base(agent_path: str, workers: int = DEFAULT_SHARD_WORKERS):
+    """Öffnet die Wissensbasis eines Agentenverzeichnisses: ShardedKnowledgeBase, falls geteilt, sonst KnowledgeBaseManager."""
+    config = load_shard_config(agent_path)
+    if config is None:
+        return KnowledgeBaseManager(agent_path)
+    return ShardedKnowledgeBase(agent_path, config, workers)
+
+def run_shard_task(operation: str, shard_path: str, *arguments):
+    """
+    Führt eine Operation auf einem Shard aus (läuft bei mehreren Shards in einem Worker-Prozess):
+    query, compact, reindex, verify, migrate, bulk (Import aus einer Spill-Datei) und snapshot
+    (Chunks für eine Version in den Object-Store schreiben).
+    """
+    kb_manager = KnowledgeBaseManager(shard_path)
+    try:
+        if operation == "query":
+            return kb_manager.count_knowledge(), kb_manager.query(*arguments)
+        if operation == "compact":
+            return kb_manager.compact()
+        if operation == "reindex":
+            return kb_manager.rebuild_indexes()
+        if operation == "verify":
+            index, shard_count = arguments
+            problems = kb_manager.verify()
+            if shard_count is not None:
+                misplaced = sum(1 for item in kb_manager.iter_knowledge() if shard_index(item_digest(item), shard_count) != index)
+                if misplaced:
+                    problems.append(f"{misplaced} Elemente liegen im falschen Shard.")
+            return problems
+        if operation == "migrate":
+            return kb_manager.migrate_format(*arguments)
+        if operation == "bulk":
+            (spill_file_path,) = arguments
+            with open(spill_file_path, 'r', encoding='utf-8') as f:
+                return kb_manager.add_knowledge_bulk(json.loads(line) for line in f)
+        if operation == "snapshot":
+            (objects_dir,) = arguments
+            knowledge = kb_manager.get_knowledge()
+            return len(knowledge), VersionManager.store_chunks(ObjectStore(objects_dir), knowledge)
+    except (KnowledgeFlaskException, OSError) as e:
+        # Als einfache KnowledgeFlaskException weitergeben: sie muss aus dem Worker-Prozess übertragbar sein
+        raise KnowledgeFlaskException(f"Shard '{os.path.basename(shard_path)}': {e}") from e
+    raise KnowledgeFlaskException(f"Unbekannte Shard-Operation '{operation}'.")
+
+_SHARD_EXECUTORS: dict[int, "ProcessPoolExecutor"] = {}
+_SHARD_EXECUTORS_LOCK = threading.Lock()
+
+def _shard_executor(workers: int) -> "ProcessPoolExecutor":
+    """
+    Prozessweiter Pool für Shard-Aufgaben, der wiederverwendet wird (z.B. im Servermodus). Die Worker
+    starten per forkserver bzw. spawn, damit sie keine gehaltenen flock-Sperren des Elternprozesses erben.
+    """
+    with _SHARD_EXECUTORS_LOCK:
+        if workers not in _SHARD_EXECUTORS:
+            import multiprocessing # Nur bei Bedarf laden
+            from concurrent.futures import ProcessPoolExecutor
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _SHARD_EXECUTORS[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        return _SHARD_EXECUTORS[workers]
+
+def map_shards(operation: str, calls: list[tuple], workers: int = DEFAULT_SHARD_WORKERS) -> list:
+    """
+    Führt run_shard_task(operation, *call) für jeden Aufruf aus und gibt die Ergebnisse in derselben
+    Reihenfolge zurück: ab zwei Shards und Workern parallel im Prozesspool, sonst im eigenen Prozess.
+    """
+    with METRICS.timer(f"shards.{operation}"):
+        if min(workers, len(calls)) <= 1:
+            return [run_shard_task(operation, *call) for call in calls]
+        return list(_shard_executor(workers).map(functools.partial(run_shard_task, operation), *zip(*calls, strict=True)))
+
+def _prepare_shard_swap(shards_dir: str):
+    """
+    Räumt vor dem Neuaufbau in shards.new die Reste eines abgebrochenen Durchlaufs auf. Fehlt das
+    Shard-Verzeichnis, weil der Abbruch zwischen den beiden Umbenennungen lag, gilt shards.old.
+    """
+    new_dir, old_dir = shards_dir + ".new", shards_dir + ".old"
+    if not os.path.exists(shards_dir) and os.path.exists(old_dir):
+        os.replace(old_dir, shards_dir)
+    for path in (new_dir, old_dir):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+class ShardedKnowledgeBase:
+    """
+    Auf Shards verteilte Wissensbasis eines sehr großen Agenten (Schnittstelle wie KnowledgeBaseManager).
+    Jeder Shard ist ein eigener KnowledgeBaseManager unter shards/<Nummer> mit Snapshot, Segment-Log,
+    Hash- und Suchindizes. Im Modus 'hash' bestimmt der Digest eines Elements seinen Shard, im Modus
+    'range' wird der letzte Shard bis shard_size aufgefüllt. Hinzufügen schreibt nur in die
+    betroffenen Shards; Suche und Scans laufen per map_shards parallel über alle Shards. Die
+    Reihenfolge der Elemente ist die der Shards, Positionen zählen über alle Shards hinweg.
+    Schreiber halten die Agentensperre exklusiv, Leser und Versionen geteilt; so sieht jeder
+    Zugriff einen konsistenten Stand aller Shards.
+    """
+    def __init__(self, agent_path: str, config: dict, workers: int = DEFAULT_SHARD_WORKERS, shards_dir: str = None):
+        self.agent_path = agent_path
+        self.config = config
+        self.workers = workers
+        self.shards_dir = shards_dir or os.path.join(agent_path, SHARDS_DIR_NAME)
+        self.config_file_path = os.path.join(agent_path, SHARD_CONFIG_FILE_NAME)
+        self._shards: dict[int, KnowledgeBaseManager] = {}
+        self.lock = AgentLock.for_agent(agent_path)
+
+    def _shard_path(self, index: int) -> str:
+        """Gibt den Pfad zum Verzeichnis eines Shards zurück."""
+        return os.path.join(self.shards_dir, f"{index:03d}")
+
+    @property
+    def shard_count(self) -> int:
+        """Anzahl der Shards (im Modus 'range' die der angelegten Shard-Verzeichnisse, mindestens 1)."""
+        if self.config["mode"] == "hash":
+            return self.config["shards"]
+        try:
+            return max(1, sum(1 for name in os.listdir(self.shards_dir) if name.isdigit()))
+        except FileNotFoundError:
+            return 1
+
+    @property
+    def shard_paths(self) -> list[str]:
+        """Pfade aller Shards in ihrer Reihenfolge."""
+        return [self._shard_path(index) for index in range(self.shard_count)]
+
+    def shard(self, index: int) -> KnowledgeBaseManager:
+        """Gibt den KnowledgeBaseManager eines Shards zurück (das Verzeichnis wird bei Bedarf angelegt)."""
+        if index not in self._shards:
+            self._shards[index] = KnowledgeBaseManager(self._shard_path(index))
+        return self._shards[index]
+
+    @property
+    def shards(self) -> list[KnowledgeBaseManager]:
+        """KnowledgeBaseManager aller Shards in ihrer Reihenfolge."""
+        return [self.shard(index) for index in range(self.shard_count)]
+
+    def exists(self) -> bool:
+        """Prüft, ob die Wissensbasis angelegt ist."""
+        return os.path.exists(self.config_file_path)
+
+    def generation(self) -> tuple:
+        """Stand der Wissensbasis für den Abfrage-Cache (Snapshots und Segment-Logs aller Shards)."""
+        paths = [path for shard in self.shards for path in (shard.snapshot_file_path, shard.log_file_path)]
+        return QueryCache.generation(self.config_file_path, *paths)
+
+    def shard_counts(self) -> list[int]:
+        """Anzahl der Elemente je Shard."""
+        with self.lock.hold(exclusive=False):
+            return [shard.count_knowledge() for shard in self.shards]
+
+    def _assign(self, knowledge_items: Iterable[str]) -> Iterator[tuple[int, str]]:
+        """
+        Ordnet Elemente ihren Shards zu: im Modus 'hash' nach Digest (Duplikate erkennt der Shard),
+        im Modus 'range' dem letzten Shard, bis er shard_size Elemente hat. Dort schon vorhandene
+        oder mehrfach übergebene Elemente erhalten den Shard None.
+        """
+        if self.config["mode"] == "hash":
+            for item in knowledge_items:
+                yield shard_index(item_digest(item), self.config["shards"]), item
+            return
+        known = [shard._load_digest_index() for shard in self.shards]
+        shard_size = self.config["shard_size"]
+        tail = self.shard_count - 1
+        room = shard_size - self.shard(tail).count_knowledge()
+        new_digests = set()
+        for item in knowledge_items:
+            digest = item_digest(item)
+            if digest in new_digests or any(digest in digests for digests in known):
+                yield None, item
+                continue
+            if room <= 0:
+                tail, room = tail + 1, shard_size
+            new_digests.add(digest)
+            room -= 1
+            yield tail, item
+
+    def _locate(self, digests: Iterable[str]) -> dict[str, int]:
+        """Gibt den Shard je Digest vorhandener Elemente zurück."""
+        digests = set(digests)
+        if self.config["mode"] == "hash":
+            return {digest: shard_index(digest, self.config["shards"]) for digest in digests}
+        locations = {}
+        for index, shard in enumerate(self.shards):
+            for digest in digests & shard._load_digest_index():
+                locations[digest] = index
+        return locations
+
+    @instrumented("shards.append_knowledge")
+    def append_knowledge(self, knowledge_items: Iterable[str], check_near_duplicates: bool = True) -> list[str]:
+        """
+        Verteilt Elemente ohne Ausgabe auf ihre Shards (ein Schreibvorgang je betroffenem Shard)
+        und gibt die tatsächlich hinzugefügten in der Reihenfolge der Eingabe zurück.
+        """
+        knowledge_items = list(knowledge_items)
+        with self.lock.hold():
+            groups: dict[int, list[str]] = {}
+            for index, item in self._assign(knowledge_items):
+                if index is not None:
+                    groups.setdefault(index, []).append(item)
+            added = set()
+            for index, items in groups.items():
+                added.update(self.shard(index).append_knowledge(items, check_near_duplicates))
+            if added:
+                QUERY_CACHE.invalidate(self.agent_path)
+        return [item for item in dict.fromkeys(knowledge_items) if item in added]
+
+    @instrumented("shards.add_knowledge")
+    def add_knowledge(self, knowledge_item: str) -> bool:
+        """Fügt ein Wissenselement seinem Shard hinzu, sofern es noch nicht vorhanden ist."""
+        if not self.append_knowledge([knowledge_item]):
+            print(f"Wissen '{knowledge_item[:50]}...' ist bereits vorhanden.")
+            return False
+        print(f"Wissen hinzugefügt: '{knowledge_item[:50]}...'")
+        return True
+
+    @instrumented("shards.apply_delta")
+    def apply_delta(self, removed_items: Iterable[str], added_items: Iterable[str], order: Iterable[str] = None) -> tuple[int, int]:
+        """
+        Wendet eine Änderungsmenge an: entfernte Elemente werden in ihren Shards gestrichen,
+        hinzukommende verteilt. Mit order wird jeder Shard einzeln auf seinen Teil von order
+        gebracht (siehe KnowledgeBaseManager.apply_delta, ohne Neuschreiben der Shards); die
+        Reihenfolge gilt dann je Shard. Gibt (entfernt, hinzugefügt) zurück.
+        """
+        if order is not None:
+            return self._apply_order(set(removed_items), list(order))
+        removed_items = {item_digest(item): item for item in removed_items}
+        removed = 0
+        with self.lock.hold():
+            groups: dict[int, list[str]] = {}
+            for digest, index in self._locate(removed_items).items():
+                groups.setdefault(index, []).append(removed_items[digest])
+            for index, items in groups.items():
+                removed += self.shard(index).apply_delta(items, [])[0]
+            if removed:
+                QUERY_CACHE.invalidate(self.agent_path)
+            # Wiederhergestellte Elemente nicht als Beinahe-Duplikate verwerfen
+            added = len(self.append_knowledge(added_items, check_near_duplicates=False))
+            return removed, added
+
+    def _apply_order(self, removed_items: set[str], order: list[str]) -> tuple[int, int]:
+        """
+        Bringt die Wissensbasis auf die Elemente von order: vorhandene bleiben in ihrem Shard,
+        fehlende kommen im Modus 'hash' in den Shard ihres Digests, im Modus 'range' in den
+        ihres Vorgängers in order (damit die Gesamtreihenfolge erhalten bleibt). Jeder Shard
+        wendet dann seinen Teil als Delta an.
+        """
+        order = list(dict.fromkeys(order))
+        removed = added = 0
+        with self.lock.hold():
+            digests = {item: item_digest(item) for item in order}
+            locations = self._locate(digests.values())
+            if self.config["mode"] == "range" and locations:
+                index = locations[next(digests[item] for item in order if digests[item] in locations)]
+                for item in order:
+                    index = locations.setdefault(digests[item], index)
+            else:
+                for index, item in self._assign(item for item in order if digests[item] not in locations):
+                    if index is not None:
+                        locations[digests[item]] = index
+            groups: dict[int, list[str]] = {index: [] for index in range(self.shard_count)}
+            for item in order:
+                index = locations.get(digests[item])
+                if index is not None:
+                    groups.setdefault(index, []).append(item)
+            for index, shard_order in sorted(groups.items()):
+                shard_removed, shard_added = self.shard(index).apply_delta(removed_items, [], order=shard_order)
+                removed += shard_removed
+                added += shard_added
+            if removed or added:
+                QUERY_CACHE.invalidate(self.agent_path)
+            return removed, added
+
+    @instrumented("shards.add_knowledge_bulk")
+    def add_knowledge_bulk(self, knowledge_items: Iterable[str]) -> tuple[int, int]:
+        """
+        Verteilt viele Elemente gestreamt auf eine Spill-Datei je Shard und importiert diese
+        parallel (je Shard ein neuer Snapshot wie bei KnowledgeBaseManager.add_knowledge_bulk).
+        Gibt (hinzugefügt, übersprungen) zurück.
+        """
+        spill_files = {}
+        skipped = 0
+        with self.lock.hold():
+            try:
+                for index, item in self._assign(str(item) for item in knowledge_items):
+                    if index is None:
+                        skipped += 1
+                        continue
+                    if index not in spill_files:
+                        os.makedirs(self._shard_path(index), exist_ok=True)
+                        spill_files[index] = open(os.path.join(self._shard_path(index), SHARD_SPILL_FILE_NAME), 'w', encoding='utf-8')
+                    spill_files[index].write(json.dumps(item, ensure_ascii=False) + "\n")
+                for f in spill_files.values():
+                    f.close()
+                QUERY_CACHE.invalidate(self.agent_path)
+                results = map_shards("bulk", [(self._shard_path(index), spill_files[index].name) for index in sorted(spill_files)], self.workers)
+            except OSError as e:
+                raise KnowledgeFlaskException(f"Fehler beim Verteilen der Elemente auf die Shards von '{self.agent_path}': {e}") from e
+            finally:
+                for f in spill_files.values():
+                    f.close()
+                    try:
+                        os.remove(f.name)
+                    except FileNotFoundError:
+                        pass
+                self._shards.clear() # Die Shards wurden in anderen Prozessen geschrieben
+            for shard in self.shards:
+                if not shard.exists():
+                    shard._save_knowledge_to_file([]) # Auch leere Shards erhalten einen Snapshot
+        return sum(added for added, _ in results), skipped + sum(shard_skipped for _, shard_skipped in results)
+
+    @instrumented("shards.add_chunks")
+    def add_chunks(self, chunks: Iterable[dict], batch_size: int = DEFAULT_CHUNK_BATCH_SIZE) -> tuple[int, int]:
+        """
+        Schreibt Chunks stapelweise samt Herkunft in ihre Shards (ein Commit je Stapel und
+        betroffenem Shard). Gibt (hinzugefügt, übersprungen) zurück.
+        """
+        chunks = iter(chunks)
+        added = skipped = 0
+        while True:
+            batch = list(itertools.islice(chunks, max(1, batch_size)))
+            if not batch:
+                return added, skipped
+            with self.lock.hold():
+                targets = {item: index for index, item in self._assign(dict.fromkeys(chunk["text"] for chunk in batch))}
+                groups: dict[int, list[dict]] = {}
+                for chunk in batch:
+                    index = targets[chunk["text"]]
+                    if index is None:
+                        skipped += 1
+                    else:
+                        groups.setdefault(index, []).append(chunk)
+                for index, shard_chunks in groups.items():
+                    shard_added, shard_skipped = self.shard(index).add_chunks(shard_chunks, len(shard_chunks))
+                    added += shard_added
+                    skipped += shard_skipped
+                QUERY_CACHE.invalidate(self.agent_path)
+
+    def add_chunk_sources(self, sources: dict[str, dict]):
+        """Übernimmt Chunk-Herkunft (Digest -> source, start, end) in die Shards der jeweiligen Elemente."""
+        groups: dict[int, list[dict]] = {}
+        for digest, index in self._locate(sources).items():
+            groups.setdefault(index, []).append({"digest": digest, **sources[digest]})
+        for index, records in groups.items():
+            self.shard(index)._append_chunk_source_records(records)
+
+    def load_chunk_sources(self) -> dict[str, dict]:
+        """Gibt die Herkunft importierter Chunks aller Shards zurück (Digest -> source, start, end)."""
+        sources = {}
+        for shard in self.shards:
+            sources.update(shard.load_chunk_sources())
+        return sources
+
+    def knowledge_segments(self) -> list[list[str]]:
+        """Die Elemente je Shard, unter einer Sperre gelesen (ein konsistenter Stand)."""
+        with self.lock.hold(exclusive=False):
+            return [shard.get_knowledge() for shard in self.shards]
+
+    def version_chunk_map(self) -> list[tuple[str, int, int]]:
+        """Die Chunk-Pläne der Shards hintereinander, mit Startpositionen in der gesamten Wissensbasis."""
+        chunk_map, offset = [], 0
+        with self.lock.hold(exclusive=False):
+            for shard in self.shards:
+                shard_map = shard.version_chunk_map()
+                chunk_map += [(digest, offset + start, count) for digest, start, count in shard_map]
+                offset += sum(count for _, _, count in shard_map)
+        return chunk_map
+
+    @instrumented("shards.get_knowledge")
+    def get_knowledge(self) -> list[str]:
+        """Gibt die gesamte Wissensbasis zurück (Shard für Shard)."""
+        return [item for segment in self.knowledge_segments() for item in segment]
+
+    def iter_knowledge(self, offset: int = 0, limit: int = None) -> Iterator[str]:
+        """
+        Streamt einen Ausschnitt der Wissensbasis: Shards vor offset werden nur gezählt,
+        die übrigen über KnowledgeBaseManager.iter_knowledge gelesen.
+        """
+        with self.lock.hold(exclusive=False):
+            for shard in self.shards:
+                if limit is not None and limit <= 0:
+                    return
+                if offset:
+                    count = shard.count_knowledge()
+                    if offset >= count:
+                        offset -= count
+                        continue
+                read = 0
+                for item in shard.iter_knowledge(offset, limit):
+                    read += 1
+                    yield item
+                offset = 0
+                if limit is not None:
+                    limit -= read
+
+    @instrumented("shards.count_knowledge")
+    def count_knowledge(self) -> int:
+        """Gibt die Anzahl der Elemente aller Shards zurück."""
+        return sum(self.shard_counts())
+
+    @instrumented("shards.query")
+    def query(self, query_text: str, top_k: int = DEFAULT_TOP_K, mode: str = "bm25",
+              embedder: str = DEFAULT_EMBEDDER) -> list[dict]:
+        """
+        Scatter-Gather-Suche: jeder Shard liefert seine besten top_k Treffer (parallel im
+        Prozesspool), daraus werden die besten top_k insgesamt. BM25-Statistiken (Dokumentfrequenzen,
+        mittlere Länge) gelten je Shard; bei gleichmäßig verteilten Shards weichen die Scores
+        daher nur wenig von einer ungeteilten Wissensbasis ab.
+        """
+        if mode not in QUERY_MODES:
+            raise KnowledgeFlaskException(f"Unbekannter Suchmodus '{mode}'. Verfügbar: {', '.join(QUERY_MODES)}.")
+        generation = self.generation()
+        cache_key = query_cache_key(query_text, top_k, mode, embedder)
+        results = QUERY_CACHE.get(self.agent_path, generation, cache_key)
+        if results is not None:
+            return results
+        with self.lock.hold(exclusive=False):
+            shard_results = map_shards("query", [(path, query_text, top_k, mode, embedder) for path in self.shard_paths], self.workers)
+        candidates, offset = [], 0
+        for count, hits in shard_results:
+            candidates.extend({**hit, "position": hit["position"] + offset} for hit in hits)
+            offset += count
+        results = heapq.nlargest(top_k, candidates, key=lambda hit: hit["score"])
+        QUERY_CACHE.put(self.agent_path, generation, cache_key, results)
+        return results
+
+    @instrumented("shards.compact")
+    def compact(self) -> bool:
+        """Faltet die Segment-Logs aller Shards parallel in ihre Snapshots. Gibt True zurück, wenn es Logs gab."""
+        with self.lock.hold():
+            return any(map_shards("compact", [(path,) for path in self.shard_paths], self.workers))
+
+    @instrumented("shards.rebuild_indexes")
+    def rebuild_indexes(self) -> int:
+        """Baut die Indizes aller Shards parallel neu auf und gibt die Anzahl der Elemente zurück."""
+        with self.lock.hold():
+            return sum(map_shards("reindex", [(path,) for path in self.shard_paths], self.workers))
+
+    @instrumented("shards.verify")
+    def verify(self) -> list[str]:
+        """Prüft alle Shards parallel (im Modus 'hash' auch die Zuordnung der Elemente) und gibt gefundene Probleme zurück."""
+        shard_count = self.config["shards"] if self.config["mode"] == "hash" else None
+        with self.lock.hold(exclusive=False):
+            results = map_shards("verify", [(path, index, shard_count) for index, path in enumerate(self.shard_paths)], self.workers)
+        return [f"Shard {index:03d}: {problem}" for index, problems in enumerate(results) for problem in problems]
+
+    @instrumented("shards.migrate_format")
+    def migrate_format(self, storage_format: str, codec: str = DEFAULT_BINARY_CODEC) -> int:
+        """Schreibt alle Shards parallel im Zielformat neu und gibt die Anzahl der Elemente zurück."""
+        if storage_format not in STORAGE_FORMATS:
+            raise KnowledgeFlaskException(f"Unbekanntes Speicherformat '{storage_format}'. Verfügbar: {', '.join(STORAGE_FORMATS)}.")
+        with self.lock.hold():
+            return sum(map_shards("migrate", [(path, storage_format, codec) for path in self.shard_paths], self.workers))
+
+    @instrumented("shards.snapshot_chunks")
+    def snapshot_chunks(self, object_store: ObjectStore) -> tuple[int, list[str]]:
+        """
+        Legt die Chunks aller Shards parallel im Object-Store einer Version ab. Die geteilte Sperre
+        hält Schreiber fern, sodass die Version einen konsistenten Stand aller Shards festhält.
+        Gibt (Anzahl Elemente, Chunk-Hashes in Shard-Reihenfolge) zurück.
+        """
+        with self.lock.hold(exclusive=False):
+            results = map_shards("snapshot", [(path, object_store.objects_dir) for path in self.shard_paths], self.workers)
+        return sum(count for count, _ in results), [digest for _, chunks in results for digest in chunks]
+
+    def remove_near_duplicates(self, threshold: float = None, dry_run: bool = False) -> list[dict]:
+        """Beinahe-Duplikate werden über Shard-Grenzen hinweg nicht erkannt; daher nicht unterstützt."""
+        raise KnowledgeFlaskException("Die Beinahe-Duplikat-Bereinigung ist für geteilte Wissensbasen nicht verfügbar.")
+
+    def _save_knowledge_to_file(self, knowledge_data: list[str]):
+        """
+        Ersetzt die gesamte Wissensbasis: Die Shards entstehen samt der Chunk-Herkunft verbliebener
+        Elemente neu in shards.new und werden wie bei reshard erst danach übernommen, sodass ein
+        Abbruch den bisherigen Stand hinterlässt.
+        """
+        new_dir, old_dir = self.shards_dir + ".new", self.shards_dir + ".old"
+        with self.lock.hold():
+            try:
+                _prepare_shard_swap(self.shards_dir)
+                target = ShardedKnowledgeBase(self.agent_path, self.config, self.workers, new_dir)
+                target.add_knowledge_bulk(knowledge_data)
+                target.add_chunk_sources(self.load_chunk_sources())
+                save_shard_config(new_dir, self.config)
+                if os.path.exists(self.shards_dir):
+                    os.replace(self.shards_dir, old_dir)
+                os.replace(new_dir, self.shards_dir)
+                self._shards.clear()
+                if os.path.exists(old_dir):
+                    shutil.rmtree(old_dir)
+            except OSError as e:
+                raise KnowledgeFlaskException(f"Fehler beim Ersetzen der Shards '{self.shards_dir}': {e}") from e
+            QUERY_CACHE.invalidate(self.agent_path)
+
+    @classmethod
+    def reshard(cls, agent_path: str, config: dict, workers: int = DEFAULT_SHARD_WORKERS) -> "ShardedKnowledgeBase":
+        """
+        Verteilt die Wissensbasis eines Agenten (geteilt oder nicht) neu nach config. Die neuen Shards
+        entstehen samt Chunk-Herkunft und Konfiguration in shards.new und werden mit einer Umbenennung
+        übernommen, zuletzt wird shards.json im Agentenverzeichnis ersetzt. Versionen bleiben gültig; Suchindizes baut jeder Shard bei Bedarf neu auf.
+        """
+        config = normalize_shard_config(config)
+        shards_dir = os.path.join(agent_path, SHARDS_DIR_NAME)
+        new_dir, old_dir = shards_dir + ".new", shards_dir + ".old"
+        with AgentLock.for_agent(agent_path).hold():
+            source = open_knowledge_base(agent_path, workers)
+            try:
+                _prepare_shard_swap(shards_dir)
+                target = cls(agent_path, config, workers, new_dir)
+                target.add_knowledge_bulk(source.iter_knowledge())
+                target.add_chunk_sources(source.load_chunk_sources())
+                save_shard_config(new_dir, config) # Wird mit den Shards übernommen
+                if os.path.exists(shards_dir):
+                    os.replace(shards_dir, old_dir)
+                os.replace(new_dir, shards_dir)
+                save_shard_config(agent_path, config)
+                if os.path.exists(old_dir):
+                    shutil.rmtree(old_dir)
+                if not isinstance(source, ShardedKnowledgeBase):
+                    for file_name in (KNOWLEDGE_FILE_NAME, BINARY_KNOWLEDGE_FILE_NAME, KNOWLEDGE_LOG_FILE_NAME, KNOWLEDGE_INDEX_FILE_NAME,
+                                      ROW_OFFSETS_FILE_NAME, CHUNK_SOURCES_FILE_NAME, *DERIVED_INDEX_FILE_NAMES):
+                        source._remove_file(os.path.join(agent_path, file_name))
+            except OSError as e:
+                raise KnowledgeFlaskException(f"Fehler beim Aufteilen der Wissensbasis '{agent_path}' in Shards: {e}") from e
+            QUERY_CACHE.invalidate(agent_path)
+        return cls(agent_path, config, workers)
+
+class StorageBackend(ABC):
+    """
+    Abstrakte Basisklasse für Speicher-Backends: legt fest, wo Agenten, ihre Wissensbasen und
+    Versionen liegen. knowledge_base() und version_manager() liefern Objekte mit der
+    Schnittstelle von KnowledgeBaseManager bzw. VersionManager.
+    """
+    name = "base"
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+
+    @abstractmethod
+    def location(self, agent_name: str) -> str:
+        """Beschreibt für Meldungen, wo die Daten eines Agenten liegen."""
+
+    @abstractmethod
+    def agent_exists(self, agent_name: str) -> bool:
+        """Prüft, ob der Agent angelegt ist."""
+
+    @abstractmethod
+    def list_agents(self) -> list[str]:
+        """Gibt die Namen aller Agenten sortiert zurück."""
+
+    @abstractmethod
+    def create_agent(self, agent_name: str):
+        """Legt einen Agenten mit leerer Wissensbasis an."""
+
+    @abstractmethod
+    def delete_agent(self, agent_name: str):
+        """Löscht einen Agenten samt Wissen und Versionen."""
+
+    @abstractmethod
+    def knowledge_base(self, agent_name: str):
+        """Gibt die Wissensbasis des Agenten zurück (Schnittstelle wie KnowledgeBaseManager)."""
+
+    @abstractmethod
+    def version_manager(self, agent_name: str):
+        """Gibt die Versionsverwaltung des Agenten zurück (Schnittstelle wie VersionManager)."""
+
+class FileStorageBackend(StorageBackend):
+    """Ein Verzeichnis je Agent unter <base_dir>/agents mit Snapshot, Segment-Log, Indizes und Versionen."""
+    name = "files"
+
+    def __init__(self, base_dir: str):
+        super().__init__(base_dir)
+        self.agents_dir = os.path.join(base_dir, AGENTS_DIR_NAME)
+
+    def agent_path(self, agent_name: str) -> str:
+        """Gibt den vollständigen Pfad zu einem Agentenverzeichnis zurück."""
+        return os.path.join(self.agents_dir, agent_name)
+
+    def location(self, agent_name: str) -> str:
+        return self.agent_path(agent_name)
+
+    def agent_exists(self, agent_name: str) -> bool:
+        return os.path.isdir(self.agent_path(agent_name))
+
+    def list_agents(self) -> list[str]:
+        if not os.path.exists(self.agents_dir):
+            return []
+        METRICS.count("directories_listed")
+        return sorted(d for d in os.listdir(self.agents_dir) if os.path.isdir(self.agent_path(d)))
+
+    def create_agent(self, agent_name: str):
+        agent_path = self.agent_path(agent_name)
+        os.makedirs(agent_path)
+        # Initialisiere die KnowledgeBase für den neuen Agenten
+        KnowledgeBaseManager(agent_path)._save_knowledge_to_file([])
+        VersionManager(agent_path) # Stellen Sie sicher, dass der Versionsordner initialisiert wird
+
+    def delete_agent(self, agent_name: str):
+        shutil.rmtree(self.agent_path(agent_name))
+
+    def knowledge_base(self, agent_name: str) -> KnowledgeBaseManager:
+        return open_knowledge_base(self.agent_path(agent_name))
+
+    def version_manager(self, agent_name: str) -> VersionManager:
+        return VersionManager(self.agent_path(agent_name))
+
+# Schema der SQLite-Datenbank. items_fts ist ein FTS5-Index mit externem Inhalt (die Texte liegen
+# nur in items); Trigger halten ihn aktuell. Die Spalte agent_id wird mitindiziert, damit eine
+# Suche per Spaltenfilter nur die Elemente eines Agenten trifft. Versionen sind Manifeste
+# (version_items: Position und Digest), die Texte liegen dedupliziert in objects. settings hält
+# Einstellungen je Agent als JSON (z.B. die Aufbewahrungsregeln).
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, generation INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL, position INTEGER NOT NULL, digest TEXT NOT NULL,
+    text TEXT NOT NULL, source TEXT, start INTEGER, end INTEGER,
+    UNIQUE (agent_id, position), UNIQUE (agent_id, digest));
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    text, agent_id, content='items', content_rowid='id', tokenize='unicode61 remove_diacritics 0');
+CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, text, agent_id) VALUES (new.id, new.text, new.agent_id);
+END;
+CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, text, agent_id) VALUES ('delete', old.id, old.text, old.agent_id);
+END;
+CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, text TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS versions (
+    rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, agent_id INTEGER NOT NULL,
+    timestamp TEXT NOT NULL, description TEXT NOT NULL, item_count INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS versions_by_agent_timestamp ON versions (agent_id, timestamp);
+CREATE TABLE IF NOT EXISTS version_items (
+    version_rowid INTEGER NOT NULL, position INTEGER NOT NULL, digest TEXT NOT NULL,
+    PRIMARY KEY (version_rowid, position)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS version_items_by_digest ON version_items (digest, version_rowid);
+CREATE TABLE IF NOT EXISTS settings (
+    agent_id INTEGER NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (agent_id, name)) WITHOUT ROWID;
+"""
+
+# Neue Elemente werden stapelweise in die temporäre Tabelle staging geschrieben und per
+# INSERT ... SELECT übernommen: Duplikate (im Bestand und im Stapel) fallen dabei heraus,
+# die übrigen erhalten fortlaufende Positionen hinter dem Bestand.
+SQLITE_INSERT_STAGED_ITEMS = """
+INSERT INTO items (agent_id, position, digest, text, source, start, end)
+SELECT :agent_id, :first_position + ROW_NUMBER() OVER (ORDER BY seq) - 1, digest, text, source, start, end
+FROM staging AS s
+WHERE seq = (SELECT MIN(seq) FROM staging AS t WHERE t.digest = s.digest)
+  AND NOT EXISTS (SELECT 1 FROM items AS i WHERE i.agent_id = :agent_id AND i.digest = s.digest)
+"""
+
+# Elemente (position, digest, text) der Live-Wissensbasis bzw. einer Version, für diff und restore
+SQLITE_LIVE_ITEMS = "SELECT position, digest, text FROM items WHERE agent_id = :agent_id"
+SQLITE_VERSION_ITEMS = (
+    "SELECT v.position, v.digest, o.text FROM version_items AS v JOIN objects AS o ON o.digest = v.digest "
+    "WHERE v.version_rowid = :version_rowid"
+)
+
+class SQLiteStorageBackend(StorageBackend):
+    """
+    Alle Agenten mit Wissen, Volltextindex (FTS5) und Versionen in einer SQLite-Datei
+    (knowledgeflask.sqlite, WAL-Modus). Jeder Thread erhält eine eigene Verbindung, die für
+    die Lebensdauer des Backends offen bleibt, so dass ihr Statement-Cache die vorbereiteten
+    Anweisungen über alle Aufrufe (z.B. in 'batch') wiederverwendet. Schreibzugriffe laufen in
+    expliziten Transaktionen (BEGIN IMMEDIATE) und schreiben Zeilen per executemany in Stapeln.
+    """
+    name = "sqlite"
+
+    def __init__(self, base_dir: str):
+        super().__init__(base_dir)
+        self.db_path = os.path.join(base_dir, SQLITE_STORE_FILE_NAME)
+        self._local = threading.local()
+        self._connections: list["sqlite3.Connection"] = []
+        self._connections_lock = threading.Lock()
+
+    def connect(self) -> "sqlite3.Connection":
+        """Öffnet die Verbindung des Threads beim ersten Zugriff und legt das Schema bei Bedarf an."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection
+        try:
+            os.makedirs(self.base_dir, exist_ok=True)
+            # check_same_thread=False nur, damit close() alle Verbindungen schließen kann
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False,
+                                         cached_statements=SQLITE_CACHED_STATEMENTS)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL") # Im WAL-Modus konsistent, fsync erst beim Checkpoint
+            if connection.execute("PRAGMA user_version").fetchone()[0] < SQLITE_SCHEMA_VERSION:
+                connection.executescript(SQLITE_SCHEMA + f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION};")
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS staging ("
+                "seq INTEGER PRIMARY KEY, digest TEXT, text TEXT, source TEXT, start INTEGER, end INTEGER)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS temp.staging_by_digest ON staging (digest)")
+        except (sqlite3.Error, OSError) as e:
+            raise KnowledgeFlaskException(f"Fehler beim Öffnen der Datenbank '{self.db_path}': {e}") from e
+        self._local.connection = connection
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def close(self):
+        """Schließt die Verbindungen aller Threads (sie werden beim nächsten Zugriff neu geöffnet)."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    @contextmanager
+    def transaction(self):
+        """Schreibtransaktion: COMMIT bei Erfolg, sonst ROLLBACK; SQLite-Fehler werden umgewandelt."""
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Schreiben der Datenbank '{self.db_path}': {e}") from e
+
+    def query(self, sql: str, params=()) -> list[tuple]:
+        """Führt eine lesende Anweisung aus und gibt alle Zeilen zurück."""
+        try:
+            return self.connect().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Datenbank '{self.db_path}': {e}") from e
+
+    def agent_id(self, agent_name: str) -> int:
+        """Gibt die ID eines Agenten zurück oder None."""
+        if not os.path.exists(self.db_path):
+            return None # Lesende Befehle legen keine Datenbank an
+        rows = self.query("SELECT id FROM agents WHERE name = ?", (agent_name,))
+        return rows[0][0] if rows else None
+
+    def location(self, agent_name: str) -> str:
+        return self.db_path
+
+    def agent_exists(self, agent_name: str) -> bool:
+        return self.agent_id(agent_name) is not None
+
+    @instrumented("sqlite.list_agents")
+    def list_agents(self) -> list[str]:
+        if not os.path.exists(self.db_path):
+            return []
+        return [row[0] for row in self.query("SELECT name FROM agents ORDER BY name")]
+
+    def create_agent(self, agent_name: str):
+        with self.transaction() as connection:
+            connection.execute("INSERT INTO agents (name) VALUES (?)", (agent_name,))
+
+    def delete_agent(self, agent_name: str):
+        agent_id = self.agent_id(agent_name)
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM items WHERE agent_id = ?", (agent_id,))
+            connection.execute("DELETE FROM version_items WHERE version_rowid IN (SELECT rowid FROM versions WHERE agent_id = ?)", (agent_id,))
+            connection.execute("DELETE FROM versions WHERE agent_id = ?", (agent_id,))
+            connection.execute("DELETE FROM settings WHERE agent_id = ?", (agent_id,))
+            connection.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
+            self.collect_garbage(connection)
+        QUERY_CACHE.invalidate(self.cache_key(agent_name))
+        try:
+            shutil.rmtree(self.cache_key(agent_name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Entfernen des Cache-Verzeichnisses von Agent '{agent_name}': {e}") from e
+
+    @staticmethod
+    def collect_garbage(connection: "sqlite3.Connection") -> int:
+        """Entfernt Texte aus objects, die von keiner Version mehr referenziert werden."""
+        return connection.execute(
+            "DELETE FROM objects WHERE NOT EXISTS (SELECT 1 FROM version_items AS v WHERE v.digest = objects.digest)"
+        ).rowcount
+
+    def cache_key(self, agent_name: str) -> str:
+        """
+        Schlüssel des Agenten im QUERY_CACHE (anstelle des Agentenverzeichnisses): das Verzeichnis
+        query_cache/<Agent> neben der Datenbank, in dem im Modus disk query_cache.sqlite liegt.
+        """
+        return os.path.join(self.base_dir, QUERY_CACHE_DIR_NAME, agent_name)
+
+    def knowledge_base(self, agent_name: str) -> "SQLiteKnowledgeBase":
+        return SQLiteKnowledgeBase(self, agent_name, self.agent_id(agent_name))
+
+    def version_manager(self, agent_name: str) -> "SQLiteVersionManager":
+        return SQLiteVersionManager(self, agent_name, self.agent_id(agent_name))
+
+    @instrumented("sqlite.import_agent")
+    def import_agent(self, agent_name: str, kb_manager: KnowledgeBaseManager, version_manager: VersionManager) -> dict:
+        """
+        Übernimmt einen Agenten aus dem Dateilayout in einer Transaktion: Wissen (samt
+        Herkunft der Chunks) mit unveränderten Positionen, alle Versionen (auch archivierte)
+        mit ID, Zeitstempel und Beschreibung sowie die Aufbewahrungsregeln.
+        Gibt die Anzahl übernommener Elemente und Versionen zurück.
+        """
+        sources = kb_manager.load_chunk_sources()
+        versions = version_manager.list_versions() + version_manager.list_archived_versions()
+        policy = version_manager.load_retention_policy()
+        with self.transaction() as connection:
+            agent_id = connection.execute("INSERT INTO agents (name) VALUES (?)", (agent_name,)).lastrowid
+            if policy:
+                connection.execute("INSERT INTO settings (agent_id, name, value) VALUES (?, 'retention', ?)", (agent_id, json.dumps(policy)))
+            item_count = 0
+            items = enumerate(kb_manager.iter_knowledge())
+            while True:
+                batch = list(itertools.islice(items, SQLITE_BATCH_SIZE))
+                if not batch:
+                    break
+                rows = []
+                for position, item in batch:
+                    digest = item_digest(item)
+                    source = sources.get(digest, {})
+                    rows.append((agent_id, position, digest, item, source.get("source"), source.get("start"), source.get("end")))
+                connection.executemany(
+                    "INSERT INTO items (agent_id, position, digest, text, source, start, end) VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                item_count += len(rows)
+            for version in versions:
+                knowledge = version_manager._load_version_items(version["id"])
+                version_rowid = connection.execute(
+                    "INSERT INTO versions (id, agent_id, timestamp, description, item_count) VALUES (?, ?, ?, ?, ?)",
+                    (version["id"], agent_id, version["timestamp"], version["description"], len(knowledge))
+                ).lastrowid
+                for start in range(0, len(knowledge), SQLITE_BATCH_SIZE):
+                    digests = [(item_digest(item), item) for item in knowledge[start:start + SQLITE_BATCH_SIZE]]
+                    connection.executemany("INSERT OR IGNORE INTO objects (digest, text) VALUES (?, ?)", digests)
+                    connection.executemany(
+                        "INSERT INTO version_items (version_rowid, position, digest) VALUES (?, ?, ?)",
+                        [(version_rowid, start + offset, digest) for offset, (digest, _) in enumerate(digests)]
+                    )
+        return {"items": item_count, "versions": len(versions)}
+
+class SQLiteKnowledgeBase:
+    """Wissensbasis eines Agenten im SQLite-Backend (Schnittstelle wie KnowledgeBaseManager)."""
+    def __init__(self, store: SQLiteStorageBackend, agent_name: str, agent_id: int):
+        self.store = store
+        self.agent_name = agent_name
+        self.agent_id = agent_id
+
+    def generation(self) -> tuple:
+        """Generation der Wissensbasis: Zähler, den jede schreibende Transaktion erhöht."""
+        return tuple(self.store.query("SELECT generation FROM agents WHERE id = ?", (self.agent_id,))[0])
+
+    def _insert_batch(self, connection: "sqlite3.Connection", rows: list[tuple]) -> int:
+        """Übernimmt (digest, text, source, start, end)-Zeilen ohne Duplikate; gibt die Anzahl neuer Elemente zurück."""
+        connection.execute("DELETE FROM staging")
+        connection.executemany("INSERT INTO staging (digest, text, source, start, end) VALUES (?, ?, ?, ?, ?)", rows)
+        first_position = connection.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM items WHERE agent_id = ?", (self.agent_id,)
+        ).fetchone()[0]
+        return connection.execute(SQLITE_INSERT_STAGED_ITEMS, {"agent_id": self.agent_id, "first_position": first_position}).rowcount
+
+    def _commit_changes(self, connection: "sqlite3.Connection"):
+        """Erhöht die Generation (innerhalb der Transaktion) und verwirft den Abfrage-Cache des Agenten."""
+        connection.execute("UPDATE agents SET generation = generation + 1 WHERE id = ?", (self.agent_id,))
+        QUERY_CACHE.invalidate(self.store.cache_key(self.agent_name))
+
+    @instrumented("sqlite.append")
+    def append_knowledge(self, knowledge_items: Iterable[str], check_near_duplicates: bool = True) -> list[str]:
+        """Hängt neue Elemente an und gibt die tatsächlich hinzugefügten zurück (Duplikate entfallen)."""
+        rows = [(item_digest(item), item, None, None, None) for item in knowledge_items]
+        with self.store.transaction() as connection:
+            first_position = connection.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM items WHERE agent_id = ?", (self.agent_id,)
+            ).fetchone()[0]
+            if not rows or not self._insert_batch(connection, rows):
+                return []
+            self._commit_changes(connection)
+            return [row[0] for row in connection.execute(
+                "SELECT text FROM items WHERE agent_id = ? AND position >= ? ORDER BY position", (self.agent_id, first_position)
+            )]
+
+    def add_knowledge(self, knowledge_item: str) -> bool:
+        """Fügt ein Wissenselement hinzu, Duplikate erkennt der eindeutige Digest."""
+        if not self.append_knowledge([knowledge_item]):
+            print(f"Wissen '{knowledge_item[:50]}...' ist bereits vorhanden.")
+            return False
+        print(f"Wissen hinzugefügt: '{knowledge_item[:50]}...'")
+        return True
+
+    @instrumented("sqlite.add_bulk")
+    def add_knowledge_bulk(self, knowledge_items: Iterable[str]) -> tuple[int, int]:
+        """Fügt viele Elemente in einer Transaktion hinzu, gestreamt in Stapeln. Gibt (hinzugefügt, übersprungen) zurück."""
+        knowledge_items = iter(knowledge_items)
+        added = total = 0
+        with self.store.transaction() as connection:
+            while True:
+                batch = [(item_digest(item), item, None, None, None) for item in itertools.islice(knowledge_items, SQLITE_BATCH_SIZE)]
+                if not batch:
+                    break
+                added += self._insert_batch(connection, batch)
+                total += len(batch)
+            if added:
+                self._commit_changes(connection)
+        return added, total - added
+
+    @instrumented("sqlite.add_chunks")
+    def add_chunks(self, chunks: Iterable[dict], batch_size: int = DEFAULT_CHUNK_BATCH_SIZE) -> tuple[int, int]:
+        """Fügt Chunks samt Herkunft hinzu; jeder Stapel ist eine eigene Transaktion. Gibt (hinzugefügt, übersprungen) zurück."""
+        chunks = iter(chunks)
+        added = skipped = 0
+        while True:
+            batch = [
+                (item_digest(chunk["text"]), chunk["text"], chunk["source"], chunk["start"], chunk["end"])
+                for chunk in itertools.islice(chunks, max(1, batch_size))
+            ]
+            if not batch:
+                return added, skipped
+            with self.store.transaction() as connection:
+                batch_added = self._insert_batch(connection, batch)
+                if batch_added:
+                    self._commit_changes(connection)
+            added += batch_added
+            skipped += len(batch) - batch_added
+
+    def load_chunk_sources(self) -> dict[str, dict]:
+        """Gibt die Herkunft der importierten Chunks zurück (Digest -> source, start, end)."""
+        rows = self.store.query(
+            "SELECT digest, source, start, end FROM items WHERE agent_id = ? AND source IS NOT NULL", (self.agent_id,)
+        )
+        return {digest: {"source": source, "start": start, "end": end} for digest, source, start, end in rows}
+
+    def iter_knowledge(self, offset: int = 0, limit: int = None) -> Iterator[str]:
+        """Streamt einen Ausschnitt der Wissensbasis; die Positionen sind lückenlos, offset nutzt den Index."""
+        try:
+            cursor = self.store.connect().execute(
+                "SELECT text FROM items WHERE agent_id = ? AND position >= ? ORDER BY position LIMIT ?",
+                (self.agent_id, offset, limit if limit is not None else -1)
+            )
+            for row in cursor:
+                yield row[0]
+        except sqlite3.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Datenbank '{self.store.db_path}': {e}") from e
+
+    def get_knowledge(self) -> list[str]:
+        """Gibt die gesamte Wissensbasis zurück."""
+        return list(self.iter_knowledge())
+
+    def count_knowledge(self) -> int:
+        """Gibt die Anzahl der Elemente zurück."""
+        return self.store.query("SELECT COUNT(*) FROM items WHERE agent_id = ?", (self.agent_id,))[0][0]
+
+    @instrumented("sqlite.query")
+    def query(self, query_text: str, top_k: int = DEFAULT_TOP_K, mode: str = "bm25",
+              embedder: str = DEFAULT_EMBEDDER) -> list[dict]:
+        """
+        BM25-Suche über den FTS5-Index. Der Spaltenfilter auf agent_id beschränkt die Suche
+        auf den Agenten; die Dokumenthäufigkeiten zählen allerdings über alle Agenten der Datenbank.
+        """
+        if mode not in QUERY_MODES:
+            raise KnowledgeFlaskException(f"Unbekannter Suchmodus '{mode}'. Verfügbar: {', '.join(QUERY_MODES)}.")
+        if mode != "bm25":
+            raise KnowledgeFlaskException(f"Der Suchmodus '{mode}' ist nur mit dem Speicher-Backend 'files' verfügbar.")
+        terms = sorted(set(tokenize(query_text)))
+        if not terms or top_k <= 0:
+            return []
+        cache_key = query_cache_key(query_text, top_k, mode, embedder)
+        generation = self.generation()
+        cache_dir = self.store.cache_key(self.agent_name)
+        if QUERY_CACHE.mode == "disk":
+            try:
+                os.makedirs(cache_dir, exist_ok=True) # Ohne Verzeichnis bliebe jeder Plattenzugriff ein Miss
+            except OSError:
+                pass # Dann eben nur der Cache im Speicher
+        results = QUERY_CACHE.get(cache_dir, generation, cache_key)
+        if results is not None:
+            return results
+        match = f'agent_id : "{self.agent_id}" AND text : (' + " OR ".join(f'"{term}"' for term in terms) + ")"
+        rows = self.store.query(
+            "SELECT items.position, -bm25(items_fts, 1.0, 0.0) AS score, items.text "
+            "FROM items_fts JOIN items ON items.id = items_fts.rowid "
+            "WHERE items_fts MATCH ? ORDER BY score DESC, items.position LIMIT ?",
+            (match, top_k)
+        )
+        results = [{"position": position, "score": score, "item": text} for position, score, text in rows]
+        QUERY_CACHE.put(cache_dir, generation, cache_key, results)
+        return results
+
+    def compact(self) -> bool:
+        """Überträgt das WAL in die Datenbank und optimiert den Volltextindex (betrifft alle Agenten)."""
+        with self.store.transaction() as connection:
+            connection.execute("INSERT INTO items_fts (items_fts) VALUES ('optimize')")
+        self.store.query("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+
+class SQLiteVersionManager:
+    """Versionen eines Agenten im SQLite-Backend (Schnittstelle wie VersionManager)."""
+    def __init__(self, store: SQLiteStorageBackend, agent_name: str, agent_id: int):
+        self.store = store
+        self.agent_name = agent_name
+        self.agent_id = agent_id
+
+    def _version_rowid(self, version_id: str) -> int:
+        """Gibt die interne Zeilennummer einer Version des Agenten zurück."""
+        rows = self.store.query("SELECT rowid FROM versions WHERE id = ? AND agent_id = ?", (version_id, self.agent_id))
+        if not rows:
+            raise VersionNotFoundError(version_id)
+        return rows[0][0]
+
+    @instrumented("sqlite.version_create")
+    def create_version(self, description: str = None) -> str:
+        """Legt ein Manifest der aktuellen Elemente an; nur neue Texte werden in objects kopiert."""
+        version_id = str(uuid.uuid4()) # Eindeutige ID für die Version
+        with self.store.transaction() as connection:
+            connection.execute("INSERT OR IGNORE INTO objects (digest, text) SELECT digest, text FROM items WHERE agent_id = ?", (self.agent_id,))
+            version_rowid = connection.execute(
+                "INSERT INTO versions (id, agent_id, timestamp, description, item_count) "
+                "SELECT ?, ?, ?, ?, COUNT(*) FROM items WHERE agent_id = ?",
+                (version_id, self.agent_id, datetime.datetime.now().isoformat(),
+                 description if description else "Keine Beschreibung", self.agent_id)
+            ).lastrowid
+            connection.execute(
+                "INSERT INTO version_items (version_rowid, position, digest) SELECT ?, position, digest FROM items WHERE agent_id = ?",
+                (version_rowid, self.agent_id)
+            )
+        policy = self.load_retention_policy()
+        if policy.get("auto"):
+            self.prune(policy)
+        return version_id
+
+    def _items_sql(self, version_id: str) -> tuple[str, dict]:
+        """Abfrage der Elemente einer Version oder (bei 'live') der aktuellen Wissensbasis."""
+        if version_id == LIVE_VERSION_ID:
+            return SQLITE_LIVE_ITEMS, {"agent_id": self.agent_id}
+        return SQLITE_VERSION_ITEMS, {"version_rowid": self._version_rowid(version_id)}
+
+    @instrumented("sqlite.version_diff")
+    def diff(self, from_version_id: str, to_version_id: str) -> dict:
+        """Vergleicht zwei Versionen (oder eine Version mit 'live') per Mengendifferenz der Digests in SQL."""
+        from_sql, from_params = self._items_sql(from_version_id)
+        to_sql, to_params = self._items_sql(to_version_id)
+        params = {**from_params, **to_params}
+        if from_version_id == to_version_id:
+            return {"added": [], "removed": []}
+
+        def changed_items(left_sql: str, right_sql: str) -> list[str]:
+            rows = self.store.query(
+                f"SELECT text FROM ({left_sql}) WHERE digest NOT IN (SELECT digest FROM ({right_sql})) ORDER BY position", params
+            )
+            return [row[0] for row in rows]
+
+        return {"added": changed_items(to_sql, from_sql), "removed": changed_items(from_sql, to_sql)}
+
+    @instrumented("sqlite.version_restore")
+    def restore_version(self, version_id: str):
+        """
+        Stellt eine Version in einer Transaktion wieder her: Entfernt nicht enthaltene Elemente,
+        ergänzt fehlende und übernimmt die Reihenfolge der Version. Verbleibende Elemente
+        behalten ihre Herkunftsangaben, der Volltextindex ändert sich nur für die Differenz.
+        """
+        version_rowid = self._version_rowid(version_id)
+        params = {"agent_id": self.agent_id, "version_rowid": version_rowid}
+        with self.store.transaction() as connection:
+            removed = connection.execute(
+                "DELETE FROM items WHERE agent_id = :agent_id AND digest NOT IN "
+                "(SELECT digest FROM version_items WHERE version_rowid = :version_rowid)", params
+            ).rowcount
+            # Positionen zunächst negativ vergeben, damit die Eindeutigkeit (agent_id, position) nicht verletzt wird
+            connection.execute(
+                "UPDATE items SET position = -1 - (SELECT v.position FROM version_items AS v "
+                "WHERE v.version_rowid = :version_rowid AND v.digest = items.digest) WHERE agent_id = :agent_id", params
+            )
+            added = connection.execute(
+                "INSERT INTO items (agent_id, position, digest, text) "
+                "SELECT :agent_id, -1 - v.position, v.digest, o.text FROM version_items AS v JOIN objects AS o ON o.digest = v.digest "
+                "WHERE v.version_rowid = :version_rowid "
+                "AND NOT EXISTS (SELECT 1 FROM items AS i WHERE i.agent_id = :agent_id AND i.digest = v.digest)", params
+            ).rowcount
+            connection.execute("UPDATE items SET position = -1 - position WHERE agent_id = :agent_id", params)
+            connection.execute("UPDATE agents SET generation = generation + 1 WHERE id = :agent_id", params)
+        QUERY_CACHE.invalidate(self.store.cache_key(self.agent_name))
+        print(f"Wissensbasis von Version '{version_id}' erfolgreich wiederhergestellt ({added} hinzugefügt, {removed} entfernt).")
+
+    def list_versions(self, limit: int = None, offset: int = 0, since: str = None, until: str = None,
+                      description: str = None) -> list[dict]:
+        """Listet Versionen des Agenten auf (neueste zuerst), mit denselben Filtern wie der Versionskatalog."""
+        conditions, params = version_filter_conditions(since, until, description)
+        sql = " AND ".join(["agent_id = ?"] + conditions)
+        rows = self.store.query(
+            f"SELECT id, timestamp, description FROM versions WHERE {sql} ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+            [self.agent_id] + params + [limit if limit is not None else -1, offset]
+        )
+        return [{"id": row[0], "timestamp": row[1], "description": row[2]} for row in rows]
+
+    def count_versions(self) -> int:
+        """Gibt die Anzahl der Versionen des Agenten zurück."""
+        return self.store.query("SELECT COUNT(*) FROM versions WHERE agent_id = ?", (self.agent_id,))[0][0]
+
+    def list_archived_versions(self) -> list[dict]:
+        """Das SQLite-Backend archiviert nicht (Versionen teilen sich ihre Texte ohnehin)."""
+        return []
+
+    def load_retention_policy(self) -> dict:
+        """Lädt die Aufbewahrungsregeln des Agenten ({} wenn keine festgelegt sind)."""
+        rows = self.store.query("SELECT value FROM settings WHERE agent_id = ? AND name = 'retention'", (self.agent_id,))
+        return normalize_retention_policy(json.loads(rows[0][0])) if rows else {}
+
+    def configure_retention(self, policy: dict) -> dict:
+        """Speichert Aufbewahrungsregeln; ohne Regeln wird die Einstellung entfernt."""
+        policy = normalize_retention_policy(policy)
+        if policy.get("archive"):
+            raise KnowledgeFlaskException(f"Das Archivieren von Versionen ist nur mit dem Speicher-Backend '{FileStorageBackend.name}' verfügbar.")
+        with self.store.transaction() as connection:
+            if any(rule in policy for rule in RETENTION_RULES):
+                connection.execute("INSERT OR REPLACE INTO settings (agent_id, name, value) VALUES (?, 'retention', ?)",
+                                   (self.agent_id, json.dumps(policy)))
+            else:
+                policy = {}
+                connection.execute("DELETE FROM settings WHERE agent_id = ? AND name = 'retention'", (self.agent_id,))
+        return policy
+
+    def _version_objects(self, version_id: str) -> dict[str, int]:
+        """Texte einer Version mit ihrer Größe in Bytes (für max_bytes)."""
+        rows = self.store.query(
+            "SELECT v.digest, length(CAST(o.text AS BLOB)) FROM version_items AS v JOIN objects AS o ON o.digest = v.digest "
+            "WHERE v.version_rowid = ?", (self._version_rowid(version_id),)
+        )
+        return dict(rows)
+
+    @instrumented("sqlite.version_prune")
+    def prune(self, policy: dict = None, archive: bool = None, dry_run: bool = False) -> dict:
+        """Dünnt die Versionen nach Aufbewahrungsregeln in einer Transaktion aus (wie VersionManager.prune)."""
+        policy = normalize_retention_policy(self.load_retention_policy() if policy is None else policy)
+        if archive:
+            raise KnowledgeFlaskException(f"Das Archivieren von Versionen ist nur mit dem Speicher-Backend '{FileStorageBackend.name}' verfügbar.")
+        versions = self.list_versions()
+        pruned = select_versions_to_prune(versions, policy, self._version_objects)
+        result = {"pruned": pruned, "kept": len(versions) - len(pruned), "archived": False, "removed_objects": 0}
+        if dry_run or not pruned:
+            return result
+        with self.store.transaction() as connection:
+            version_rowids = [(self._version_rowid(version["id"]),) for version in pruned]
+            connection.executemany("DELETE FROM version_items WHERE version_rowid = ?", version_rowids)
+            connection.executemany("DELETE FROM versions WHERE rowid = ?", version_rowids)
+            result["removed_objects"] = self.store.collect_garbage(connection)
+        return result
+
+    @instrumented("sqlite.version_delete")
+    def delete_version(self, version_id: str):
+        """Löscht eine Version samt Manifest und nicht mehr referenzierten Texten."""
+        version_rowid = self._version_rowid(version_id)
+        with self.store.transaction() as connection:
+            connection.execute("DELETE FROM version_items WHERE version_rowid = ?", (version_rowid,))
+            connection.execute("DELETE FROM versions WHERE rowid = ?", (version_rowid,))
+            removed = self.store.collect_garbage(connection)
+        print(f"Version '{version_id}' erfolgreich gelöscht.")
+        if removed:
+            print(f"{removed} nicht mehr referenzierte Texte entfernt.")
+
+# Registrierte Speicher-Backends; weitere können über register_storage_backend() ergänzt werden
+STORAGE_BACKENDS: dict[str, type] = {FileStorageBackend.name: FileStorageBackend, SQLiteStorageBackend.name: SQLiteStorageBackend}
+
+def register_storage_backend(backend_class: type):
+    """Registriert eine Backend-Klasse unter ihrem Namen."""
+    STORAGE_BACKENDS[backend_class.name] = backend_class
+
+def get_storage_backend(name: str, base_dir: str) -> StorageBackend:
+    """Erzeugt ein registriertes Speicher-Backend für das Basisverzeichnis."""
+    if name not in STORAGE_BACKENDS:
+        raise KnowledgeFlaskException(f"Unbekanntes Speicher-Backend '{name}'. Verfügbar: {', '.join(sorted(STORAGE_BACKENDS))}.")
+    return STORAGE_BACKENDS[name](base_dir)
+
+def detect_storage_backend(base_dir: str) -> str:
+    """Liegt eine SQLite-Datenbank im Basisverzeichnis, wird sie verwendet, sonst das Dateilayout."""
+    return SQLiteStorageBackend.name if os.path.exists(os.path.join(base_dir, SQLITE_STORE_FILE_NAME)) else DEFAULT_STORAGE_BACKEND
+
+# --- 3. Hauptanwendungsklasse ---
+
+class KnowledgeFlask:
+    """
+    Die zentrale Anwendungsklasse zur Verwaltung von Agenten,
+    deren Wissensbasen und Versionen.
+    """
+    def __init__(self, base_dir: str = KNOWLEDGE_FLASK_BASE_DIR, backend: str = None):
+        self.base_dir = os.path.abspath(base_dir)
+        self.agents_dir = os.path.join(self.base_dir, AGENTS_DIR_NAME)
+        self.storage = get_storage_backend(backend or detect_storage_backend(self.base_dir), self.base_dir)
+        
+        # Das Agentenverzeichnis wird erst von create_agent angelegt; lesende Befehle brauchen es nicht.
+
+    @staticmethod
+    def _check_agent_name(agent_name: str):
+        """
+        Lehnt Namen ab, die kein einfacher Verzeichnisname sind ('.', '..', Pfadtrenner, ...),
+        bevor daraus ein Pfad unter agents_dir wird.
+        """
+        if not isinstance(agent_name, str) or agent_name in (".", "..") or not AGENT_NAME_PATTERN.fullmatch(agent_name):
+            raise KnowledgeFlaskException(
+                f"Ungültiger Agentenname '{agent_name}': erlaubt sind Buchstaben, Ziffern, '_', '-' und '.' (außer '.' und '..')."
+            )
+
+    def _get_agent_path(self, agent_name: str) -> str:
+        """Gibt den vollständigen Pfad zu einem Agentenverzeichnis zurück."""
+        self._check_agent_name(agent_name)
+        return os.path.join(self.agents_dir, agent_name)
+
+    def _agent_exists(self, agent_name: str) -> bool:
+        """Prüft, ob ein Agent im Speicher-Backend existiert."""
+        self._check_agent_name(agent_name)
+        return self.storage.agent_exists(agent_name)
+
+    def _require_file_storage(self, feature: str):
+        """Bricht ab, wenn eine Funktion das Dateilayout voraussetzt, aber ein anderes Backend aktiv ist."""
+        if self.storage.name != FileStorageBackend.name:
+            raise KnowledgeFlaskException(
+                f"{feature} ist nur mit dem Speicher-Backend '{FileStorageBackend.name}' verfügbar (aktiv: '{self.storage.name}')."
+            )
+
+    def create_agent(self, agent_name: str, shard_config: dict = None):
+        """Erstellt einen neuen Agenten; mit shard_config ({'mode', 'shards'/'shard_size'}) gleich mit geteilter Wissensbasis."""
+        self._check_agent_name(agent_name)
+        if shard_config is not None:
+            self._require_file_storage("Das Aufteilen in Shards")
+            shard_config = normalize_shard_config(shard_config)
+        if self._agent_exists(agent_name):
+            raise AgentAlreadyExistsError(agent_name)
+        
+        try:
+            self.storage.create_agent(agent_name)
+            if shard_config is not None:
+                ShardedKnowledgeBase.reshard(self._get_agent_path(agent_name), shard_config)
+            print(f"Agent '{agent_name}' erfolgreich erstellt in '{self.storage.location(agent_name)}'.")
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Erstellen des Agenten '{agent_name}': {e}") from e
+
+    def shard_agent(self, agent_name: str, shard_config: dict, workers: int = DEFAULT_SHARD_WORKERS) -> list[int]:
+        """
+        Verteilt die Wissensbasis eines Agenten auf Shards bzw. neu auf andere Shards (Modus 'hash'
+        oder 'range'). Gibt die Anzahl der Elemente je Shard zurück.
+        """
+        self._require_file_storage("Das Aufteilen in Shards")
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        agent_path = self._get_agent_path(agent_name)
+        if NearDuplicateIndex(agent_path, load=False).load_config() is not None:
+            raise KnowledgeFlaskException(
+                f"Agent '{agent_name}' prüft Beinahe-Duplikate beim Hinzufügen; das ist mit Shards nicht möglich "
+                f"(zuerst 'knowledge dedup {agent_name} --on-ingest off')."
+            )
+
+        kb_manager = ShardedKnowledgeBase.reshard(agent_path, shard_config, workers)
+        counts = kb_manager.shard_counts()
+        print(f"Wissensbasis von Agent '{agent_name}' auf {len(counts)} Shards verteilt ({format_shard_config(kb_manager.config)}): {sum(counts)} Elemente.")
+        return counts
+
+    def get_shard_layout(self, agent_name: str) -> dict:
+        """Gibt die Shard-Konfiguration eines Agenten samt Elementen je Shard zurück ({}: nicht geteilt)."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        if self.storage.name != FileStorageBackend.name:
+            return {}
+        kb_manager = self.storage.knowledge_base(agent_name)
+        if not isinstance(kb_manager, ShardedKnowledgeBase):
+            return {}
+        return {**kb_manager.config, "counts": kb_manager.shard_counts()}
+
+    def delete_agent(self, agent_name: str):
+        """Löscht einen bestehenden Agenten und all seine Daten."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        
+        try:
+            self.storage.delete_agent(agent_name)
+            print(f"Agent '{agent_name}' und alle zugehörigen Daten wurden erfolgreich gelöscht.")
+        except OSError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Löschen des Agenten '{agent_name}': {e}") from e
+        except shutil.Error as e:
+            raise KnowledgeFlaskException(f"Fehler beim Löschen des Agentenverzeichnisses '{agent_name}': {e}") from e
+
+    @instrumented("app.list_agents")
+    def list_agents(self) -> list[str]:
+        """Listet alle vorhandenen Agenten auf."""
+        return self.storage.list_agents()
+
+    def run_fleet(self, operation: str, workers: int = DEFAULT_FLEET_WORKERS,
+                  description: str = None) -> Iterator[dict]:
+        """
+        Führt eine Flottenoperation (stats, snapshot, reindex, verify) für alle Agenten
+        in einem Prozesspool aus und liefert die Ergebnisse in der Reihenfolge ihrer
+        Fertigstellung.
+        """
+        if operation not in FLEET_OPERATIONS:
+            raise KnowledgeFlaskException(f"Unbekannte Flottenoperation '{operation}'. Erlaubt: {', '.join(FLEET_OPERATIONS)}.")
+        self._require_file_storage("Die Flottenoperation")
+        agents = self.list_agents()
+        if not agents:
+            return
+        from concurrent.futures import ProcessPoolExecutor, as_completed # Nur bei Bedarf laden
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(agents)))) as pool:
+            futures = {
+                pool.submit(run_fleet_task, operation, self._get_agent_path(agent_name), description): agent_name
+                for agent_name in agents
+            }
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e: # z.B. abgestürzter Worker-Prozess
+                    yield {"agent": futures[future], "operation": operation, "ok": False, "error": str(e)}
+
+    def add_knowledge(self, agent_name: str, knowledge_item: str):
+        """Fügt einem Agenten Wissen hinzu."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        
+        kb_manager = self.storage.knowledge_base(agent_name)
+        kb_manager.add_knowledge(knowledge_item)
+
+    def append_knowledge(self, agent_name: str, knowledge_items: Iterable[str]) -> list[str]:
+        """Fügt einem Agenten Elemente ohne Statusmeldung hinzu und gibt die tatsächlich hinzugefügten zurück."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        return self.storage.knowledge_base(agent_name).append_knowledge(knowledge_items)
+
+    def get_knowledge(self, agent_name: str) -> list[str]:
+        """Ruft die Wissensbasis eines Agenten ab."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        
+        kb_manager = self.storage.knowledge_base(agent_name)
+        return kb_manager.get_knowledge()
+
+    def add_knowledge_bulk(self, agent_name: str, knowledge_items: Iterable[str]) -> tuple[int, int]:
+        """Fügt einem Agenten viele Wissenselemente mit einem einzigen Commit hinzu."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        kb_manager = self.storage.knowledge_base(agent_name)
+        added, skipped = kb_manager.add_knowledge_bulk(knowledge_items)
+        print(f"Import für Agent '{agent_name}' abgeschlossen: {added} hinzugefügt, {skipped} Duplikate übersprungen.")
+        return added, skipped
+
+    def add_chunks(self, agent_name: str, chunks: Iterable[dict], batch_size: int = DEFAULT_CHUNK_BATCH_SIZE) -> tuple[int, int]:
+        """Fügt einem Agenten Chunks (siehe iter_source_chunks) stapelweise samt Herkunft hinzu."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        kb_manager = self.storage.knowledge_base(agent_name)
+        added, skipped = kb_manager.add_chunks(chunks, batch_size)
+        print(f"Chunking für Agent '{agent_name}' abgeschlossen: {added} Chunks hinzugefügt, {skipped} Duplikate übersprungen.")
+        return added, skipped
+
+    def get_chunk_sources(self, agent_name: str) -> dict[str, dict]:
+        """Gibt die Herkunft der importierten Chunks eines Agenten zurück (Digest -> source, start, end)."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        return self.storage.knowledge_base(agent_name).load_chunk_sources()
+
+    def query_knowledge(self, agent_name: str, query_text: str, top_k: int = DEFAULT_TOP_K,
+                        mode: str = "bm25", embedder: str = DEFAULT_EMBEDDER) -> list[dict]:
+        """Durchsucht die Wissensbasis eines Agenten (BM25 oder dicht) und liefert die besten Treffer."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        kb_manager = self.storage.knowledge_base(agent_name)
+        return kb_manager.query(query_text, top_k, mode, embedder)
+
+    def iter_knowledge(self, agent_name: str, offset: int = 0, limit: int = None) -> Iterator[str]:
+        """Streamt einen Ausschnitt der Wissensbasis eines Agenten (seitenweise Abfrage)."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        kb_manager = self.storage.knowledge_base(agent_name)
+        return kb_manager.iter_knowledge(offset, limit)
+
+    def configure_near_duplicates(self, agent_name: str, mode: str, threshold: float = DEFAULT_NEAR_DUPLICATE_THRESHOLD):
+        """Schaltet die Beinahe-Duplikat-Prüfung beim Hinzufügen für einen Agenten ein oder aus."""
+        self._require_file_storage("Die Beinahe-Duplikat-Prüfung")
+        agent_path = self._get_agent_path(agent_name)
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        if mode != "off" and load_shard_config(agent_path) is not None:
+            raise KnowledgeFlaskException(f"Die Beinahe-Duplikat-Prüfung ist für Agenten mit Shards nicht verfügbar ('{agent_name}').")
+
+        NearDuplicateIndex(agent_path, load=False).configure(mode, threshold)
+        if mode == "off":
+            print(f"Beinahe-Duplikat-Prüfung für Agent '{agent_name}' ausgeschaltet.")
+        else:
+            print(f"Beinahe-Duplikat-Prüfung für Agent '{agent_name}' eingeschaltet (Modus: {mode}, Schwellwert: {threshold}).")
+
+    def dedup_knowledge(self, agent_name: str, threshold: float = None, dry_run: bool = False) -> list[dict]:
+        """Entfernt Beinahe-Duplikate aus der Wissensbasis eines Agenten (oder listet sie bei dry_run nur auf)."""
+        self._require_file_storage("Die Beinahe-Duplikat-Bereinigung")
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        kb_manager = self.storage.knowledge_base(agent_name)
+        return kb_manager.remove_near_duplicates(threshold, dry_run)
+
+    def migrate_knowledge(self, agent_name: str, storage_format: str, codec: str = DEFAULT_BINARY_CODEC):
+        """Überführt die Wissensbasis eines Agenten in ein anderes Speicherformat (json/binary)."""
+        self._require_file_storage("Die Migration des Speicherformats")
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        kb_manager = self.storage.knowledge_base(agent_name)
+        item_count = kb_manager.migrate_format(storage_format, codec)
+        suffix = f" (Codec: {codec})" if storage_format == "binary" else ""
+        print(f"Wissensbasis für Agent '{agent_name}' ins Format '{storage_format}' migriert: {item_count} Elemente{suffix}.")
+
+    def compact_knowledge(self, agent_name: str):
+        """Faltet das Segment-Log eines Agenten in den Snapshot."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        kb_manager = self.storage.knowledge_base(agent_name)
+        if kb_manager.compact():
+            print(f"Wissensbasis für Agent '{agent_name}' kompaktiert.")
+        else:
+            print(f"Wissensbasis für Agent '{agent_name}' ist bereits kompakt.")
+
+    def create_version(self, agent_name: str, description: str = None) -> str:
+        """Erstellt eine Version der Wissensbasis eines Agenten."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        
+        version_manager = self.storage.version_manager(agent_name)
+        version_id = version_manager.create_version(description)
+        print(f"Version '{version_id}' für Agent '{agent_name}' erfolgreich erstellt.")
+        return version_id
+
+    def restore_version(self, agent_name: str, version_id: str):
+        """Stellt eine Version der Wissensbasis eines Agenten wieder her."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        
+        version_manager = self.storage.version_manager(agent_name)
+        version_manager.restore_version(version_id)
+        print(f"Version '{version_id}' für Agent '{agent_name}' erfolgreich wiederhergestellt.")
+
+    def diff_versions(self, agent_name: str, from_version_id: str, to_version_id: str) -> dict:
+        """Vergleicht zwei Versionen eines Agenten (oder eine Version mit 'live')."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        version_manager = self.storage.version_manager(agent_name)
+        return version_manager.diff(from_version_id, to_version_id)
+
+    def list_versions(self, agent_name: str, limit: int = None, offset: int = 0, since: str = None,
+                      until: str = None, description: str = None, archived: bool = False) -> list[dict]:
+        """Listet Versionen eines Agenten auf (optional seitenweise und gefiltert, bzw. die archivierten)."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        
+        version_manager = self.storage.version_manager(agent_name)
+        if archived:
+            return version_manager.list_archived_versions()
+        return version_manager.list_versions(limit, offset, since, until, description)
+
+    def get_retention_policy(self, agent_name: str) -> dict:
+        """Gibt die Aufbewahrungsregeln für die Versionen eines Agenten zurück ({}: alle behalten)."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        return self.storage.version_manager(agent_name).load_retention_policy()
+
+    def configure_retention(self, agent_name: str, policy: dict) -> dict:
+        """Legt die Aufbewahrungsregeln für die Versionen eines Agenten fest (ohne Regeln: alle behalten)."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        policy = self.storage.version_manager(agent_name).configure_retention(policy)
+        if policy:
+            print(f"Aufbewahrungsregeln für Agent '{agent_name}' gespeichert: {format_retention_policy(policy)}.")
+        else:
+            print(f"Aufbewahrungsregeln für Agent '{agent_name}' entfernt; alle Versionen bleiben erhalten.")
+        return policy
+
+    def prune_versions(self, agent_name: str, policy: dict = None, archive: bool = None, dry_run: bool = False) -> dict:
+        """Dünnt die Versionen eines Agenten nach Aufbewahrungsregeln aus (Standard: die gespeicherten)."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        version_manager = self.storage.version_manager(agent_name)
+        return version_manager.prune(policy, archive, dry_run)
+
+    def rebuild_version_catalog(self, agent_name: str) -> int:
+        """Baut den Versionskatalog eines Agenten aus dem Verzeichnisbaum neu auf."""
+        self._require_file_storage("Der Versionskatalog")
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+
+        version_manager = self.storage.version_manager(agent_name)
+        count = version_manager.rebuild_catalog()
+        print(f"Versionskatalog für Agent '{agent_name}' mit {count} Versionen neu aufgebaut.")
+        return count
+
+    def delete_version(self, agent_name: str, version_id: str):
+        """Löscht eine Version der Wissensbasis eines Agenten."""
+        if not self._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        
+        version_manager = self.storage.version_manager(agent_name)
+        version_manager.delete_version(version_id)
+        print(f"Version '{version_id}' für Agent '{agent_name}' erfolgreich gelöscht.")
+
+    def migrate_storage(self, target: str, agent_names: list[str] = None) -> list[dict]:
+        """
+        Überträgt Agenten (standardmäßig alle) samt Wissen, Chunk-Herkunft und Versionen aus dem
+        Dateilayout in die SQLite-Datenbank des Basisverzeichnisses. Bereits vorhandene Agenten
+        werden übersprungen, die Dateien bleiben unverändert erhalten.
+        """
+        if target != SQLiteStorageBackend.name:
+            raise KnowledgeFlaskException(f"Migration nur vom Dateilayout nach '{SQLiteStorageBackend.name}' möglich, nicht nach '{target}'.")
+        source = FileStorageBackend(self.base_dir)
+        destination = self.storage if isinstance(self.storage, SQLiteStorageBackend) else SQLiteStorageBackend(self.base_dir)
+        results = []
+        for agent_name in agent_names or source.list_agents():
+            self._check_agent_name(agent_name)
+            if not source.agent_exists(agent_name):
+                raise AgentNotFoundError(agent_name)
+            if destination.agent_exists(agent_name):
+                print(f"Agent '{agent_name}' ist bereits in '{destination.db_path}' vorhanden, übersprungen.")
+                continue
+            counts = destination.import_agent(agent_name, source.knowledge_base(agent_name), source.version_manager(agent_name))
+            print(f"Agent '{agent_name}' migriert: {counts['items']} Elemente, {counts['versions']} Versionen.")
+            results.append({"agent": agent_name, **counts})
+        return results
+
+# --- 3a. Servermodus (HTTP/JSON) ---
+
+class LoadedAgent:
+    """
+    Im Speicher gehaltener Zustand eines Agenten für den Servermodus: Wissensbasis
+    und invertierter Index bleiben geladen. Ändern andere Prozesse die Dateien,
+    wird der Zustand anhand von Größe und Änderungszeit neu geladen.
+    """
+    def __init__(self, agent_path: str):
+        self.agent_path = agent_path
+        self.kb_manager = KnowledgeBaseManager(agent_path)
+        self.lock = threading.RLock()
+        self.committer = GroupCommitter(self._commit)
+        self.knowledge: list[str] = []
+        self.inverted_index = None
+        self.index_dirty = False
+        self.size_bytes = 0
+        self._signature = None
+
+    def _file_signature(self) -> tuple:
+        """Inode, Größe und Änderungszeit der Dateien, aus denen die Wissensbasis besteht."""
+        return self.kb_manager.generation()
+
+    def _estimate_size(self) -> int:
+        """Schätzt den Speicherbedarf von Wissensbasis und Index in Bytes."""
+        size = sys.getsizeof(self.knowledge) + sum(sys.getsizeof(item) for item in self.knowledge)
+        if self.inverted_index is not None:
+            size += 100 * sum(len(postings) for postings in self.inverted_index.pending_postings.values())
+        return size
+
+    @instrumented("server.refresh")
+    def refresh(self):
+        """Lädt die Wissensbasis neu, falls sich die Dateien seit dem letzten Laden geändert haben."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        self.kb_manager = KnowledgeBaseManager(self.agent_path)
+        self.knowledge = self.kb_manager.get_knowledge()
+        self._close_index() # Der Index auf der Platte ist maßgeblich; ungespeicherte Stände verfallen
+        self.size_bytes = self._estimate_size()
+        self._signature = signature
+
+    def _close_index(self):
+        """Verwirft den geöffneten Index samt ungespeicherter Einträge."""
+        if self.inverted_index is not None:
+            self.inverted_index.close()
+        self.inverted_index = None
+        self.index_dirty = False
+
+    def flush(self):
+        """Speichert einen nur im Speicher nachgeführten Index, sofern die Dateien unverändert sind."""
+        with self.lock:
+            if self.index_dirty:
+                with self.kb_manager.lock.hold():
+                    if self._file_signature() == self._signature:
+                        self.inverted_index.save()
+            self.index_dirty = False
+
+    @instrumented("server.add")
+    def add(self, knowledge_items: list[str]) -> list[str]:
+        """Fügt Elemente hinzu; gleichzeitige Aufrufe werden per Group Commit zusammengefasst."""
+        return self.committer.submit(knowledge_items)
+
+    def _commit(self, knowledge_items: list[str]) -> list[str]:
+        """Schreibt gesammelte Elemente und übernimmt sie in den geladenen Zustand."""
+        with self.lock:
+            self.refresh()
+            self.flush() # append_knowledge führt den gespeicherten Index nur fort, wenn er aktuell ist
+            added = self.kb_manager.append_knowledge(knowledge_items)
+            self._close_index()
+            self.knowledge.extend(added)
+            self._signature = self._file_signature()
+            self.size_bytes = self._estimate_size()
+            return added
+
+    @instrumented("server.get")
+    def get(self, offset: int = 0, limit: int = None) -> list[str]:
+        """Gibt (einen Ausschnitt der) Wissensbasis zurück."""
+        with self.lock:
+            self.refresh()
+            return self.knowledge[offset:None if limit is None else offset + limit]
+
+    @instrumented("server.query")
+    def query(self, query_text: str, top_k: int = DEFAULT_TOP_K, mode: str = "bm25",
+              embedder: str = DEFAULT_EMBEDDER) -> list[dict]:
+        """Durchsucht die geladene Wissensbasis; der BM25-Index bleibt im Speicher."""
+        with self.lock:
+            self.refresh()
+            cache_key = query_cache_key(query_text, top_k, mode, embedder)
+            results = QUERY_CACHE.get(self.agent_path, self._signature, cache_key)
+            if results is not None:
+                return results
+            if mode == "bm25":
+                if self.inverted_index is None:
+                    self.inverted_index = InvertedIndex(self.agent_path)
+                if self.inverted_index.sync(self.knowledge, save=False):
+                    self.index_dirty = True
+                    self.size_bytes = self._estimate_size()
+                index = self.inverted_index
+            elif mode == "dense":
+                index = EmbeddingIndex(self.agent_path, get_embedder(embedder))
+                index.sync(self.knowledge)
+            else:
+                raise KnowledgeFlaskException(f"Unbekannter Suchmodus '{mode}'. Verfügbar: {', '.join(QUERY_MODES)}.")
+            results = [
+                {"position": position, "score": score, "item": self.knowledge[position]}
+                for position, score in index.search(query_text, top_k)
+            ]
+            QUERY_CACHE.put(self.agent_path, self._signature, cache_key, results)
+            return results
+
+class ShardedLoadedAgent(LoadedAgent):
+    """
+    Servermodus für Agenten mit geteilter Wissensbasis: sie wird nicht in den Speicher geladen,
+    Hinzufügen, Lesen und Suche gehen direkt an die ShardedKnowledgeBase (Suche parallel über die Shards).
+    """
+    def __init__(self, agent_path: str):
+        super().__init__(agent_path)
+        self.kb_manager = open_knowledge_base(agent_path)
+
+    def refresh(self):
+        """Nichts zu laden: jeder Zugriff liest den aktuellen Stand der Shards."""
+
+    def flush(self):
+        """Nichts zu speichern: die Indizes der Shards werden direkt geschrieben."""
+
+    def _commit(self, knowledge_items: list[str]) -> list[str]:
+        """Schreibt gesammelte Elemente in ihre Shards."""
+        with self.lock:
+            return self.kb_manager.append_knowledge(knowledge_items)
+
+    @instrumented("server.get")
+    def get(self, offset: int = 0, limit: int = None) -> list[str]:
+        """Gibt (einen Ausschnitt der) Wissensbasis zurück."""
+        return list(self.kb_manager.iter_knowledge(offset, limit))
+
+    @instrumented("server.query")
+    def query(self, query_text: str, top_k: int = DEFAULT_TOP_K, mode: str = "bm25",
+              embedder: str = DEFAULT_EMBEDDER) -> list[dict]:
+        """Scatter-Gather-Suche über die Shards (siehe ShardedKnowledgeBase.query)."""
+        return self.kb_manager.query(query_text, top_k, mode, embedder)
+
+class AgentCache:
+    """
+    LRU-Cache der im Speicher gehaltenen Agenten. Übersteigt der geschätzte
+    Speicherbedarf das Budget, werden die am längsten unbenutzten Agenten verdrängt.
+    """
+    def __init__(self, app: "KnowledgeFlask", memory_budget_bytes: int):
+        self.app = app
+        self.memory_budget_bytes = memory_budget_bytes
+        self._agents: OrderedDict[str, LoadedAgent] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, agent_name: str) -> LoadedAgent:
+        """Gibt den geladenen Zustand eines Agenten zurück (lädt ihn bei Bedarf)."""
+        with self._lock:
+            agent = self._agents.get(agent_name)
+            if agent is not None:
+                self._agents.move_to_end(agent_name)
+                self.hits += 1
+                return agent
+        if not self.app._agent_exists(agent_name):
+            raise AgentNotFoundError(agent_name)
+        with self._lock:
+            self.misses += 1
+            agent_path = self.app._get_agent_path(agent_name)
+            agent_class = LoadedAgent if load_shard_config(agent_path) is None else ShardedLoadedAgent
+            return self._agents.setdefault(agent_name, agent_class(agent_path))
+
+    def invalidate(self, agent_name: str):
+        """Entfernt einen Agenten aus dem Cache (z.B. nach dem Löschen)."""
+        with self._lock:
+            self._agents.pop(agent_name, None)
+
+    def enforce_budget(self):
+        """Verdrängt die am längsten unbenutzten Agenten, bis das Speicherbudget eingehalten ist."""
+        evicted = []
+        with self._lock:
+            total = sum(agent.size_bytes for agent in self._agents.values())
+            while total > self.memory_budget_bytes and len(self._agents) > 1:
+                _, agent = self._agents.popitem(last=False)
+                total -= agent.size_bytes
+                evicted.append(agent)
+                self.evictions += 1
+        for agent in evicted:
+            agent.flush()
+
+    def flush_all(self):
+        """Speichert alle nur im Speicher nachgeführten Indizes."""
+        with self._lock:
+            agents = list(self._agents.values())
+        for agent in agents:
+            agent.flush()
+
+    def stats(self) -> dict:
+        """Gibt Kennzahlen des Caches zurück."""
+        with self._lock:
+            return {
+                "agents": list(self._agents),
+                "memory_bytes": sum(agent.size_bytes for agent in self._agents.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+class ThreadPoolServerMixin:
+    """
+    HTTP-Server, der Anfragen in einem Thread-Pool fester Größe bearbeitet.
+    Wird erst in serve() mit http.server.HTTPServer kombiniert, damit andere Befehle
+    http.server nicht laden müssen.
+    """
+    def __init__(self, server_address, handler_class, app: "KnowledgeFlask", cache: AgentCache, workers: int):
+        from concurrent.futures import ThreadPoolExecutor
+        super().__init__(server_address, handler_class)
+        self.app = app
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        """Übergibt die Anfrage an den Thread-Pool."""
+        self.executor.submit(self._process_request_in_pool, request, client_address)
+
+    def _process_request_in_pool(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+        self.cache.flush_all()
+
+class KnowledgeFlaskHandlerMixin:
+    """
+    JSON-API des Servermodus (in serve() mit http.server.BaseHTTPRequestHandler kombiniert):
+      GET    /agents                                  Agenten auflisten
+      POST   /agents                     {"name"}     Agent erstellen
+      DELETE /agents/<agent>                          Agent löschen
+      GET    /agents/<agent>/knowledge   ?offset&limit
+      POST   /agents/<agent>/knowledge   {"item"} oder {"items": [...]}
+      GET    /agents/<agent>/query       ?q&top_k&mode&embedder
+      GET    /agents/<agent>/versions    ?limit&offset&since&until&search
+      POST   /agents/<agent>/versions    {"description"}
+      GET    /agents/<agent>/versions/<a>/diff/<b>
+      POST   /agents/<agent>/versions/<id>/restore
+      DELETE /agents/<agent>/versions/<id>
+      GET    /stats                                   Statistiken von Agenten- und Abfrage-Cache
+      GET    /metrics                    ?format=json Metriken (Prometheus-Text oder JSON)
+    """
+    server_version = "KnowledgeFlask"
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: int, text: str):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            data = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as e:
+            raise KnowledgeFlaskException(f"Ungültiger JSON-Body: {e}") from e
+        if not isinstance(data, dict):
+            raise KnowledgeFlaskException("Der JSON-Body muss ein Objekt sein.")
+        return data
+
+    def _dispatch(self, method: str):
+        import urllib.parse
+        url = urllib.parse.urlsplit(self.path)
+        parts = [urllib.parse.unquote(part) for part in url.path.strip("/").split("/") if part]
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        if parts == ["metrics"] and method == "GET" and query.get("format") != "json":
+            self._send_text(200, METRICS.to_prometheus())
+            return
+        try:
+            with METRICS.timer(f"http.{method}.{parts[0] if parts else ''}"):
+                status, payload = self._route(method, parts, query)
+        except (AgentNotFoundError, VersionNotFoundError) as e:
+            status, payload = 404, {"error": str(e)}
+        except AgentAlreadyExistsError as e:
+            status, payload = 409, {"error": str(e)}
+        except (KnowledgeFlaskException, ValueError) as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": f"Ein unerwarteter Fehler ist aufgetreten: {e}"}
+        self._send_json(status, payload)
+
+    def _route(self, method: str, parts: list[str], query: dict) -> tuple[int, object]:
+        app, cache = self.server.app, self.server.cache
+        if parts == ["stats"] and method == "GET":
+            return 200, {**cache.stats(), "query_cache": QUERY_CACHE.stats()}
+        if parts == ["metrics"] and method == "GET":
+            return 200, METRICS.snapshot()
+        if parts == ["agents"]:
+            if method == "GET":
+                return 200, app.list_agents()
+            if method == "POST":
+                name = self._read_json().get("name")
+                if not name:
+                    raise KnowledgeFlaskException("Feld 'name' fehlt.")
+                app.create_agent(name)
+                return 201, {"name": name}
+        if len(parts) < 2 or parts[0] != "agents":
+            return 404, {"error": "Unbekannter Pfad."}
+
+        agent_name, rest = parts[1], parts[2:]
+        if not rest and method == "DELETE":
+            app.delete_agent(agent_name)
+            cache.invalidate(agent_name)
+            return 200, {"deleted": agent_name}
+
+        agent = cache.get(agent_name)
+        try:
+            if rest == ["knowledge"] and method == "GET":
+                limit = query.get("limit")
+                return 200, agent.get(int(query.get("offset", 0)), int(limit) if limit is not None else None)
+            if rest == ["knowledge"] and method == "POST":
+                data = self._read_json()
+                items = data.get("items", [data["item"]] if "item" in data else [])
+                if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                    raise KnowledgeFlaskException("'items' muss eine Liste von Zeichenketten sein ('item' eine Zeichenkette).")
+                added = agent.add(items)
+                return 200, {"added": len(added), "skipped": len(items) - len(added)}
+            if rest == ["query"] and method == "GET":
+                if "q" not in query:
+                    raise KnowledgeFlaskException("Parameter 'q' fehlt.")
+                return 200, agent.query(query["q"], int(query.get("top_k", DEFAULT_TOP_K)),
+                                        query.get("mode", "bm25"), query.get("embedder", DEFAULT_EMBEDDER))
+
+            version_manager = VersionManager(agent.agent_path)
+            if rest == ["versions"] and method == "GET":
+                limit = query.get("limit")
+                return 200, version_manager.list_versions(
+                    int(limit) if limit is not None else None, int(query.get("offset", 0)),
+                    query.get("since"), query.get("until"), query.get("search"))
+            if rest == ["versions"] and method == "POST":
+                with agent.lock:
+                    return 201, {"id": version_manager.create_version(self._read_json().get("description"))}
+            if len(rest) == 4 and rest[0] == "versions" and rest[2] == "diff" and method == "GET":
+                return 200, version_manager.diff(rest[1], rest[3])
+            if len(rest) == 3 and rest[0] == "versions" and rest[2] == "restore" and method == "POST":
+                with agent.lock:
+                    version_manager.restore_version(rest[1])
+                return 200, {"restored": rest[1]}
+            if len(rest) == 2 and rest[0] == "versions" and method == "DELETE":
+                version_manager.delete_version(rest[1])
+                return 200, {"deleted": rest[1]}
+        finally:
+            cache.enforce_budget()
+        return 404, {"error": "Unbekannter Pfad."}
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+def _raise_keyboard_interrupt(signum, frame):
+    """Behandelt SIGTERM wie Strg+C, damit der Server sauber beendet wird."""
+    raise KeyboardInterrupt
+
+def serve(app: "KnowledgeFlask", host: str = DEFAULT_SERVER_HOST, port: int = DEFAULT_SERVER_PORT,
+          workers: int = DEFAULT_SERVER_WORKERS, memory_budget_mb: int = DEFAULT_SERVER_MEMORY_BUDGET_MB,
+          query_cache_mode: str = DEFAULT_QUERY_CACHE_MODE):
+    """Startet den langlaufenden Server und blockiert bis Strg+C."""
+    app._require_file_storage("Der Servermodus")
+    QUERY_CACHE.configure(query_cache_mode)
+    import http.server # Nur im Servermodus laden
+    server_class = type("ThreadPoolHTTPServer", (ThreadPoolServerMixin, http.server.HTTPServer), {})
+    handler_class = type("KnowledgeFlaskRequestHandler", (KnowledgeFlaskHandlerMixin, http.server.BaseHTTPRequestHandler), {})
+    cache = AgentCache(app, memory_budget_mb * 1024 * 1024)
+    try:
+        server = server_class((host, port), handler_class, app, cache, workers)
+    except OSError as e:
+        raise KnowledgeFlaskException(f"Server konnte nicht auf {host}:{port} gestartet werden: {e}") from e
+    print(f"KnowledgeFlask-Server läuft auf http://{host}:{port} ({workers} Worker, Budget {memory_budget_mb} MB).")
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Server wird beendet.")
+    finally:
+        server.server_close()
+
+# --- 3b. Flottenoperationen (Prozesspool) ---
+
+def _directory_size(path: str) -> int:
+    """Summiert die Dateigrößen unterhalb eines Verzeichnisses."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass # Während des Scans entfernt (z.B. .tmp-Dateien)
+    return total
+
+def run_fleet_task(operation: str, agent_path: str, description: str = None) -> dict:
+    """
+    Führt eine Flottenoperation für einen Agenten aus (läuft in einem Worker-Prozess)
+    und gibt das Ergebnis samt Elementanzahl, Speicherbedarf und Versionsanzahl zurück.
+    """
+    result = {"agent": os.path.basename(agent_path), "operation": operation, "ok": True}
+    start = time.perf_counter()
+    try:
+        # Die Flotte verteilt bereits auf Prozesse: Shards hier nacheinander bearbeiten
+        kb_manager = open_knowledge_base(agent_path, workers=1)
+        version_manager = VersionManager(agent_path, shard_workers=1)
+        if operation == "snapshot":
+            result["version_id"] = version_manager.create_version(description)
+        elif operation == "reindex":
+            kb_manager.rebuild_indexes()
+        elif operation == "verify":
+            result["problems"] = kb_manager.verify() + version_manager.verify()
+            result["ok"] = not result["problems"]
+        result["items"] = kb_manager.count_knowledge()
+        result["bytes"] = _directory_size(agent_path)
+        result["versions"] = version_manager.count_versions()
+    except KnowledgeFlaskException as e:
+        result["ok"] = False
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def format_fleet_result(result: dict) -> str:
+    """Formatiert ein Ergebnis von run_fleet_task als Textzeile."""
+    if "error" in result:
+        return f"  - {result['agent']}: FEHLER: {result['error']}"
+    line = (f"  - {result['agent']}: {result['items']} Elemente, {result['bytes'] / (1024 * 1024):.2f} MiB, "
+            f"{result['versions']} Versionen ({result['seconds']:.2f}s)")
+    if result.get("version_id"):
+        line += f", neue Version {result['version_id']}"
+    for problem in result.get("problems", []):
+        line += f"\n      ! {problem}"
+    return line
+
+# --- 3c. Benchmark-Suite ---
+
+def _synthetic_items(count: int, seed: int = 0, start: int = 0) -> Iterator[str]:
+    """Erzeugt deterministische, eindeutige Wissenselemente aus einem synthetischen Vokabular."""
+    vocabulary_rng = random.Random(seed)
+    vocabulary = [
+        "".join(vocabulary_rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(vocabulary_rng.randint(3, 10)))
+        for _ in range(BENCH_VOCABULARY_SIZE)
+    ]
+    rng = random.Random(seed * 1_000_003 + start)
+    for number in range(start, start + count):
+        words = rng.choices(vocabulary, k=rng.randint(8, 24))
+        yield f"doc-{number} " + " ".join(words)
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    """Perzentil nach dem Nearest-Rank-Verfahren."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+def _peak_rss_mb():
+    """Maximale Resident Set Size des aktuellen Prozesses in MiB (None ohne das Modul resource)."""
+    try:
+        import resource # Nur unter Unix verfügbar
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # macOS: Bytes, Linux: KiB
+
+def run_benchmark_operation(operation: str, base_dir: str, params: dict) -> dict:
+    """
+    Misst eine Operation auf dem Benchmark-Korpus in base_dir. Läuft in einem eigenen
+    Worker-Prozess, damit die Peak-RSS nur dieser Operation zugerechnet wird.
+    Vorbereitungsschritte außerhalb von timed() gehen nicht in die Messung ein.
+    """
+    latencies = []
+    item_count = 0
+    rng = random.Random(params["seed"])
+
+    def timed(function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull): # Statusmeldungen der Manager unterdrücken
+        app = KnowledgeFlask(base_dir)
+        if operation == "add_knowledge_bulk":
+            app.create_agent(BENCH_AGENT_NAME)
+        agent_path = app._get_agent_path(BENCH_AGENT_NAME)
+        kb_manager = KnowledgeBaseManager(agent_path)
+        version_manager = VersionManager(agent_path)
+        next_item = params["items"] + params["samples"] # Erste noch unbenutzte Nummer nach add_knowledge
+
+        if operation == "add_knowledge_bulk":
+            item_count = timed(kb_manager.add_knowledge_bulk, _synthetic_items(params["items"], params["seed"]))[0]
+        elif operation == "add_knowledge":
+            for item in _synthetic_items(params["samples"], params["seed"], params["items"]):
+                item_count += len(timed(kb_manager.append_knowledge, [item]))
+        elif operation == "get_knowledge":
+            for _ in range(params["repeat"]):
+                item_count += len(timed(kb_manager.get_knowledge))
+        elif operation == "iter_knowledge":
+            total = kb_manager.count_knowledge()
+            for _ in range(params["samples"]):
+                item_count += len(timed(lambda offset: list(kb_manager.iter_knowledge(offset, BENCH_PAGE_SIZE)), rng.randrange(total)))
+        elif operation == "query_bm25":
+            QUERY_CACHE.configure("off") # Gemessen wird die Suche selbst, siehe query_cached
+            total = kb_manager.count_knowledge()
+            queries = [
+                " ".join(next(kb_manager.iter_knowledge(rng.randrange(total), 1)).split()[1:3])
+                for _ in range(params["samples"])
+            ]
+            kb_manager.query(queries[0]) # Index aufbauen (nicht gemessen)
+            for query_text in queries:
+                item_count += len(timed(kb_manager.query, query_text))
+        elif operation == "query_cached":
+            query_text = " ".join(next(kb_manager.iter_knowledge(0, 1)).split()[1:3])
+            kb_manager.query(query_text) # Füllt den Cache (nicht gemessen)
+            for _ in range(params["samples"]):
+                item_count += len(timed(kb_manager.query, query_text))
+        elif operation == "create_version":
+            for number in range(params["versions"]):
+                kb_manager.append_knowledge(_synthetic_items(10, params["seed"], next_item + 10 * number))
+                timed(version_manager.create_version, f"Benchmark {number}")
+                item_count += 1
+        elif operation == "list_versions":
+            for _ in range(params["samples"]):
+                item_count += len(timed(version_manager.list_versions, 20))
+        elif operation == "restore_version":
+            version_ids = [version["id"] for version in version_manager.list_versions()]
+            for number in range(params["repeat"] if version_ids else 0):
+                timed(version_manager.restore_version, version_ids[number % len(version_ids)])
+                item_count += 1
+        elif operation == "list_agents":
+            for number in range(1, params["agents"]):
+                app.create_agent(f"{BENCH_AGENT_NAME}-{number}")
+            for _ in range(params["samples"]):
+                item_count += len(timed(app.list_agents))
+        else:
+            raise KnowledgeFlaskException(f"Unbekannte Benchmark-Operation '{operation}'.")
+
+    latencies.sort()
+    seconds = sum(latencies)
+    return {
+        "operation": operation,
+        "ops": len(latencies),
+        "items": item_count,
+        "seconds": round(seconds, 6),
+        "ops_per_second": round(len(latencies) / seconds, 2) if seconds else None,
+        "items_per_second": round(item_count / seconds, 2) if seconds else None,
+        "latency_ms": {
+            name: round(_percentile(latencies, fraction) * 1000, 3)
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def run_benchmarks(items: int = DEFAULT_BENCH_ITEMS, versions: int = DEFAULT_BENCH_VERSIONS,
+                   agents: int = DEFAULT_BENCH_AGENTS, samples: int = DEFAULT_BENCH_SAMPLES,
+                   repeat: int = DEFAULT_BENCH_REPEAT, seed: int = 0, keep: bool = False) -> dict:
+    """
+    Erzeugt ein synthetisches Korpus in einem temporären Basisverzeichnis und misst
+    alle BENCH_OPERATIONS nacheinander, jede in einem frischen Prozess.
+    Gibt Parameter, Umgebung und Ergebnisse als JSON-fähiges Dict zurück.
+    """
+    from concurrent.futures import ProcessPoolExecutor # Nur bei Bedarf laden
+    params = {"items": items, "versions": versions, "agents": agents, "samples": samples, "repeat": repeat, "seed": seed}
+    base_dir = tempfile.mkdtemp(prefix="knowledgeflask-bench-")
+    results = []
+    try:
+        for operation in BENCH_OPERATIONS:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(run_benchmark_operation, operation, base_dir, params).result()
+            results.append(result)
+            print(f"  {operation}: {result['ops']} Messungen, p50 {result['latency_ms']['p50']} ms, "
+                  f"p99 {result['latency_ms']['p99']} ms", file=sys.stderr, flush=True)
+    finally:
+        if not keep:
+            shutil.rmtree(base_dir, ignore_errors=True)
+    return {
+        "parameters": params,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": datetime.datetime.now().isoformat(),
+        },
+        "base_dir": base_dir if keep else None,
+        "results": results,
+    }
+
+def _parse_importtime(stderr: str) -> tuple[float, dict, list]:
+    """
+    Wertet die Ausgabe von python -X importtime aus: Summe der Eigenzeiten in ms,
+    kumulierte Zeiten der direkt importierten Module und Namen aller geladenen Module.
+    """
+    total_us = 0
+    top_level = {}
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        total_us += int(own)
+        name = name[1:].rstrip()
+        if not name.startswith(" "):
+            top_level[name] = int(cumulative) / 1000
+        modules.append(name.strip())
+    return total_us / 1000, top_level, modules
+
+def check_startup(budget_ms: float = STARTUP_IMPORT_BUDGET_MS, runs: int = STARTUP_CHECK_RUNS) -> dict:
+    """
+    Startet 'agent list' mehrmals mit python -X importtime in einem leeren Basisverzeichnis.
+    Die Prüfung besteht, wenn die kleinste Importzeit im Budget liegt und keines der
+    STARTUP_LAZY_MODULES geladen wurde.
+    """
+    import subprocess # Nur bei Bedarf laden
+    base_dir = tempfile.mkdtemp(prefix="knowledgeflask-startup-")
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--base-dir", base_dir, "agent", "list"]
+    import_ms, wall_ms = [], []
+    try:
+        for _ in range(max(1, runs)):
+            started = time.perf_counter()
+            completed = subprocess.run(command, capture_output=True, text=True)
+            wall_ms.append((time.perf_counter() - started) * 1000)
+            if completed.returncode != 0:
+                raise KnowledgeFlaskException(f"'agent list' ist mit Exit-Code {completed.returncode} fehlgeschlagen: "
+                                              f"{completed.stderr.strip()[-500:]}")
+            total_ms, top_level, modules = _parse_importtime(completed.stderr)
+            import_ms.append(total_ms)
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    loaded = [module for module in STARTUP_LAZY_MODULES if module in modules]
+    slowest = sorted(top_level.items(), key=lambda entry: entry[1], reverse=True)[:5]
+    return {
+        "budget_ms": budget_ms,
+        "import_ms": round(min(import_ms), 1),
+        "wall_ms": round(_percentile(sorted(wall_ms), 0.5), 1),
+        "runs": len(import_ms),
+        "slowest_imports": [{"module": name, "ms": round(ms, 1)} for name, ms in slowest],
+        "eagerly_loaded": loaded,
+        "ok": min(import_ms) <= budget_ms and not loaded,
+    }
+
+# --- 3d. Asyncio-API ---
+
+def _copy_result(result):
+    """Eigene Kopie eines geteilten Ergebnisses (Listen und darin enthaltene dicts) für jeden Aufrufer."""
+    if isinstance(result, list):
+        return [dict(entry) if isinstance(entry, dict) else entry for entry in result]
+    if isinstance(result, dict):
+        return {key: list(value) if isinstance(value, list) else value for key, value in result.items()}
+    return result
+
+class AsyncKnowledgeFlask:
+    """
+    Asyncio-Fassade für KnowledgeFlask, z.B. zum Einbetten in asynchrone Webdienste.
+    Datei- und Datenbankzugriffe laufen in einem begrenzten Thread-Pool; höchstens
+    max_pending Aufträge warten gleichzeitig darauf, weitere Aufrufer warten in der
+    Ereignisschleife. Gleichzeitige gleiche Lesezugriffe werden zu einem Ladevorgang
+    zusammengefasst (Single-Flight), gleichzeitige Schreiber eines Agenten zu einem
+    Commit (Group Commit wie im Servermodus). Eine Instanz gehört zu einer Ereignisschleife.
+    """
+    def __init__(self, base_dir: str = KNOWLEDGE_FLASK_BASE_DIR, backend: str = None,
+                 workers: int = DEFAULT_ASYNC_WORKERS, max_pending: int = DEFAULT_ASYNC_MAX_PENDING):
+        from concurrent.futures import ThreadPoolExecutor # Nur bei Bedarf laden
+        self.app = KnowledgeFlask(base_dir, backend)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="knowledgeflask")
+        self._slots = asyncio.Semaphore(max(1, max_pending))
+        self._reads: dict[tuple, "asyncio.Future"] = {}
+        self._writes: dict[str, dict] = {} # Offener Schreibstapel je Agent
+        self._agent_locks: dict[str, "asyncio.Lock"] = {}
+        # Abgeschlossene Schreibvorgänge je Agent (None: Agentenliste). Teil des Single-Flight-Schlüssels,
+        # damit ein Lesezugriff nach einem Schreibzugriff nie an einen älteren Ladevorgang gehängt wird.
+        self._epochs: Counter = Counter()
+        self.coalesced_reads = 0
+        self.commits = 0
+
+    async def __aenter__(self) -> "AsyncKnowledgeFlask":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Wartet auf laufende Aufträge und beendet den Thread-Pool."""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        if isinstance(self.app.storage, SQLiteStorageBackend):
+            self.app.storage.close()
+
+    async def _run(self, function: Callable, *args):
+        """Führt eine blockierende Funktion im Thread-Pool aus."""
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args))
+
+    def _agent_lock(self, agent_name: str) -> "asyncio.Lock":
+        """Sperre, die Schreibzugriffe auf einen Agenten in dieser Instanz ordnet."""
+        if agent_name not in self._agent_locks:
+            self._agent_locks[agent_name] = asyncio.Lock()
+        return self._agent_locks[agent_name]
+
+    async def _read(self, agent_name: str, key: tuple, function: Callable, *args):
+        """Single-Flight: Läuft der gleiche Lesezugriff bereits, wird auf dessen Ergebnis gewartet."""
+        flight_key = (agent_name, self._epochs[agent_name]) + key
+        future = self._reads.get(flight_key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(function, *args))
+            self._reads[flight_key] = future
+            future.add_done_callback(lambda _: self._reads.pop(flight_key, None))
+        else:
+            self.coalesced_reads += 1
+            METRICS.count("async_coalesced_reads")
+        # shield: bricht ein Aufrufer ab, laufen die übrigen Wartenden weiter
+        return _copy_result(await asyncio.shield(future))
+
+    async def _write(self, agent_names: tuple, function: Callable, *args):
+        """Führt einen Schreibzugriff nach allen vorher begonnenen desselben Agenten aus."""
+        batch = self._writes.get(agent_names[0])
+        if batch is not None:
+            # Der Commit des offenen Stapels wartet womöglich noch nicht auf die Sperre
+            await asyncio.shield(batch["done"])
+        async with self._agent_lock(agent_names[0]):
+            try:
+                return await self._run(function, *args)
+            finally:
+                for agent_name in agent_names:
+                    self._epochs[agent_name] += 1
+
+    async def _commit(self, agent_name: str, batch: dict):
+        """Schreibt einen gesammelten Stapel, sobald vorherige Schreibzugriffe des Agenten fertig sind."""
+        async with self._agent_lock(agent_name):
+            del self._writes[agent_name] # Wer ab jetzt schreibt, beginnt einen neuen Stapel
+            tickets = batch["tickets"]
+            try:
+                added = await self._run(self.app.append_knowledge, agent_name, [item for ticket in tickets for item in ticket["items"]])
+                GroupCommitter.assign_added(tickets, added)
+                self.commits += 1
+                METRICS.count("async_commits")
+            except Exception as e:
+                for ticket in tickets:
+                    ticket["error"] = e
+            finally:
+                self._epochs[agent_name] += 1
+                batch["done"].set_result(None)
+
+    async def add_knowledge_items(self, agent_name: str, knowledge_items: Iterable[str]) -> list[str]:
+        """
+        Fügt Elemente hinzu und gibt die eigenen tatsächlich hinzugefügten zurück. Aufrufe, die
+        eintreffen, bevor der Stapel des Agenten geschrieben wird, teilen sich einen Commit.
+        """
+        ticket = {"items": list(knowledge_items), "added": [], "error": None}
+        batch = self._writes.get(agent_name)
+        if batch is None:
+            batch = self._writes[agent_name] = {"tickets": [], "done": asyncio.get_running_loop().create_future()}
+            asyncio.ensure_future(self._commit(agent_name, batch))
+        batch["tickets"].append(ticket)
+        await asyncio.shield(batch["done"])
+        if ticket["error"] is not None:
+            raise ticket["error"]
+        return ticket["added"]
+
+    async def add_knowledge(self, agent_name: str, knowledge_item: str) -> bool:
+        """Fügt ein Wissenselement hinzu; False, wenn es bereits vorhanden war."""
+        return bool(await self.add_knowledge_items(agent_name, [knowledge_item]))
+
+    async def add_knowledge_bulk(self, agent_name: str, knowledge_items: Iterable[str]) -> tuple[int, int]:
+        """Fügt viele Elemente mit einem Commit hinzu (die Elemente werden im Thread-Pool gelesen)."""
+        return await self._write((agent_name,), self.app.add_knowledge_bulk, agent_name, knowledge_items)
+
+    def _load_knowledge(self, agent_name: str, offset: int, limit: int) -> list[str]:
+        return list(self.app.iter_knowledge(agent_name, offset, limit))
+
+    async def get_knowledge(self, agent_name: str, offset: int = 0, limit: int = None) -> list[str]:
+        """Gibt (einen Ausschnitt der) Wissensbasis zurück."""
+        return await self._read(agent_name, ("get", offset, limit), self._load_knowledge, agent_name, offset, limit)
+
+    async def query_knowledge(self, agent_name: str, query_text: str, top_k: int = DEFAULT_TOP_K,
+                              mode: str = "bm25", embedder: str = DEFAULT_EMBEDDER) -> list[dict]:
+        """Durchsucht die Wissensbasis; gleiche gleichzeitige Suchen werden nur einmal ausgeführt."""
+        key = ("query",) + query_cache_key(query_text, top_k, mode, embedder)
+        return await self._read(agent_name, key, self.app.query_knowledge, agent_name, query_text, top_k, mode, embedder)
+
+    async def list_agents(self) -> list[str]:
+        """Listet alle vorhandenen Agenten auf."""
+        return await self._read(None, ("agents",), self.app.list_agents)
+
+    async def create_agent(self, agent_name: str, shard_config: dict = None):
+        """Erstellt einen neuen Agenten (mit shard_config gleich mit geteilter Wissensbasis)."""
+        await self._write((agent_name, None), self.app.create_agent, agent_name, shard_config)
+
+    async def delete_agent(self, agent_name: str):
+        """Löscht einen Agenten und all seine Daten."""
+        await self._write((agent_name, None), self.app.delete_agent, agent_name)
+
+    async def create_version(self, agent_name: str, description: str = None) -> str:
+        """Erstellt eine Version, nachdem alle vorher begonnenen Schreibzugriffe des Agenten geschrieben sind."""
+        return await self._write((agent_name,), self.app.create_version, agent_name, description)
+
+    async def restore_version(self, agent_name: str, version_id: str):
+        """Stellt eine Version der Wissensbasis wieder her."""
+        await self._write((agent_name,), self.app.restore_version, agent_name, version_id)
+
+    async def delete_version(self, agent_name: str, version_id: str):
+        """Löscht eine Version der Wissensbasis."""
+        await self._write((agent_name,), self.app.delete_version, agent_name, version_id)
+
+    async def list_versions(self, agent_name: str, limit: int = None, offset: int = 0, since: str = None,
+                            until: str = None, description: str = None) -> list[dict]:
+        """Listet Versionen eines Agenten auf (optional seitenweise und gefiltert)."""
+        return await self._read(agent_name, ("versions", limit, offset, since, until, description),
+                                self.app.list_versions, agent_name, limit, offset, since, until, description)
+
+    async def diff_versions(self, agent_name: str, from_version_id: str, to_version_id: str) -> dict:
+        """Vergleicht zwei Versionen (oder eine Version mit 'live')."""
+        return await self._read(agent_name, ("diff", from_version_id, to_version_id),
+                                self.app.diff_versions, agent_name, from_version_id, to_version_id)
+
+    def stats(self) -> dict:
+        """Gibt Kennzahlen der Fassade zurück."""
+        return {
+            "pending_reads": len(self._reads),
+            "pending_write_batches": len(self._writes),
+            "coalesced_reads": self.coalesced_reads,
+            "commits": self.commits,
+        }
+
+# --- 4. CLI Interface (argparse) ---
+
+def run_fleet_command(kf_app: KnowledgeFlask, operation: str, workers: int, output_format: str,
+                      description: str = None):
+    """Gibt die Ergebnisse einer Flottenoperation aus, sobald sie fertig sind; Exit-Code 1 bei Fehlern."""
+    kf_app._require_file_storage("Die Flottenoperation")
+    total = failed = 0
+    if output_format == "text":
+        print(f"Flottenoperation '{operation}' mit {workers} Worker-Prozessen:", flush=True)
+    for result in kf_app.run_fleet(operation, workers, description):
+        total += 1
+        failed += not result["ok"]
+        if output_format == "jsonl":
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+        else:
+            print(format_fleet_result(result), flush=True)
+    if output_format == "text":
+        print(f"{total} Agenten verarbeitet, {failed} mit Fehlern.")
+    if failed:
+        sys.exit(1)
+
+def report_metrics(args: argparse.Namespace, profiler=None):
+    """Gibt die nach --profile, --cprofile und --metrics-file gewünschten Auswertungen aus."""
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+        print(f"cProfile-Daten nach '{args.cprofile}' geschrieben.", file=sys.stderr)
+    if args.profile:
+        print(METRICS.format_breakdown(), file=sys.stderr)
+    if args.metrics_file:
+        try:
+            METRICS.write(args.metrics_file)
+        except KnowledgeFlaskException as e:
+            print(f"Fehler: {e}", file=sys.stderr)
+
+def _add_shard_arguments(parser: argparse.ArgumentParser):
+    """Gemeinsame Argumente von 'agent create' und 'agent shard'."""
+    parser.add_argument("--shards", type=int, help="Wissensbasis nach Digest auf N Shards verteilen (Modus 'hash').")
+    parser.add_argument("--shard-mode", choices=SHARD_MODES, help=f"Verteilung auf die Shards (Standard: {DEFAULT_SHARD_MODE}; 'range' füllt die Shards der Reihe nach).")
+    parser.add_argument("--shard-size", type=int, help=f"Elemente je Shard im Modus 'range' (Standard: {DEFAULT_SHARD_SIZE}).")
+
+def _shard_config_from_args(args: argparse.Namespace) -> dict:
+    """Shard-Konfiguration aus den Argumenten (None, wenn keines angegeben wurde)."""
+    if args.shards is None and args.shard_mode is None and args.shard_size is None:
+        return None
+    mode = args.shard_mode or ("range" if args.shard_size is not None and args.shards is None else DEFAULT_SHARD_MODE)
+    return {"mode": mode, "shards": args.shards, "shard_size": args.shard_size}
+
+def _add_agent_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'agent' (create, delete, list, shard)."""
+    agent_parser = subparsers.add_parser("agent", help="Verwalte Agenten.")
+    if not full:
+        return agent_parser
+
+    agent_subparsers = agent_parser.add_subparsers(dest="agent_command", help="Agenten-Operationen")
+
+    # agent create
+    agent_create_parser = agent_subparsers.add_parser("create", help="Erstelle einen neuen Agenten.")
+    agent_create_parser.add_argument("name", help="Der Name des Agenten.")
+    _add_shard_arguments(agent_create_parser)
+
+    # agent delete
+    agent_delete_parser = agent_subparsers.add_parser("delete", help="Lösche einen Agenten.")
+    agent_delete_parser.add_argument("name", help="Der Name des zu löschenden Agenten.")
+
+    # agent list
+    agent_list_parser = agent_subparsers.add_parser("list", help="Liste alle Agenten auf.")
+    agent_list_parser.add_argument("--stats", action="store_true", help="Elementanzahl, Speicherbedarf und Versionen je Agent anzeigen (parallel).")
+    agent_list_parser.add_argument("--workers", type=int, default=DEFAULT_FLEET_WORKERS, help=f"Anzahl Worker-Prozesse für --stats (Standard: {DEFAULT_FLEET_WORKERS}).")
+    agent_list_parser.add_argument("--format", choices=GET_FORMATS, default="text", help="Ausgabeformat für --stats (Standard: text).")
+
+    # agent shard
+    agent_shard_parser = agent_subparsers.add_parser("shard", help="Verteile die Wissensbasis eines Agenten auf Shards (ohne Optionen: Aufteilung anzeigen).")
+    agent_shard_parser.add_argument("name", help="Der Name des Agenten.")
+    _add_shard_arguments(agent_shard_parser)
+    agent_shard_parser.add_argument("--workers", type=int, default=DEFAULT_SHARD_WORKERS, help=f"Anzahl Worker-Prozesse (Standard: {DEFAULT_SHARD_WORKERS}).")
+    return agent_parser
+
+def _add_fleet_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'fleet' (Wartung aller Agenten im Prozesspool)."""
+    fleet_parser = subparsers.add_parser("fleet", help="Führe Wartungsoperationen parallel für alle Agenten aus.")
+    if not full:
+        return fleet_parser
+
+    fleet_parser.add_argument("operation", choices=FLEET_OPERATIONS, help="stats, snapshot (Version je Agent), reindex (Indizes neu aufbauen) oder verify.")
+    fleet_parser.add_argument("--workers", type=int, default=DEFAULT_FLEET_WORKERS, help=f"Anzahl Worker-Prozesse (Standard: {DEFAULT_FLEET_WORKERS}).")
+    fleet_parser.add_argument("--format", choices=GET_FORMATS, default="text", help="Ausgabeformat: text oder jsonl (ein Ergebnis pro Zeile).")
+    fleet_parser.add_argument("-d", "--description", help="Beschreibung der Versionen bei 'snapshot'.")
+    return fleet_parser
+
+def _add_knowledge_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'knowledge' (add, get, query, import, chunk, dedup, migrate, compact)."""
+    knowledge_parser = subparsers.add_parser("knowledge", help="Verwalte die Wissensbasis eines Agenten.")
+    if not full:
+        return knowledge_parser
+
+    knowledge_subparsers = knowledge_parser.add_subparsers(dest="knowledge_command", help="Wissensbasis-Operationen")
+
+    # knowledge add
+    knowledge_add_parser = knowledge_subparsers.add_parser("add", help="Füge Wissen zu einem Agenten hinzu.")
+    knowledge_add_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    knowledge_add_parser.add_argument("item", help="Das hinzuzufügende Wissenselement (Text).")
+
+    # knowledge get
+    knowledge_get_parser = knowledge_subparsers.add_parser("get", help="Zeige die Wissensbasis eines Agenten an.")
+    knowledge_get_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    knowledge_get_parser.add_argument("--offset", type=int, default=0, help="Anzahl zu überspringender Elemente (Standard: 0).")
+    knowledge_get_parser.add_argument("--limit", type=int, help="Maximale Anzahl ausgegebener Elemente.")
+    knowledge_get_parser.add_argument(
+        "--format", choices=GET_FORMATS, default="text",
+        help="Ausgabeformat: text (nummerierte Liste, Standard) oder jsonl (ein JSON-String pro Zeile)."
+    )
+    knowledge_get_parser.add_argument("--with-sources", action="store_true", help="Herkunft (Datei und Zeichen-Offsets) von Chunks mit ausgeben; jsonl liefert dann Objekte.")
+
+    # knowledge query
+    knowledge_query_parser = knowledge_subparsers.add_parser("query", help="Durchsuche die Wissensbasis eines Agenten (BM25 oder semantisch).")
+    knowledge_query_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    knowledge_query_parser.add_argument("text", help="Der Suchtext.")
+    knowledge_query_parser.add_argument("-k", "--top-k", type=int, default=DEFAULT_TOP_K, help=f"Anzahl der Treffer (Standard: {DEFAULT_TOP_K}).")
+    knowledge_query_parser.add_argument("-m", "--mode", choices=QUERY_MODES, default="bm25", help="Suchmodus: bm25 (Standard) oder dense (Embeddings, benötigt NumPy).")
+    knowledge_query_parser.add_argument("--embedder", default=DEFAULT_EMBEDDER, help=f"Embedder für --mode dense (Standard: {DEFAULT_EMBEDDER}).")
+    knowledge_query_parser.add_argument(
+        "--cache", choices=QUERY_CACHE_MODES, default=DEFAULT_QUERY_CACHE_MODE,
+        help="Abfrage-Cache: off, memory (hilft z.B. in 'batch') oder disk (query_cache.sqlite, bleibt zwischen Aufrufen erhalten)."
+    )
+
+    # knowledge import
+    knowledge_import_parser = knowledge_subparsers.add_parser("import", help="Importiere viele Wissenselemente aus Dateien, Verzeichnissen oder stdin.")
+    knowledge_import_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    knowledge_import_parser.add_argument("sources", nargs="*", help="Dateien oder Verzeichnisse ('-' oder leer für stdin).")
+    knowledge_import_parser.add_argument(
+        "-f", "--format",
+        choices=IMPORT_FORMATS,
+        default="auto",
+        help="Eingabeformat: jsonl, text (ein Element pro Zeile), dir (eine Datei pro Element)\noder auto (Standard: anhand der Dateiendung)."
+    )
+
+    # knowledge chunk
+    knowledge_chunk_parser = knowledge_subparsers.add_parser("chunk", help="Zerlege große Text-/Markdown-Dateien in Chunks und füge sie hinzu.")
+    knowledge_chunk_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    knowledge_chunk_parser.add_argument("sources", nargs="*", help="Dateien oder Verzeichnisse ('-' oder leer für stdin).")
+    knowledge_chunk_parser.add_argument(
+        "-s", "--strategy", choices=CHUNK_STRATEGIES, default=DEFAULT_CHUNK_STRATEGY,
+        help=f"fixed (feste Größe an Wortgrenzen), sentence (ganze Sätze) oder heading (Markdown-Abschnitte)\n(Standard: {DEFAULT_CHUNK_STRATEGY})."
+    )
+    knowledge_chunk_parser.add_argument("--size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"Maximale Zeichen je Chunk (Standard: {DEFAULT_CHUNK_SIZE}).")
+    knowledge_chunk_parser.add_argument("--overlap", type=int, default=DEFAULT_CHUNK_OVERLAP, help=f"Zeichen, die sich aufeinanderfolgende Chunks höchstens teilen (Standard: {DEFAULT_CHUNK_OVERLAP}).")
+    knowledge_chunk_parser.add_argument("--batch-size", type=int, default=DEFAULT_CHUNK_BATCH_SIZE, help=f"Chunks je Schreibvorgang (Standard: {DEFAULT_CHUNK_BATCH_SIZE}).")
+    knowledge_chunk_parser.add_argument("--dry-run", action="store_true", help="Chunks nur als JSONL (mit Offsets) ausgeben, nichts speichern.")
+
+    # knowledge dedup
+    knowledge_dedup_parser = knowledge_subparsers.add_parser("dedup", help="Entferne Beinahe-Duplikate bzw. konfiguriere die Prüfung beim Hinzufügen.")
+    knowledge_dedup_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    knowledge_dedup_parser.add_argument("--threshold", type=float, help=f"Jaccard-Schwellwert zwischen 0 und 1 (Standard: {DEFAULT_NEAR_DUPLICATE_THRESHOLD} bzw. der konfigurierte Wert).")
+    knowledge_dedup_parser.add_argument("--dry-run", action="store_true", help="Duplikate nur auflisten, nicht entfernen.")
+    knowledge_dedup_parser.add_argument(
+        "--on-ingest", choices=NEAR_DUPLICATE_MODES,
+        help="Statt zu bereinigen: Prüfung beim Hinzufügen konfigurieren (off, flag = nur melden, skip = überspringen)."
+    )
+
+    # knowledge migrate
+    knowledge_migrate_parser = knowledge_subparsers.add_parser("migrate", help="Überführe die Wissensbasis in ein anderes Speicherformat.")
+    knowledge_migrate_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    knowledge_migrate_parser.add_argument("--to", dest="storage_format", choices=STORAGE_FORMATS, required=True, help="Zielformat: json (knowledge.json) oder binary (knowledge.bin).")
+    knowledge_migrate_parser.add_argument(
+        "--codec", choices=BINARY_CODECS, default=DEFAULT_BINARY_CODEC,
+        help=f"Kompression der Blöcke im Binärformat (Standard: {DEFAULT_BINARY_CODEC}; zstd benötigt das Paket zstandard)."
+    )
+
+    # knowledge compact
+    knowledge_compact_parser = knowledge_subparsers.add_parser("compact", help="Falte das Segment-Log in den Snapshot (knowledge.json).")
+    knowledge_compact_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    return knowledge_parser
+
+def _add_serve_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'serve' (HTTP/JSON-Server)."""
+    serve_parser = subparsers.add_parser("serve", help="Starte den langlaufenden HTTP/JSON-Server.")
+    if not full:
+        return serve_parser
+
+    serve_parser.add_argument("--host", default=DEFAULT_SERVER_HOST, help=f"Adresse (Standard: {DEFAULT_SERVER_HOST}).")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_SERVER_PORT, help=f"Port (Standard: {DEFAULT_SERVER_PORT}).")
+    serve_parser.add_argument("--workers", type=int, default=DEFAULT_SERVER_WORKERS, help=f"Größe des Thread-Pools (Standard: {DEFAULT_SERVER_WORKERS}).")
+    serve_parser.add_argument(
+        "--memory-budget", type=int, default=DEFAULT_SERVER_MEMORY_BUDGET_MB,
+        help=f"Speicherbudget für geladene Agenten in MB (Standard: {DEFAULT_SERVER_MEMORY_BUDGET_MB})."
+    )
+    serve_parser.add_argument(
+        "--query-cache", choices=QUERY_CACHE_MODES, default=DEFAULT_QUERY_CACHE_MODE,
+        help=f"Abfrage-Cache: off, memory (LRU) oder disk (zusätzlich query_cache.sqlite je Agent) (Standard: {DEFAULT_QUERY_CACHE_MODE})."
+    )
+    return serve_parser
+
+def _add_bench_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'bench' (Benchmark-Suite)."""
+    bench_parser = subparsers.add_parser("bench", help="Miss Durchsatz, Latenzen und Speicherbedarf auf einem synthetischen Korpus.")
+    if not full:
+        return bench_parser
+
+    bench_parser.add_argument("--items", type=int, default=DEFAULT_BENCH_ITEMS, help=f"Größe des Korpus (Standard: {DEFAULT_BENCH_ITEMS}).")
+    bench_parser.add_argument("--versions", type=int, default=DEFAULT_BENCH_VERSIONS, help=f"Anzahl zu erstellender Versionen (Standard: {DEFAULT_BENCH_VERSIONS}).")
+    bench_parser.add_argument("--agents", type=int, default=DEFAULT_BENCH_AGENTS, help=f"Anzahl Agenten für list_agents (Standard: {DEFAULT_BENCH_AGENTS}).")
+    bench_parser.add_argument("--samples", type=int, default=DEFAULT_BENCH_SAMPLES, help=f"Messungen je kurzer Operation (Standard: {DEFAULT_BENCH_SAMPLES}).")
+    bench_parser.add_argument("--repeat", type=int, default=DEFAULT_BENCH_REPEAT, help=f"Messungen je Operation über die ganze Wissensbasis (Standard: {DEFAULT_BENCH_REPEAT}).")
+    bench_parser.add_argument("--seed", type=int, default=0, help="Startwert für das synthetische Korpus (Standard: 0).")
+    bench_parser.add_argument("-o", "--output", help="Ergebnisse als JSON in diese Datei schreiben (Standard: stdout).")
+    bench_parser.add_argument("--keep", action="store_true", help="Temporäres Basisverzeichnis nach dem Lauf behalten.")
+    return bench_parser
+
+def parse_byte_size(text: str) -> int:
+    """Argumenttyp für Größenangaben in Bytes, optional mit Einheit K, M oder G (Basis 1024)."""
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?)i?B?\s*", text, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Ungültige Größe '{text}' (z.B. 500M oder 2G).")
+    return int(match.group(1)) * 1024 ** " KMG".index(match.group(2).upper() or " ")
+
+def _add_retention_arguments(parser: argparse.ArgumentParser):
+    """Gemeinsame Argumente von 'version retention' und 'version prune'."""
+    parser.add_argument("--keep-last", type=int, help="Die N neuesten Versionen behalten.")
+    parser.add_argument("--keep-daily", type=int, help="Für die N jüngsten Tage mit Versionen jeweils die neueste behalten.")
+    parser.add_argument("--keep-weekly", type=int, help="Für die N jüngsten Wochen mit Versionen jeweils die neueste behalten.")
+    parser.add_argument("--max-bytes", type=parse_byte_size, help="Platzbedarf der behaltenen Versionen begrenzen (z.B. 500M); die ältesten werden verworfen.")
+    parser.add_argument("--archive", action="store_true", help=f"Verworfene Versionen in {VERSION_ARCHIVE_FILE_NAME} archivieren statt zu löschen.")
+
+def _retention_policy_from_args(args: argparse.Namespace) -> dict:
+    """Aufbewahrungsregeln aus den Argumenten (leer, wenn keine Regel angegeben wurde)."""
+    return {rule: getattr(args, rule) for rule in RETENTION_RULES if getattr(args, rule) is not None}
+
+def _add_version_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'version' (create, restore, list, diff, rebuild-catalog, delete, retention, prune)."""
+    version_parser = subparsers.add_parser("version", help="Verwalte Versionen der Wissensbasis eines Agenten.")
+    if not full:
+        return version_parser
+
+    version_subparsers = version_parser.add_subparsers(dest="version_command", help="Versionierungs-Operationen")
+
+    # version create
+    version_create_parser = version_subparsers.add_parser("create", help="Erstelle eine neue Version der Wissensbasis.")
+    version_create_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    version_create_parser.add_argument("-d", "--description", help="Eine Beschreibung für diese Version (optional).")
+
+    # version restore
+    version_restore_parser = version_subparsers.add_parser("restore", help="Stelle eine Version der Wissensbasis wieder her.")
+    version_restore_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    version_restore_parser.add_argument("version_id", help="Die ID der wiederherzustellenden Version.")
+
+    # version list
+    version_list_parser = version_subparsers.add_parser("list", help="Liste alle Versionen eines Agenten auf.")
+    version_list_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    version_list_parser.add_argument("--limit", type=int, help="Maximale Anzahl angezeigter Versionen.")
+    version_list_parser.add_argument("--offset", type=int, default=0, help="Anzahl zu überspringender Versionen (Standard: 0).")
+    version_list_parser.add_argument("--since", help="Nur Versionen ab diesem ISO-Zeitstempel (inklusive).")
+    version_list_parser.add_argument("--until", help="Nur Versionen vor diesem ISO-Zeitstempel (exklusive).")
+    version_list_parser.add_argument("--search", help="Nur Versionen, deren Beschreibung diesen Text enthält.")
+    version_list_parser.add_argument("--archived", action="store_true", help="Stattdessen die archivierten Versionen auflisten.")
+
+    # version diff
+    version_diff_parser = version_subparsers.add_parser("diff", help="Vergleiche zwei Versionen (oder eine Version mit 'live').")
+    version_diff_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    version_diff_parser.add_argument("from_version", help=f"Die Ausgangsversion ('{LIVE_VERSION_ID}' für die aktuelle Wissensbasis).")
+    version_diff_parser.add_argument("to_version", help=f"Die Zielversion ('{LIVE_VERSION_ID}' für die aktuelle Wissensbasis).")
+    version_diff_parser.add_argument("--stat", action="store_true", help="Nur die Anzahl der Änderungen anzeigen.")
+
+    # version rebuild-catalog
+    version_rebuild_parser = version_subparsers.add_parser("rebuild-catalog", help="Baue den Versionskatalog aus dem Verzeichnisbaum neu auf.")
+    version_rebuild_parser.add_argument("agent_name", help="Der Name des Agenten.")
+
+    # version delete
+    version_delete_parser = version_subparsers.add_parser("delete", help="Lösche eine Version der Wissensbasis.")
+    version_delete_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    version_delete_parser.add_argument("version_id", help="Die ID der zu löschenden Version.")
+
+    # version retention
+    version_retention_parser = version_subparsers.add_parser("retention", help="Zeige oder setze die Aufbewahrungsregeln für Versionen.")
+    version_retention_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    _add_retention_arguments(version_retention_parser)
+    version_retention_parser.add_argument("--auto", action="store_true", help="Nach jedem 'version create' automatisch ausdünnen.")
+    version_retention_parser.add_argument("--clear", action="store_true", help="Regeln entfernen (alle Versionen behalten).")
+
+    # version prune
+    version_prune_parser = version_subparsers.add_parser("prune", help="Dünne Versionen nach Aufbewahrungsregeln aus (Standard: die gespeicherten).")
+    version_prune_parser.add_argument("agent_name", help="Der Name des Agenten.")
+    _add_retention_arguments(version_prune_parser)
+    version_prune_parser.add_argument("--dry-run", action="store_true", help="Zu entfernende Versionen nur auflisten.")
+    return version_parser
+
+def _add_storage_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'storage' (migrate)."""
+    storage_parser = subparsers.add_parser("storage", help="Verwalte das Speicher-Backend (Dateilayout oder SQLite).")
+    if not full:
+        return storage_parser
+
+    storage_subparsers = storage_parser.add_subparsers(dest="storage_command", help="Speicher-Operationen")
+
+    # storage migrate
+    storage_migrate_parser = storage_subparsers.add_parser("migrate", help="Übertrage Agenten aus dem Dateilayout in die SQLite-Datenbank.")
+    storage_migrate_parser.add_argument("--to", dest="backend", choices=[SQLiteStorageBackend.name], required=True, help=f"Ziel-Backend ({SQLiteStorageBackend.name}: {SQLITE_STORE_FILE_NAME} im Basisverzeichnis).")
+    storage_migrate_parser.add_argument("--agent", action="append", dest="agents", help="Nur diesen Agenten migrieren (mehrfach angebbar; Standard: alle).")
+    return storage_parser
+
+def _add_batch_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'batch' (mehrere Befehle in einem Aufruf)."""
+    batch_parser = subparsers.add_parser("batch", help="Führe Befehle zeilenweise aus einer Datei oder stdin in einem Prozess aus.")
+    if not full:
+        return batch_parser
+
+    batch_parser.add_argument("source", nargs="?", default="-", help="Datei mit einem Befehl pro Zeile ('-' oder leer für stdin).")
+    batch_parser.add_argument("--stop-on-error", action="store_true", help="Nach dem ersten fehlgeschlagenen Befehl abbrechen.")
+    return batch_parser
+
+def _add_startup_check_parser(subparsers, full: bool = True) -> argparse.ArgumentParser:
+    """Befehl 'startup-check' (Startzeit-Budget)."""
+    startup_check_parser = subparsers.add_parser("startup-check", help="Prüfe die Startzeit von 'agent list' gegen das Budget (python -X importtime).")
+    if not full:
+        return startup_check_parser
+
+    startup_check_parser.add_argument("--budget-ms", type=float, default=STARTUP_IMPORT_BUDGET_MS, help=f"Budget für die Importzeit in ms (Standard: {STARTUP_IMPORT_BUDGET_MS}).")
+    startup_check_parser.add_argument("--runs", type=int, default=STARTUP_CHECK_RUNS, help=f"Anzahl der Messläufe (Standard: {STARTUP_CHECK_RUNS}).")
+    return startup_check_parser
+
+# Reihenfolge wie in der Hilfe; vollständig aufgebaut wird nur der aufgerufene Befehl
+CLI_PARSER_BUILDERS = {
+    "agent": _add_agent_parser,
+    "fleet": _add_fleet_parser,
+    "knowledge": _add_knowledge_parser,
+    "serve": _add_serve_parser,
+    "bench": _add_bench_parser,
+    "version": _add_version_parser,
+    "storage": _add_storage_parser,
+    "batch": _add_batch_parser,
+    "startup-check": _add_startup_check_parser,
+}
+CLI_GLOBAL_OPTIONS_WITH_VALUE = ("--base-dir", "--backend", "--cprofile", "--metrics-file")
+
+def _requested_command(argv: list[str]) -> str:
+    """Liefert den Befehlsnamen hinter den globalen Optionen (oder None), ohne den ganzen Parser zu bauen."""
+    skip_value = False
+    for arg in argv:
+        if skip_value:
+            skip_value = False
+        elif arg in CLI_GLOBAL_OPTIONS_WITH_VALUE:
+            skip_value = True
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+def build_parser(command: str = None, global_options: bool = True) -> tuple[argparse.ArgumentParser, dict]:
+    """
+    Baut den Argumentparser. Nur der angegebene Befehl erhält seine Unterbefehle und Argumente,
+    alle anderen erscheinen lediglich mit Name und Hilfetext. Gibt den Parser und die
+    Parser der Befehle (für deren Hilfe) zurück.
+    """
+    parser = argparse.ArgumentParser(
+        description="KnowledgeFlask CLI: Verwalte KI-Agenten, Wissensbasen und Versionen.",
+        formatter_class=argparse.RawTextHelpFormatter # Behält Formatierung in Hilfetexten bei
+    )
+    
+    if global_options:
+        # Globales Argument für das Basisverzeichnis (optional)
+        parser.add_argument(
+            "--base-dir", 
+            default=KNOWLEDGE_FLASK_BASE_DIR, 
+            help=f"Basisverzeichnis für KnowledgeFlask-Daten (Standard: {KNOWLEDGE_FLASK_BASE_DIR})"
+        )
+
+        parser.add_argument(
+            "--backend", choices=sorted(STORAGE_BACKENDS),
+            help=f"Speicher-Backend (Standard: {SQLiteStorageBackend.name}, falls {SQLITE_STORE_FILE_NAME} im Basisverzeichnis liegt, sonst {DEFAULT_STORAGE_BACKEND})."
+        )
+        parser.add_argument("--profile", action="store_true", help="Nach dem Befehl Zeiten und Zähler der Operationen auf stderr ausgeben.")
+        parser.add_argument("--cprofile", metavar="DATEI", help="cProfile-Daten des Befehls in DATEI schreiben (auswerten mit python -m pstats).")
+        parser.add_argument("--metrics-file", metavar="DATEI", help="Metriken nach dem Befehl in DATEI schreiben (JSON bei Endung .json, sonst Prometheus-Text).")
+
+    subparsers = parser.add_subparsers(dest="command", help="Verfügbare Befehle")
+    command_parsers = {name: add_parser(subparsers, name == command) for name, add_parser in CLI_PARSER_BUILDERS.items()}
+    return parser, command_parsers
+
+def _cli_operation(args: argparse.Namespace) -> str:
+    """Name der Metrik für einen CLI-Befehl, z.B. 'cli.knowledge.add'."""
+    subcommand = getattr(args, f"{args.command}_command", None)
+    return "cli." + ".".join(part for part in (args.command, subcommand) if part)
+
+def _run_batch_line(kf_app: KnowledgeFlask, argv: list[str], parsers: dict) -> str:
+    """Führt eine Zeile von 'batch' aus; gibt eine Fehlermeldung oder None zurück."""
+    command = _requested_command(argv)
+    if command not in parsers:
+        parsers[command] = build_parser(command, global_options=False)
+    parser, command_parsers = parsers[command]
+    started = time.perf_counter()
+    args = None
+    try:
+        args = parser.parse_args(argv)
+        if args.command in (None, "batch"):
+            return "Kein ausführbarer Befehl (verschachteltes 'batch' ist nicht erlaubt)."
+        run_command(kf_app, args, command_parsers)
+    except SystemExit as e: # argparse-Fehler oder Befehl mit Exit-Code
+        return f"Beendet mit Exit-Code {e.code}." if e.code else None
+    except KnowledgeFlaskException as e:
+        return str(e)
+    except Exception as e:
+        return f"Ein unerwarteter Fehler ist aufgetreten: {e}"
+    finally:
+        if args is not None and args.command:
+            METRICS.record(_cli_operation(args), time.perf_counter() - started)
+    return None
+
+def run_batch(kf_app: KnowledgeFlask, lines: Iterable[str], stop_on_error: bool = False) -> int:
+    """
+    Führt CLI-Befehle (ohne globale Optionen) zeilenweise mit einer gemeinsamen
+    KnowledgeFlask-Instanz aus; leere Zeilen und #-Kommentare werden übersprungen.
+    Fehler einer Zeile werden gemeldet, ohne die übrigen abzubrechen.
+    Gibt die Anzahl fehlgeschlagener Befehle zurück.
+    """
+    import shlex # Nur bei Bedarf laden
+    parsers = {}
+    executed = failed = 0
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            argv = shlex.split(line, comments=True)
+        except ValueError as e:
+            argv, error = None, str(e)
+        if argv == []:
+            continue
+        executed += 1
+        if argv is not None:
+            error = _run_batch_line(kf_app, argv, parsers)
+        if error:
+            print(f"Fehler in Zeile {line_number}: {error}", file=sys.stderr)
+            failed += 1
+            if stop_on_error:
+                break
+    print(f"{executed} Befehle ausgeführt, {failed} fehlgeschlagen.", file=sys.stderr)
+    return failed
+
+def run_command(kf_app: KnowledgeFlask, args: argparse.Namespace, command_parsers: dict):
+    """Führt einen geparsten CLI-Befehl aus."""
+    if args.command == "agent":
+        if args.agent_command == "create":
+            kf_app.create_agent(args.name, _shard_config_from_args(args))
+        elif args.agent_command == "delete":
+            kf_app.delete_agent(args.name)
+        elif args.agent_command == "shard" and _shard_config_from_args(args) is not None:
+            kf_app.shard_agent(args.name, _shard_config_from_args(args), args.workers)
+        elif args.agent_command == "shard":
+            layout = kf_app.get_shard_layout(args.name)
+            if not layout:
+                print(f"Die Wissensbasis von Agent '{args.name}' ist nicht geteilt.")
+            else:
+                print(f"Shards von Agent '{args.name}' ({format_shard_config(layout)}):")
+                for index, count in enumerate(layout["counts"]):
+                    print(f"  - {index:03d}: {count} Elemente")
+        elif args.agent_command == "list" and args.stats:
+            run_fleet_command(kf_app, "stats", args.workers, args.format)
+        elif args.agent_command == "list":
+            agents = kf_app.list_agents()
+            if agents:
+                print("Verfügbare Agenten:")
+                for agent in agents:
+                    print(f"  - {agent}")
+            else:
+                print("Keine Agenten gefunden.")
+        else:
+            command_parsers["agent"].print_help()
+            sys.exit(1)
+
+    elif args.command == "fleet":
+        run_fleet_command(kf_app, args.operation, args.workers, args.format, args.description)
+
+    elif args.command == "knowledge":
+        if args.knowledge_command == "add":
+            kf_app.add_knowledge(args.agent_name, args.item)
+        elif args.knowledge_command == "get":
+            sources = kf_app.get_chunk_sources(args.agent_name) if args.with_sources else None
+            knowledge = kf_app.iter_knowledge(args.agent_name, args.offset, args.limit)
+            if args.format == "jsonl":
+                for item in knowledge:
+                    if sources is not None:
+                        item = {"text": item, **sources.get(item_digest(item), {})}
+                    print(json.dumps(item, ensure_ascii=False))
+            else:
+                empty = True
+                for i, item in enumerate(knowledge, start=args.offset):
+                    if empty:
+                        print(f"Wissensbasis für Agent '{args.agent_name}':")
+                        empty = False
+                    source = sources.get(item_digest(item)) if sources else None
+                    origin = f" [{source['source']}:{source['start']}-{source['end']}]" if source else ""
+                    print(f"  {i+1}. {item}{origin}")
+                if empty:
+                    print(f"Wissensbasis für Agent '{args.agent_name}' ist leer.")
+        elif args.knowledge_command == "query":
+            QUERY_CACHE.configure(args.cache)
+            results = kf_app.query_knowledge(args.agent_name, args.text, args.top_k, args.mode, args.embedder)
+            if results:
+                print(f"Treffer für '{args.text}' (Agent '{args.agent_name}'):")
+                for i, result in enumerate(results):
+                    print(f"  {i+1}. [{result['score']:.3f}] {result['item']}")
+            else:
+                print(f"Keine Treffer für '{args.text}' (Agent '{args.agent_name}').")
+        elif args.knowledge_command == "import":
+            kf_app.add_knowledge_bulk(args.agent_name, iter_import_items(args.sources, args.format))
+        elif args.knowledge_command == "chunk" and args.dry_run:
+            for chunk in iter_source_chunks(args.sources, args.strategy, args.size, args.overlap):
+                print(json.dumps(chunk, ensure_ascii=False))
+        elif args.knowledge_command == "chunk":
+            chunks = iter_source_chunks(args.sources, args.strategy, args.size, args.overlap)
+            kf_app.add_chunks(args.agent_name, chunks, args.batch_size)
+        elif args.knowledge_command == "dedup" and args.on_ingest:
+            threshold = args.threshold if args.threshold is not None else DEFAULT_NEAR_DUPLICATE_THRESHOLD
+            kf_app.configure_near_duplicates(args.agent_name, args.on_ingest, threshold)
+        elif args.knowledge_command == "dedup":
+            duplicates = kf_app.dedup_knowledge(args.agent_name, args.threshold, args.dry_run)
+            for duplicate in duplicates:
+                print(f"  {duplicate['position'] + 1}. {duplicate['item'][:60]} "
+                      f"(ähnelt {duplicate['duplicate_of'] + 1}, Ähnlichkeit {duplicate['similarity']:.2f})")
+            action = "gefunden" if args.dry_run else "entfernt"
+            print(f"{len(duplicates)} Beinahe-Duplikate in der Wissensbasis von Agent '{args.agent_name}' {action}.")
+        elif args.knowledge_command == "migrate":
+            kf_app.migrate_knowledge(args.agent_name, args.storage_format, args.codec)
+        elif args.knowledge_command == "compact":
+            kf_app.compact_knowledge(args.agent_name)
+        else:
+            command_parsers["knowledge"].print_help()
+            sys.exit(1)
+
+    elif args.command == "version":
+        if args.version_command == "create":
+            kf_app.create_version(args.agent_name, args.description)
+        elif args.version_command == "restore":
+            kf_app.restore_version(args.agent_name, args.version_id)
+        elif args.version_command == "list":
+            versions = kf_app.list_versions(args.agent_name, args.limit, args.offset, args.since, args.until, args.search, args.archived)
+            if versions:
+                print(f"{'Archivierte ' if args.archived else ''}Versionen für Agent '{args.agent_name}':")
+                for version in versions:
+                    print(f"  ID: {version.get('id', 'N/A')}")
+                    print(f"    Zeitstempel: {version.get('timestamp', 'N/A')}")
+                    print(f"    Beschreibung: {version.get('description', 'N/A')}")
+                    print("-" * 20)
+            else:
+                print(f"Keine Versionen für Agent '{args.agent_name}' gefunden.")
+        elif args.version_command == "delete":
+            kf_app.delete_version(args.agent_name, args.version_id)
+        elif args.version_command == "diff":
+            delta = kf_app.diff_versions(args.agent_name, args.from_version, args.to_version)
+            if not args.stat:
+                for item in delta["removed"]:
+                    print(f"- {item}")
+                for item in delta["added"]:
+                    print(f"+ {item}")
+            print(f"{len(delta['added'])} hinzugefügt, {len(delta['removed'])} entfernt.")
+        elif args.version_command == "rebuild-catalog":
+            kf_app.rebuild_version_catalog(args.agent_name)
+        elif args.version_command == "retention":
+            policy = _retention_policy_from_args(args)
+            if args.clear or policy:
+                options = {"auto": args.auto, "archive": args.archive} if policy else {}
+                kf_app.configure_retention(args.agent_name, {**policy, **options})
+            else:
+                policy = kf_app.get_retention_policy(args.agent_name)
+                print(f"Aufbewahrungsregeln für Agent '{args.agent_name}': {format_retention_policy(policy) if policy else 'keine (alle Versionen bleiben erhalten)'}.")
+        elif args.version_command == "prune":
+            policy = _retention_policy_from_args(args) or None
+            result = kf_app.prune_versions(args.agent_name, policy, args.archive or None, args.dry_run)
+            for version in result["pruned"]:
+                print(f"  {version['id']}  {version['timestamp']}  {version['description']}")
+            action = "zu entfernen" if args.dry_run else "archiviert" if result["archived"] else "entfernt"
+            print(f"{len(result['pruned'])} Versionen {action}, {result['kept']} behalten"
+                  + (f", {result['removed_objects']} nicht mehr referenzierte Chunks gelöscht." if result["removed_objects"] else "."))
+        else:
+            command_parsers["version"].print_help()
+            sys.exit(1)
+
+    elif args.command == "storage":
+        if args.storage_command == "migrate":
+            results = kf_app.migrate_storage(args.backend, args.agents)
+            print(f"{len(results)} Agenten nach '{args.backend}' migriert. Die Dateien unter '{kf_app.agents_dir}' bleiben erhalten; "
+                  f"ohne --backend wird ab jetzt '{detect_storage_backend(kf_app.base_dir)}' verwendet.")
+        else:
+            command_parsers["storage"].print_help()
+            sys.exit(1)
+
+    elif args.command == "serve":
+        serve(kf_app, args.host, args.port, args.workers, args.memory_budget, args.query_cache)
+
+    elif args.command == "bench":
+        print(f"Benchmark mit {args.items} Elementen, {args.versions} Versionen und {args.agents} Agenten:", file=sys.stderr)
+        report = run_benchmarks(args.items, args.versions, args.agents, args.samples, args.repeat, args.seed, args.keep)
+        if args.output:
+            try:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2)
+            except IOError as e:
+                raise KnowledgeFlaskException(f"Fehler beim Schreiben der Benchmark-Ergebnisse '{args.output}': {e}") from e
+            print(f"Benchmark-Ergebnisse nach '{args.output}' geschrieben.", file=sys.stderr)
+        else:
+            print(json.dumps(report, indent=2))
+
+
+    elif args.command == "batch":
+        try:
+            if args.source == "-":
+                failed = run_batch(kf_app, sys.stdin, args.stop_on_error)
+            else:
+                with open(args.source, 'r', encoding='utf-8') as f:
+                    failed = run_batch(kf_app, f, args.stop_on_error)
+        except IOError as e:
+            raise KnowledgeFlaskException(f"Fehler beim Lesen der Befehlsdatei '{args.source}': {e}") from e
+        if failed:
+            sys.exit(1)
+
+    elif args.command == "startup-check":
+        result = check_startup(args.budget_ms, args.runs)
+        print(f"Importzeit von 'agent list': {result['import_ms']} ms (Budget {result['budget_ms']} ms), "
+              f"Laufzeit {result['wall_ms']} ms (Median aus {result['runs']} Läufen).")
+        print("Langsamste Importe: " + ", ".join(f"{entry['module']} {entry['ms']} ms" for entry in result["slowest_imports"]))
+        if result["eagerly_loaded"]:
+            print(f"Beim Start geladen, obwohl erst bei Bedarf erlaubt: {', '.join(result['eagerly_loaded'])}")
+        if not result["ok"]:
+            print("Startzeit-Budget überschritten.")
+            sys.exit(1)
+        print("Startzeit im Budget.")
+
+def main(argv: list[str] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser, command_parsers = build_parser(_requested_command(argv))
+    args = parser.parse_args(argv)
+
+    # Wenn kein Unterbefehl angegeben wurde, zeige Hilfe
+    if args.command is None:
+        parser.print_help()
+        sys.exit(0)
+    
+    # Initialisiere die KnowledgeFlask-Anwendung
+    try:
+        kf_app = KnowledgeFlask(base_dir=args.base_dir, backend=args.backend)
+    except KnowledgeFlaskException as e:
+        print(f"Fehler beim Initialisieren von KnowledgeFlask: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    cli_operation = _cli_operation(args)
+    profiler = None
+    if args.cprofile:
+        import cProfile # Nur bei Bedarf laden
+        profiler = cProfile.Profile()
+        profiler.enable()
+    started = time.perf_counter()
+
+    try:
+        run_command(kf_app, args, command_parsers)
+    except KnowledgeFlaskException as e:
+        print(f"Fehler: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Ein unerwarteter Fehler ist aufgetreten: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        METRICS.record(cli_operation, time.perf_counter() - started)
+        report_metrics(args, profiler)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import pytest
+
+import knowledgeflask as kf
+
+
+@pytest.fixture(autouse=True)
+def _isolated_query_cache(monkeypatch):
+    """Jeder Test erhält einen eigenen, leeren Abfrage-Cache."""
+    monkeypatch.setattr(kf, "QUERY_CACHE", kf.QueryCache())
+
+
+@pytest.fixture
+def app(tmp_path):
+    """KnowledgeFlask mit eigenem Basisverzeichnis (Dateilayout)."""
+    return kf.KnowledgeFlask(str(tmp_path / "base"), backend="files")
+
+
+@pytest.fixture
+def agent(app):
+    """Name eines frisch angelegten Agenten."""
+    app.create_agent("A")
+    return "A"
+
+
+@pytest.fixture
+def kb(app, agent):
+    """KnowledgeBaseManager des Agenten 'A'."""
+    return kf.KnowledgeBaseManager(app._get_agent_path(agent))
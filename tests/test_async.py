@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import knowledgeflask as kf
+
+
+def run(coroutine_function, base_dir, **options):
+    """Führt coroutine_function(facade) mit einer eigenen AsyncKnowledgeFlask aus."""
+    async def main():
+        async with kf.AsyncKnowledgeFlask(base_dir, "files", **options) as facade:
+            return await coroutine_function(facade)
+    return asyncio.run(main())
+
+
+def test_concurrent_equal_reads_load_once(monkeypatch, tmp_path):
+    calls = []
+    iter_knowledge = kf.KnowledgeFlask.iter_knowledge
+
+    def slow_iter_knowledge(self, *args):
+        calls.append(args)
+        time.sleep(0.05)
+        return iter_knowledge(self, *args)
+
+    async def scenario(facade):
+        await facade.create_agent("A")
+        await facade.add_knowledge_items("A", ["eins", "zwei"])
+        monkeypatch.setattr(kf.KnowledgeFlask, "iter_knowledge", slow_iter_knowledge)
+        results = await asyncio.gather(*(facade.get_knowledge("A") for _ in range(5)))
+        results[0].append("verändert") # Jeder Aufrufer erhält eine eigene Kopie
+        return results, facade.stats()
+
+    results, stats = run(scenario, str(tmp_path))
+    assert len(calls) == 1
+    assert results[1:] == [["eins", "zwei"]] * 4
+    assert stats["coalesced_reads"] == 4
+    assert stats["pending_reads"] == 0
+
+
+def test_read_after_write_sees_the_write(tmp_path):
+    async def scenario(facade):
+        await facade.create_agent("A")
+        before = asyncio.ensure_future(facade.get_knowledge("A"))
+        await facade.add_knowledge("A", "neu")
+        return await before, await facade.get_knowledge("A")
+
+    _, after = run(scenario, str(tmp_path))
+    assert after == ["neu"]
+
+
+def test_write_order_per_agent(tmp_path):
+    async def scenario(facade):
+        await facade.create_agent("A")
+        add = asyncio.ensure_future(facade.add_knowledge("A", "eins"))
+        await asyncio.sleep(0) # Der Schreibzugriff beginnt vor create_version
+        version_id = await facade.create_version("A", "nach eins")
+        await add
+        await facade.add_knowledge("A", "zwei")
+        await facade.restore_version("A", version_id)
+        return await facade.get_knowledge("A"), await facade.list_versions("A")
+
+    knowledge, versions = run(scenario, str(tmp_path))
+    assert knowledge == ["eins"]
+    assert [version["description"] for version in versions] == ["nach eins"]
+
+def test_concurrent_writers_share_one_commit(tmp_path):
+    async def scenario(facade):
+        await facade.create_agent("A")
+        commits = facade.commits
+        added = await asyncio.gather(
+            facade.add_knowledge_items("A", ["eins", "zwei"]),
+            facade.add_knowledge_items("A", ["zwei", "drei"]),
+            facade.add_knowledge("A", "eins"),
+        )
+        return added, facade.commits - commits, await facade.get_knowledge("A")
+
+    added, commits, knowledge = run(scenario, str(tmp_path))
+    assert commits == 1
+    assert added == [["eins", "zwei"], ["drei"], False]
+    assert knowledge == ["eins", "zwei", "drei"]
+
+
+def test_failed_commit_raises_for_every_writer(tmp_path):
+    async def scenario(facade):
+        results = await asyncio.gather(
+            facade.add_knowledge("fehlt", "eins"), facade.add_knowledge("fehlt", "zwei"), return_exceptions=True
+        )
+        return results, facade.stats()
+
+    results, stats = run(scenario, str(tmp_path))
+    assert all(isinstance(result, kf.AgentNotFoundError) for result in results)
+    assert stats["pending_write_batches"] == 0
+
+
+def test_executor_is_bounded(monkeypatch, tmp_path):
+    active = []
+    peak = []
+    lock = threading.Lock()
+    list_agents = kf.KnowledgeFlask.list_agents
+
+    def tracked_list_agents(self):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.pop()
+        return list_agents(self)
+
+    async def scenario(facade):
+        monkeypatch.setattr(kf.KnowledgeFlask, "list_agents", tracked_list_agents)
+        # Direkt über _run, damit Single-Flight nichts zusammenfasst
+        return await asyncio.gather(*(facade._run(facade.app.list_agents) for _ in range(8)))
+
+    run(scenario, str(tmp_path), workers=2, max_pending=3)
+    assert max(peak) <= 2
+
+
+def test_errors_reach_the_caller(tmp_path):
+    async def scenario(facade):
+        await facade.create_agent("A")
+        with pytest.raises(kf.AgentAlreadyExistsError):
+            await facade.create_agent("A")
+        with pytest.raises(kf.AgentNotFoundError):
+            await facade.get_knowledge("fehlt")
+
+    run(scenario, str(tmp_path))
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+import knowledgeflask as kf
+
+PARAMS = {"items": 60, "versions": 2, "agents": 3, "samples": 5, "repeat": 2, "seed": 7}
+RESULT_KEYS = {"operation", "ops", "items", "seconds", "ops_per_second", "items_per_second", "latency_ms", "peak_rss_mb"}
+
+
+@pytest.mark.parametrize("fraction, expected", [(0.0, 1.0), (0.5, 5.0), (0.9, 9.0), (0.99, 10.0), (1.0, 10.0)])
+def test_percentile_uses_nearest_rank(fraction, expected):
+    assert kf._percentile([float(value) for value in range(1, 11)], fraction) == expected
+
+
+def test_percentile_of_no_values_is_zero():
+    assert kf._percentile([], 0.5) == 0.0
+
+
+def test_synthetic_items_are_reproducible():
+    assert list(kf._synthetic_items(5, 3)) == list(kf._synthetic_items(5, 3))
+    assert list(kf._synthetic_items(2, 3, 10))[0].startswith("doc-10 ")
+
+
+def test_operations_report_the_documented_shape(tmp_path):
+    base_dir = str(tmp_path / "bench")
+    results = {operation: kf.run_benchmark_operation(operation, base_dir, PARAMS) for operation in kf.BENCH_OPERATIONS}
+    for operation, result in results.items():
+        assert set(result) == RESULT_KEYS
+        assert result["operation"] == operation
+        assert result["ops"] > 0
+        assert set(result["latency_ms"]) == {"p50", "p90", "p99", "max"}
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"] <= result["latency_ms"]["max"]
+    assert results["add_knowledge_bulk"]["items"] == PARAMS["items"]
+    assert results["add_knowledge"]["ops"] == PARAMS["samples"]
+    assert results["create_version"]["ops"] == PARAMS["versions"]
+    assert results["restore_version"]["ops"] == PARAMS["repeat"]
+    json.dumps(results) # Muss sich als JSON ausgeben lassen
+
+
+def test_unknown_operation_is_rejected(tmp_path):
+    with pytest.raises(kf.KnowledgeFlaskException, match="Benchmark-Operation"):
+        kf.run_benchmark_operation("fehlt", str(tmp_path), PARAMS)
+
+
+def test_cli_writes_report(tmp_path):
+    output = tmp_path / "bench.json"
+    kf.main(["bench", "--items", "40", "--versions", "1", "--agents", "2", "--samples", "3", "--repeat", "1", "-o", str(output)])
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert set(report) == {"parameters", "environment", "base_dir", "results"}
+    assert report["parameters"]["items"] == 40
+    assert report["base_dir"] is None
+    assert [result["operation"] for result in report["results"]] == list(kf.BENCH_OPERATIONS)
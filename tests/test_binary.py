@@ -0,0 +1,90 @@
+import importlib.util
+
+import pytest
+
+import knowledgeflask as kf
+
+ITEMS = [f"element {i} – äöü" for i in range(70)] + [""]
+CODECS = [
+    codec for codec in kf.BINARY_CODECS
+    if codec != "zstd" or importlib.util.find_spec("zstandard") is not None
+]
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip_per_codec(tmp_path, codec):
+    file_path = str(tmp_path / "knowledge.bin")
+    assert kf.BinaryKnowledgeStore.write(file_path, iter(ITEMS), codec=codec, block_items=16) == len(ITEMS)
+    with kf.BinaryKnowledgeStore(file_path) as store:
+        assert store.codec == codec
+        assert len(store) == len(ITEMS)
+        assert list(store) == ITEMS
+        assert list(store.iter_range(30, 5)) == ITEMS[30:35]
+        assert store.get(len(ITEMS) - 1) == ""
+        with pytest.raises(IndexError):
+            store.get(len(ITEMS))
+
+
+def test_point_access_decodes_only_one_block(monkeypatch, tmp_path):
+    file_path = str(tmp_path / "knowledge.bin")
+    kf.BinaryKnowledgeStore.write(file_path, ITEMS, codec="zlib", block_items=16)
+    decompressed = []
+    decompress = kf.zlib.decompress
+    monkeypatch.setattr(kf.zlib, "decompress", lambda data: decompressed.append(len(data)) or decompress(data))
+    with kf.BinaryKnowledgeStore(file_path) as store:
+        assert store.get(40) == ITEMS[40]
+        assert store.get(41) == ITEMS[41] # Gleicher Block, bereits dekomprimiert
+    assert len(decompressed) == 1
+
+
+def test_unknown_codec_is_rejected(tmp_path):
+    with pytest.raises(kf.KnowledgeFlaskException, match="Unbekannter Codec"):
+        kf.BinaryKnowledgeStore.write(str(tmp_path / "knowledge.bin"), ITEMS, codec="lz4")
+
+
+@pytest.mark.parametrize("content", [b"", b"KAPUTT00" + bytes(24), b"KFBIN"])
+def test_corrupt_header_is_detected(tmp_path, content):
+    file_path = tmp_path / "knowledge.bin"
+    file_path.write_bytes(content)
+    with pytest.raises(kf.KnowledgeBaseCorruptError):
+        kf.BinaryKnowledgeStore(str(file_path)).open()
+
+
+def test_corrupt_block_is_detected(tmp_path):
+    file_path = tmp_path / "knowledge.bin"
+    kf.BinaryKnowledgeStore.write(str(file_path), ITEMS, codec="zlib", block_items=16)
+    data = bytearray(file_path.read_bytes())
+    data[kf.BINARY_STORE_HEADER.size:kf.BINARY_STORE_HEADER.size + 8] = b"\xff" * 8
+    file_path.write_bytes(bytes(data))
+    with kf.BinaryKnowledgeStore(str(file_path)) as store:
+        with pytest.raises(kf.KnowledgeBaseCorruptError):
+            store.get(0)
+
+
+def test_migrate_to_binary_and_back(kb):
+    kb.add_knowledge_bulk(ITEMS[:50])
+    for item in ITEMS[50:]:
+        kb.add_knowledge(item)
+    assert kb.migrate_format("binary", "zlib") == len(ITEMS)
+    assert kb._uses_binary_store()
+    assert kb.get_knowledge() == ITEMS
+    assert list(kb.iter_knowledge(48, 4)) == ITEMS[48:52]
+    assert kb.add_knowledge("neu") is True
+    assert kb.add_knowledge(ITEMS[3]) is False
+    assert kb.migrate_format("json") == len(ITEMS) + 1
+    assert not kb._uses_binary_store()
+    assert kb.get_knowledge() == ITEMS + ["neu"]
+
+
+def test_unknown_storage_format_is_rejected(kb):
+    with pytest.raises(kf.KnowledgeFlaskException, match="Speicherformat"):
+        kb.migrate_format("xml")
+
+
+def test_cli_migrate(app, agent):
+    app.add_knowledge(agent, "eins")
+    app.add_knowledge(agent, "zwei")
+    kf.main(["--base-dir", app.base_dir, "knowledge", "migrate", agent, "--to", "binary", "--codec", "zlib"])
+    kb = kf.KnowledgeBaseManager(app._get_agent_path(agent))
+    assert kb._uses_binary_store()
+    assert kb.get_knowledge() == ["eins", "zwei"]
@@ -0,0 +1,44 @@
+import os
+
+import knowledgeflask as kf
+
+
+def fill_catalog(catalog):
+    for day, description in [(1, "Import Januar"), (2, "Rabatt 50% Aktion"), (3, "Rabatt 50 Euro"), (4, "Import Februar")]:
+        catalog.add({"id": f"v{day}", "timestamp": f"2024-01-0{day}T12:00:00", "description": description})
+
+
+def test_catalog_pages_and_filters_by_time_and_description(tmp_path):
+    catalog = kf.VersionCatalog(str(tmp_path / "versions.sqlite"))
+    fill_catalog(catalog)
+    assert [v["id"] for v in catalog.list()] == ["v4", "v3", "v2", "v1"] # Neueste zuerst
+    assert [v["id"] for v in catalog.list(limit=2, offset=1)] == ["v3", "v2"]
+    assert [v["id"] for v in catalog.list(since="2024-01-02", until="2024-01-04")] == ["v3", "v2"]
+    assert [v["id"] for v in catalog.list(description="Import")] == ["v4", "v1"]
+    assert [v["id"] for v in catalog.list(description="50%")] == ["v2"] # % ist kein Platzhalter
+
+
+def test_versions_are_listed_from_catalog_and_rebuilt_from_directories(app, agent, kb):
+    kb.add_knowledge("eins")
+    first = app.create_version(agent, "erste")
+    kb.add_knowledge("zwei")
+    second = app.create_version(agent, "zweite")
+    assert [v["id"] for v in app.list_versions(agent)] == [second, first]
+    assert [v["id"] for v in app.list_versions(agent, description="erste")] == [first]
+
+    version_manager = kf.VersionManager(app._get_agent_path(agent))
+    os.remove(version_manager.catalog.catalog_file_path) # Ältere Agenten haben noch keinen Katalog
+    assert [v["id"] for v in app.list_versions(agent, limit=1)] == [second]
+
+    app.delete_version(agent, first)
+    assert [v["id"] for v in app.list_versions(agent)] == [second]
+    assert app.rebuild_version_catalog(agent) == 1
+
+
+def test_cli_rebuild_catalog(app, agent, kb, capsys):
+    kb.add_knowledge("eins")
+    version_id = app.create_version(agent, "erste")
+    os.remove(kf.VersionManager(app._get_agent_path(agent)).catalog.catalog_file_path)
+    kf.main(["--base-dir", app.base_dir, "version", "rebuild-catalog", agent])
+    kf.main(["--base-dir", app.base_dir, "version", "list", agent])
+    assert version_id in capsys.readouterr().out
@@ -0,0 +1,93 @@
+import io
+import json
+
+import pytest
+
+import knowledgeflask as kf
+
+PROSE = " ".join(
+    f"Satz {i} beschreibt ein Detail über Sterne, Planeten und Monde." + ("\n\n" if i % 4 == 3 else "")
+    for i in range(40)
+)
+MARKDOWN = "# Titel\nEinleitung.\n\n## Erster Abschnitt\nText eins.\n\n## Zweiter Abschnitt\nText zwei.\n"
+
+
+def chunks(text, strategy, size=200, overlap=40, read_size=None, monkeypatch=None):
+    """Zerlegt text mit iter_chunks; optional mit kleinen Leseblöcken."""
+    if read_size is not None:
+        monkeypatch.setattr(kf, "CHUNK_READ_SIZE", read_size)
+    return list(kf.iter_chunks(io.StringIO(text), "quelle.md", strategy, size, overlap))
+
+
+@pytest.mark.parametrize("strategy", kf.CHUNK_STRATEGIES)
+def test_offsets_point_into_the_source(strategy):
+    for index, chunk in enumerate(chunks(PROSE, strategy)):
+        assert chunk["index"] == index
+        assert chunk["source"] == "quelle.md"
+        assert PROSE[chunk["start"]:chunk["end"]] == chunk["text"]
+        assert len(chunk["text"]) <= 200
+
+
+@pytest.mark.parametrize("strategy", kf.CHUNK_STRATEGIES)
+def test_small_read_blocks_give_the_same_chunks(monkeypatch, strategy):
+    assert chunks(PROSE, strategy, read_size=7, monkeypatch=monkeypatch) == chunks(PROSE, strategy)
+
+
+@pytest.mark.parametrize("strategy", kf.CHUNK_STRATEGIES)
+def test_chunks_cover_the_whole_text(strategy):
+    result = chunks(PROSE, strategy)
+    assert result[0]["start"] == 0
+    assert result[-1]["end"] == len(PROSE.rstrip())
+    assert all(not PROSE[previous["end"]:following["start"]].strip() for previous, following in zip(result[:-1], result[1:], strict=True))
+
+
+def test_overlap_is_bounded():
+    result = chunks(PROSE, "sentence", overlap=80)
+    overlaps = [previous["end"] - following["start"] for previous, following in zip(result[:-1], result[1:], strict=True)]
+    assert max(overlaps) > 0
+    assert max(overlaps) <= 80
+
+
+def test_sentence_chunks_end_at_sentence_boundaries():
+    assert all(chunk["text"].endswith(".") for chunk in chunks(PROSE, "sentence"))
+
+
+def test_fixed_chunks_do_not_split_words():
+    words = set(PROSE.split())
+    assert all(set(chunk["text"].split()) <= words for chunk in chunks(PROSE, "fixed", size=50, overlap=0))
+
+
+def test_heading_chunks_follow_sections():
+    result = chunks(MARKDOWN, "heading", size=1000, overlap=100)
+    assert [chunk["text"].splitlines()[0] for chunk in result] == ["# Titel", "## Erster Abschnitt", "## Zweiter Abschnitt"]
+    assert all(MARKDOWN[chunk["start"]:chunk["end"]] == chunk["text"] for chunk in result)
+
+
+def test_unbroken_text_is_split_at_size():
+    result = chunks("x" * 450, "sentence", size=100, overlap=0)
+    assert [len(chunk["text"]) for chunk in result] == [100, 100, 100, 100, 50]
+
+
+@pytest.mark.parametrize("strategy, size, overlap", [("absatz", 100, 0), ("fixed", 0, 0), ("fixed", 100, 100)])
+def test_invalid_parameters_are_rejected(strategy, size, overlap):
+    with pytest.raises(kf.KnowledgeFlaskException):
+        list(kf.iter_chunks(io.StringIO(PROSE), "quelle", strategy, size, overlap))
+
+
+def test_add_chunks_records_sources(kb):
+    result = chunks(PROSE, "sentence")
+    assert kb.add_chunks(result + result[:2], batch_size=3) == (len(result), 2)
+    assert kb.get_knowledge() == [chunk["text"] for chunk in result]
+    sources = kb.load_chunk_sources()
+    assert sources[kf.item_digest(result[1]["text"])] == {"source": "quelle.md", "start": result[1]["start"], "end": result[1]["end"]}
+
+
+def test_cli_chunk_and_get_with_sources(app, agent, tmp_path, capsys):
+    source = tmp_path / "notizen.md"
+    source.write_text(MARKDOWN, encoding="utf-8")
+    kf.main(["--base-dir", app.base_dir, "knowledge", "chunk", agent, str(source), "--strategy", "heading"])
+    capsys.readouterr()
+    kf.main(["--base-dir", app.base_dir, "knowledge", "get", agent, "--format", "jsonl", "--with-sources"])
+    items = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(items) == 3
+    assert all(MARKDOWN[item["start"]:item["end"]] == item["text"] and item["source"] == str(source) for item in items)
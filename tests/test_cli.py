@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+import knowledgeflask as kf
+
+
+def run_cli(base_dir, *args):
+    """Führt die CLI mit eigenem Basisverzeichnis aus."""
+    kf.main(["--base-dir", str(base_dir), *args])
+
+
+def test_agent_knowledge_and_version_round_trip(tmp_path, capsys):
+    run_cli(tmp_path, "agent", "create", "A")
+    run_cli(tmp_path, "knowledge", "add", "A", "Die Sonne ist ein Stern.")
+    run_cli(tmp_path, "knowledge", "add", "A", "Die Erde dreht sich um die Sonne.")
+    run_cli(tmp_path, "version", "create", "A", "-d", "erste")
+    capsys.readouterr()
+
+    run_cli(tmp_path, "knowledge", "get", "A", "--format", "jsonl")
+    items = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert items == ["Die Sonne ist ein Stern.", "Die Erde dreht sich um die Sonne."]
+
+    run_cli(tmp_path, "knowledge", "query", "A", "Stern", "--top-k", "1")
+    assert "Die Sonne ist ein Stern." in capsys.readouterr().out
+
+
+def test_unknown_agent_exits_with_error(tmp_path, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        run_cli(tmp_path, "knowledge", "get", "fehlt")
+    assert excinfo.value.code == 1
+    assert "fehlt" in capsys.readouterr().err
+
+
+def test_startup_stays_within_import_budget():
+    # Gewertet wird die schnellste von drei Messungen; das fängt Ausreißer auf ausgelasteten CI-Rechnern ab
+    result = kf.check_startup(runs=3)
+    assert result["runs"] == 3
+    assert result["budget_ms"] == kf.STARTUP_IMPORT_BUDGET_MS
+    assert result["eagerly_loaded"] == []
+    assert result["ok"], result
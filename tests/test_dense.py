@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import knowledgeflask as kf
+
+ITEMS = [f"thema {i} stern planet mond" if i % 2 else f"thema {i} apfel birne" for i in range(10)]
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = kf.get_embedder("hashing", 64)
+    vectors = embedder.embed(["Sonne Stern", "Sonne Stern", ""])
+    assert vectors.dtype == np.float32 and vectors.shape == (3, 64)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+    assert not vectors[2].any() # Leerer Text bleibt der Nullvektor
+
+
+def test_unknown_embedder_is_rejected():
+    with pytest.raises(kf.KnowledgeFlaskException, match="Unbekannter Embedder"):
+        kf.get_embedder("fehlt")
+
+
+
+def test_embedders_must_implement_embed():
+    class Incomplete(kf.Embedder):
+        name = "unvollständig"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_dense_query_matches_brute_force_ranking(monkeypatch, kb):
+    monkeypatch.setattr(kf, "EMBEDDING_SEARCH_BLOCK_ROWS", 3) # Mehrere Blöcke zusammenführen
+    kb.add_knowledge_bulk(ITEMS)
+    results = kb.query("stern mond", top_k=4, mode="dense")
+
+    embedder = kf.get_embedder()
+    scores = embedder.embed(ITEMS) @ embedder.embed(["stern mond"])[0]
+    assert np.allclose([r["score"] for r in results], sorted(scores, reverse=True)[:4]) # Absteigend, wie ohne Blöcke
+    assert all(np.isclose(r["score"], scores[r["position"]]) for r in results)
+    assert all(r["item"] == ITEMS[r["position"]] for r in results)
+
+
+def test_matrix_is_memory_mapped_and_only_appended(kb):
+    kb.add_knowledge_bulk(ITEMS[:4])
+    kb.query("stern", mode="dense")
+    index = kf.EmbeddingIndex(kb.agent_path, kf.get_embedder())
+    first_rows = np.array(np.load(index.matrix_file_path, mmap_mode="r"))
+    assert first_rows.shape == (4, kf.DEFAULT_EMBEDDING_DIMENSION)
+
+    kb.add_knowledge(ITEMS[4])
+    kb.query("stern", mode="dense")
+    matrix = np.load(index.matrix_file_path, mmap_mode="r")
+    assert isinstance(matrix, np.memmap) and matrix.shape[0] == 5
+    assert np.array_equal(matrix[:4], first_rows) # Vorhandene Zeilen bleiben unverändert
+    assert index.sync(kb.get_knowledge()) == 0
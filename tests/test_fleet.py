@@ -0,0 +1,45 @@
+import json
+import os
+
+import knowledgeflask as kf
+
+
+def test_run_fleet_task_stats_and_snapshot(app, agent, kb):
+    kb.add_knowledge_bulk(["eins", "zwei", "drei"])
+    agent_path = app._get_agent_path(agent)
+    stats = kf.run_fleet_task("stats", agent_path)
+    assert stats["ok"] and stats["agent"] == agent
+    assert (stats["items"], stats["versions"]) == (3, 0)
+    assert stats["bytes"] > 0
+
+    snapshot = kf.run_fleet_task("snapshot", agent_path, "nachts")
+    assert snapshot["ok"] and snapshot["versions"] == 1
+    assert app.list_versions(agent)[0]["id"] == snapshot["version_id"]
+
+
+def test_run_fleet_task_verify_reports_missing_chunk(app, agent, kb):
+    kb.add_knowledge("eins")
+    agent_path = app._get_agent_path(agent)
+    app.create_version(agent, "erste")
+    assert kf.run_fleet_task("verify", agent_path)["problems"] == []
+
+    objects_dir = os.path.join(agent_path, kf.OBJECTS_DIR_NAME)
+    for root, _, files in os.walk(objects_dir):
+        for file_name in files:
+            os.remove(os.path.join(root, file_name))
+    result = kf.run_fleet_task("verify", agent_path)
+    assert not result["ok"] and result["problems"]
+
+
+def test_fleet_runs_every_agent_in_worker_processes(app, capsys):
+    for name in ("A", "B", "C"):
+        app.create_agent(name)
+        app.add_knowledge(name, f"wissen von {name}")
+    results = list(app.run_fleet("stats", workers=2))
+    assert sorted(result["agent"] for result in results) == ["A", "B", "C"]
+    assert all(result["ok"] and result["items"] == 1 for result in results)
+
+    capsys.readouterr()
+    kf.main(["--base-dir", app.base_dir, "fleet", "verify", "--format", "jsonl", "--workers", "2"])
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert sorted(line["agent"] for line in lines) == ["A", "B", "C"]
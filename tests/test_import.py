@@ -0,0 +1,42 @@
+import io
+import json
+
+import pytest
+
+import knowledgeflask as kf
+
+
+def test_iter_import_items_reads_jsonl_text_and_directories(tmp_path):
+    jsonl = tmp_path / "daten.jsonl"
+    jsonl.write_text('"eins"\n\n{"text": "zwei"}\n', encoding="utf-8")
+    text = tmp_path / "zeilen.txt"
+    text.write_text("drei\n   \nvier\r\n", encoding="utf-8")
+    directory = tmp_path / "dokumente"
+    (directory / "b").mkdir(parents=True)
+    (directory / "a.md").write_text("fünf\n", encoding="utf-8")
+    (directory / "b" / "c.md").write_text("sechs", encoding="utf-8")
+
+    items = list(kf.iter_import_items([str(jsonl), str(text), str(directory)]))
+    assert items == ["eins", "zwei", "drei", "vier", "fünf", "sechs"]
+
+
+def test_iter_import_items_reports_bad_jsonl_line(tmp_path):
+    source = tmp_path / "kaputt.jsonl"
+    source.write_text('"ok"\n{kein json\n', encoding="utf-8")
+    with pytest.raises(kf.KnowledgeFlaskException, match="Zeile 2"):
+        list(kf.iter_import_items([str(source)]))
+
+
+def test_add_knowledge_bulk_dedups_against_index_and_input(kb):
+    kb.add_knowledge("eins")
+    assert kb.add_knowledge_bulk(iter(["zwei", "eins", "drei", "zwei"])) == (2, 2)
+    assert kb.get_knowledge() == ["eins", "zwei", "drei"]
+    # Der Hash-Index kennt die importierten Elemente auch in einer neuen Instanz
+    assert kf.KnowledgeBaseManager(kb.agent_path).add_knowledge("drei") is False
+
+
+def test_cli_import_streams_stdin(monkeypatch, app, agent, tmp_path):
+    lines = "\n".join(json.dumps({"text": f"fakt {i}"}) for i in range(100))
+    monkeypatch.setattr("sys.stdin", io.StringIO(lines))
+    kf.main(["--base-dir", app.base_dir, "knowledge", "import", agent, "--format", "jsonl"])
+    assert app.get_knowledge(agent) == [f"fakt {i}" for i in range(100)]
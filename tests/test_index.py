@@ -0,0 +1,43 @@
+from contextlib import closing
+
+import knowledgeflask as kf
+
+QUERIES = ["apfel", "birne kirsche", "rot gelb", "saft", "fehlt"]
+
+
+def rebuilt_results(kb, query_text):
+    """Ergebnisse eines frisch und vollständig aufgebauten Index im Speicher."""
+    index = kf.InvertedIndex(kb.agent_path, load=False)
+    index.add_documents(kb.get_knowledge())
+    return index.search(query_text, top_k=10)
+
+
+def test_add_knowledge_maintains_index(kb):
+    kb.append_knowledge(["apfel rot", "birne gelb"])
+    kb.append_knowledge(["kirsche rot rot"])
+    with closing(kf.InvertedIndex(kb.agent_path)) as index:
+        assert index.doc_count == 3
+        assert index.is_current(kb.get_knowledge())
+
+
+def test_incremental_bm25_matches_full_rebuild(kb):
+    kb.append_knowledge(["apfel rot", "birne gelb", "kirsche rot"])
+    kb.add_knowledge_bulk([f"saft nummer {i} apfel" for i in range(20)] + ["birne saft"])
+    kb.append_knowledge(["apfel birne kirsche", "gelb gelb saft"])
+    kb.apply_delta(["birne gelb", "saft nummer 3 apfel"], ["kirsche saft rot"])
+    with closing(kf.InvertedIndex(kb.agent_path)) as index:
+        assert index.is_current(kb.get_knowledge()) # Ohne Neuaufbau fortgeführt
+    for query_text in QUERIES:
+        expected = rebuilt_results(kb, query_text)
+        results = kb.query(query_text, top_k=10)
+        assert [(r["position"], round(r["score"], 9)) for r in results] == \
+            [(position, round(score, 9)) for position, score in expected]
+        knowledge = kb.get_knowledge()
+        assert all(r["item"] == knowledge[r["position"]] for r in results)
+
+
+def test_sync_rebuilds_when_last_item_differs(kb):
+    kb.append_knowledge(["apfel rot", "birne gelb"])
+    with closing(kf.InvertedIndex(kb.agent_path)) as index:
+        assert index.sync(["kirsche rot", "apfel gelb"]) == 2 # Gleiche Länge, anderer Inhalt
+        assert [position for position, _ in index.search("apfel")] == [1]
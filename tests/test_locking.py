@@ -0,0 +1,129 @@
+import subprocess
+import sys
+import threading
+from contextlib import closing
+
+import pytest
+
+import knowledgeflask as kf
+
+
+@pytest.fixture
+def lock(tmp_path):
+    return kf.AgentLock(str(tmp_path))
+
+
+def test_shared_holders_in_different_threads_overlap(lock):
+    barrier = threading.Barrier(2, timeout=5)
+    errors = []
+
+    def reader():
+        try:
+            with lock.hold(exclusive=False):
+                barrier.wait() # Beide Leser müssen die Sperre gleichzeitig halten
+        except threading.BrokenBarrierError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_writer_waits_for_readers_of_other_threads(lock):
+    reading = threading.Event()
+    release = threading.Event()
+    events = []
+
+    def reader():
+        with lock.hold(exclusive=False):
+            reading.set()
+            release.wait(5)
+            events.append("reader done")
+
+    def writer():
+        with lock.hold():
+            events.append("writer")
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    reading.wait(5)
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    writer_thread.join(0.2)
+    assert writer_thread.is_alive()
+    release.set()
+    reader_thread.join()
+    writer_thread.join()
+    assert events == ["reader done", "writer"]
+
+
+def test_upgrade_from_shared_to_exclusive_is_rejected(lock):
+    with lock.hold(exclusive=False):
+        with pytest.raises(kf.KnowledgeFlaskException):
+            with lock.hold():
+                pass
+    with lock.hold(): # Die Sperre ist danach wieder frei
+        pass
+
+
+def test_exclusive_holder_may_nest_shared_and_exclusive(lock):
+    with lock.hold():
+        with lock.hold(exclusive=False):
+            with lock.hold():
+                pass
+    assert lock._fd is None
+
+
+@pytest.mark.skipif(kf.fcntl is None, reason="flock nicht verfügbar")
+def test_exclusive_lock_blocks_other_processes(lock):
+    probe = (
+        "import fcntl, os, sys\n"
+        "fd = os.open(sys.argv[1], os.O_RDWR)\n"
+        "try:\n"
+        "    fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)\n"
+        "except BlockingIOError:\n"
+        "    sys.exit(3)\n"
+    )
+    with lock.hold():
+        completed = subprocess.run([sys.executable, "-c", probe, lock.lock_file_path])
+    assert completed.returncode == 3
+
+
+def test_concurrent_add_and_query_keep_index_consistent(kb):
+    errors = []
+    seen = []
+
+    def adder(worker):
+        manager = kf.KnowledgeBaseManager(kb.agent_path) # Eigene Sperre wie ein zweiter Prozess
+        try:
+            for i in range(15):
+                manager.append_knowledge([f"apfel {worker} nummer {i}"])
+        except Exception as e:
+            errors.append(e)
+
+    def searcher():
+        manager = kf.KnowledgeBaseManager(kb.agent_path)
+        try:
+            for _ in range(30):
+                seen.extend(manager.query("apfel nummer", top_k=3))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=adder, args=(worker,)) for worker in range(3)]
+    threads += [threading.Thread(target=searcher) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    knowledge = kb.get_knowledge()
+    assert len(knowledge) == 45
+    assert all(knowledge[result["position"]] == result["item"] for result in seen) # Nur angehängt: Positionen bleiben gültig
+    with closing(kf.InvertedIndex(kb.agent_path)) as index:
+        assert index.is_current(knowledge)
+        rebuilt = kf.InvertedIndex(kb.agent_path, load=False)
+        rebuilt.add_documents(knowledge)
+        assert index.search("apfel 2", top_k=45) == rebuilt.search("apfel 2", top_k=45)
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import knowledgeflask as kf
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    """Frische prozessweite Metriken, damit andere Tests nicht mitzählen."""
+    fresh = kf.Metrics()
+    monkeypatch.setattr(kf, "METRICS", fresh)
+    return fresh
+
+
+def test_counters_and_timers(metrics):
+    metrics.count("files_opened")
+    metrics.count("files_opened", 2)
+    metrics.record("load", 0.25)
+    metrics.record("load", 0.5)
+    with metrics.timer("save"):
+        pass
+    data = metrics.snapshot()
+    assert data["counters"] == {"files_opened": 3}
+    assert data["timers"]["load"] == {"calls": 2, "seconds": 0.75, "max_seconds": 0.5}
+    assert data["timers"]["save"]["calls"] == 1
+
+
+def test_timer_records_failing_calls(metrics):
+    with pytest.raises(RuntimeError):
+        with metrics.timer("kaputt"):
+            raise RuntimeError
+    assert metrics.snapshot()["timers"]["kaputt"]["calls"] == 1
+
+
+def test_prometheus_format(metrics):
+    metrics.count("bytes_loaded", 42)
+    metrics.record("kb.load", 0.5)
+    lines = metrics.to_prometheus().splitlines()
+    assert "# TYPE knowledgeflask_bytes_loaded_total counter" in lines
+    assert "knowledgeflask_bytes_loaded_total 42" in lines
+    assert 'knowledgeflask_operation_calls_total{operation="kb.load"} 1' in lines
+    assert 'knowledgeflask_operation_seconds_max{operation="kb.load"} 0.5' in lines
+
+
+def test_manager_operations_are_instrumented(metrics, kb):
+    kb.add_knowledge("eins")
+    kb.get_knowledge()
+    data = metrics.snapshot()
+    assert data["timers"]
+    assert data["counters"]["files_opened"] > 0
+
+
+@pytest.mark.parametrize("file_name", ["metrics.json", "metrics.prom"])
+def test_cli_metrics_file(metrics, tmp_path, file_name):
+    metrics_file = tmp_path / file_name
+    kf.main(["--base-dir", str(tmp_path / "base"), "--metrics-file", str(metrics_file), "agent", "create", "A"])
+    content = metrics_file.read_text(encoding="utf-8")
+    if file_name.endswith(".json"):
+        assert set(json.loads(content)) == {"counters", "timers"}
+    else:
+        assert content.startswith("# TYPE ")
+    assert [path.name for path in tmp_path.iterdir() if path.name.endswith(".tmp")] == []
+
+
+
+def test_failed_metrics_write_leaves_no_temp_file(metrics, tmp_path):
+    target = tmp_path / "metrics.json"
+    target.mkdir() # os.replace auf ein Verzeichnis schlägt fehl
+    with pytest.raises(kf.KnowledgeFlaskException):
+        metrics.write(str(target))
+    assert [path.name for path in tmp_path.iterdir()] == ["metrics.json"]
+
+def test_cli_profile_prints_breakdown(metrics, tmp_path, capsys):
+    kf.main(["--base-dir", str(tmp_path), "--profile", "agent", "create", "A"])
+    kf.main(["--base-dir", str(tmp_path), "--profile", "knowledge", "add", "A", "eins"])
+    err = capsys.readouterr().err
+    assert "--- Profil ---" in err
+    assert "Zähler:" in err
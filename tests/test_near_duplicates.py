@@ -0,0 +1,124 @@
+import os
+from contextlib import closing
+
+import pytest
+
+import knowledgeflask as kf
+
+ORIGINAL = "Die Sonne ist ein Stern im Zentrum unseres Sonnensystems und spendet Licht."
+NEAR_DUPLICATE = "Die  sonne ist ein Stern im Zentrum unseres Sonnensystems und spendet Licht!"
+OTHER = "Der Mond umkreist die Erde in etwa siebenundzwanzig Tagen."
+
+
+def test_shingles_are_normalized():
+    assert kf.NearDuplicateIndex.shingles("Ab  C") == kf.NearDuplicateIndex.shingles("ab c")
+    assert kf.NearDuplicateIndex.shingles("") == set()
+    assert kf.NearDuplicateIndex.band_keys(set()) == []
+
+
+def test_similar_texts_share_bands():
+    keys = set(kf.NearDuplicateIndex.band_keys(kf.NearDuplicateIndex.shingles(ORIGINAL)))
+    assert keys & set(kf.NearDuplicateIndex.band_keys(kf.NearDuplicateIndex.shingles(NEAR_DUPLICATE)))
+    assert len(keys) == kf.MINHASH_BANDS
+
+
+def test_find_uses_persisted_buckets(tmp_path):
+    items = [ORIGINAL, OTHER]
+    index = kf.NearDuplicateIndex(str(tmp_path))
+    index.sync(items)
+    index.close()
+    reopened = kf.NearDuplicateIndex(str(tmp_path))
+    assert reopened.item_count == 2
+    position, similarity = reopened.find(NEAR_DUPLICATE, items.__getitem__)
+    assert position == 0
+    assert similarity >= kf.DEFAULT_NEAR_DUPLICATE_THRESHOLD
+    assert reopened.find("Etwas völlig anderes ohne Bezug.", items.__getitem__) is None
+    reopened.close()
+
+
+
+def test_find_or_add_indexes_only_new_texts(tmp_path):
+    items = []
+    with closing(kf.NearDuplicateIndex(str(tmp_path), load=False)) as index:
+        for text in (ORIGINAL, OTHER, NEAR_DUPLICATE):
+            if index.find_or_add(text, items.__getitem__) is None:
+                items.append(text)
+        assert items == [ORIGINAL, OTHER]
+        assert index.item_count == 2
+
+
+def test_unreadable_index_is_rebuilt(app, agent, kb, capsys):
+    app.configure_near_duplicates(agent, "skip")
+    kb.append_knowledge([ORIGINAL, OTHER])
+    index_file_path = os.path.join(kb.agent_path, kf.NEAR_DUPLICATE_INDEX_FILE_NAME)
+    with open(index_file_path, 'wb') as f:
+        f.write(b"keine SQLite-Datenbank" * 100)
+    new_item = "Kometen ziehen auf langgestreckten Bahnen um die Sonne."
+    assert kb.append_knowledge([NEAR_DUPLICATE, new_item]) == [new_item]
+    assert "unlesbar" in capsys.readouterr().err
+    with closing(kf.NearDuplicateIndex(kb.agent_path)) as index:
+        assert index.item_count == 3
+
+def test_dedup_keeps_first_occurrence(kb):
+    kb.append_knowledge([ORIGINAL, OTHER, NEAR_DUPLICATE])
+    duplicates = kb.remove_near_duplicates(dry_run=True)
+    assert [(d["position"], d["duplicate_of"]) for d in duplicates] == [(2, 0)]
+    assert kb.count_knowledge() == 3
+    kb.remove_near_duplicates()
+    assert kb.get_knowledge() == [ORIGINAL, OTHER]
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("flag", [ORIGINAL, OTHER, NEAR_DUPLICATE]),
+    ("skip", [ORIGINAL, OTHER]),
+])
+def test_on_ingest_modes(app, agent, capsys, mode, expected):
+    app.add_knowledge(agent, ORIGINAL)
+    app.configure_near_duplicates(agent, mode)
+    app.add_knowledge(agent, OTHER)
+    app.add_knowledge(agent, NEAR_DUPLICATE)
+    assert "ähnelt Element 1" in capsys.readouterr().err
+    assert kf.KnowledgeBaseManager(app._get_agent_path(agent)).get_knowledge() == expected
+
+
+def test_bulk_import_skips_near_duplicates(app, agent, kb, capsys):
+    app.configure_near_duplicates(agent, "skip")
+    kb.add_knowledge_bulk([ORIGINAL, OTHER, NEAR_DUPLICATE])
+    assert kb.get_knowledge() == [ORIGINAL, OTHER]
+
+
+def test_removal_shifts_indexed_positions(app, agent, kb):
+    app.configure_near_duplicates(agent, "skip")
+    kb.append_knowledge(["Erstes Element ganz ohne Ähnlichkeit.", ORIGINAL, OTHER])
+    kb.apply_delta(["Erstes Element ganz ohne Ähnlichkeit."], [])
+    index = kf.NearDuplicateIndex(kb.agent_path)
+    knowledge = kb.get_knowledge()
+    assert index.item_count == 2
+    assert index.find(NEAR_DUPLICATE, knowledge.__getitem__)[0] == 0
+    index.close()
+
+
+def test_off_removes_config_and_index(app, agent, kb):
+    app.configure_near_duplicates(agent, "flag", 0.8)
+    assert kf.NearDuplicateIndex(kb.agent_path).load_config() == {"mode": "flag", "threshold": 0.8}
+    kb.append_knowledge([ORIGINAL])
+    app.configure_near_duplicates(agent, "off")
+    assert kf.NearDuplicateIndex(kb.agent_path).load_config() is None
+    assert not os.path.exists(os.path.join(kb.agent_path, kf.NEAR_DUPLICATE_INDEX_FILE_NAME))
+
+
+@pytest.mark.parametrize("mode, threshold", [("fast", 0.5), ("flag", 0), ("flag", 1.5)])
+def test_invalid_configuration_is_rejected(app, agent, mode, threshold):
+    with pytest.raises(kf.KnowledgeFlaskException):
+        app.configure_near_duplicates(agent, mode, threshold)
+
+
+def test_cli_dedup(app, agent, capsys):
+    app.add_knowledge(agent, ORIGINAL)
+    app.add_knowledge(agent, NEAR_DUPLICATE)
+    capsys.readouterr()
+    kf.main(["--base-dir", app.base_dir, "knowledge", "dedup", agent, "--dry-run"])
+    assert "1 Beinahe-Duplikate" in capsys.readouterr().out
+    kf.main(["--base-dir", app.base_dir, "knowledge", "dedup", agent, "--on-ingest", "skip"])
+    kf.main(["--base-dir", app.base_dir, "knowledge", "dedup", agent])
+    assert kf.KnowledgeBaseManager(app._get_agent_path(agent)).get_knowledge() == [ORIGINAL]
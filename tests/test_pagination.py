@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+import knowledgeflask as kf
+
+ITEMS = [f"element {i}" for i in range(25)]
+
+
+@pytest.fixture
+def paged_kb(kb):
+    """Wissensbasis mit Elementen im Snapshot und im Segment-Log."""
+    kb.add_knowledge_bulk(ITEMS[:20])
+    for item in ITEMS[20:]:
+        kb.add_knowledge(item)
+    return kb
+
+
+@pytest.mark.parametrize("offset, limit", [(0, None), (0, 5), (18, 4), (20, 3), (24, 10), (30, 5), (3, 0)])
+def test_pages_match_full_knowledge(paged_kb, offset, limit):
+    end = None if limit is None else offset + limit
+    assert list(paged_kb.iter_knowledge(offset, limit)) == ITEMS[offset:end]
+
+
+def test_pages_do_not_load_the_whole_snapshot(monkeypatch, paged_kb):
+    def fail():
+        raise AssertionError("Snapshot vollständig geladen")
+
+    monkeypatch.setattr(paged_kb, "_load_knowledge_from_file", fail)
+    assert list(paged_kb.iter_knowledge(10, 3)) == ITEMS[10:13]
+    assert paged_kb.count_knowledge() == len(ITEMS)
+
+
+def test_row_offsets_follow_a_replaced_snapshot(paged_kb):
+    assert list(paged_kb.iter_knowledge(5, 2)) == ITEMS[5:7]
+    paged_kb.compact() # Neuer Snapshot: die alten Offsets passen nicht mehr
+    assert os.path.exists(paged_kb.row_offsets_file_path)
+    assert list(paged_kb.iter_knowledge(21, 3)) == ITEMS[21:24]
+    assert paged_kb.count_knowledge() == len(ITEMS)
+
+
+def test_snapshot_in_other_layout_is_read_completely(tmp_path):
+    agent_path = tmp_path / "agent"
+    agent_path.mkdir()
+    (agent_path / kf.KNOWLEDGE_FILE_NAME).write_text(json.dumps(ITEMS[:6]), encoding="utf-8") # Eine Zeile
+    kb = kf.KnowledgeBaseManager(str(agent_path))
+    assert list(kb.iter_knowledge(2, 3)) == ITEMS[2:5]
+    assert kb.count_knowledge() == 6
+
+
+def test_cli_get_pages_as_jsonl(app, agent, paged_kb, capsys):
+    capsys.readouterr()
+    kf.main(["--base-dir", app.base_dir, "knowledge", "get", agent, "--offset", "19", "--limit", "2", "--format", "jsonl"])
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == ITEMS[19:21]
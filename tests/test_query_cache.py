@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+import knowledgeflask as kf
+
+ITEMS = ["Die Sonne ist ein Stern.", "Der Mond umkreist die Erde.", "Sterne leuchten nachts."]
+
+
+def test_repeated_query_is_served_from_memory(monkeypatch, kb):
+    kb.append_knowledge(ITEMS)
+    expected = kb.query("Stern")
+
+    def fail(self, knowledge):
+        raise AssertionError("Index erneut durchsucht")
+
+    monkeypatch.setattr(kf.InvertedIndex, "sync", fail)
+    assert kb.query("stern  STERN") == expected # Gleiche Termmenge, gleicher Schlüssel
+    assert kf.QUERY_CACHE.stats()["hits"] == 1
+
+
+def test_returned_results_are_copies(kb):
+    kb.append_knowledge(ITEMS)
+    kb.query("Stern")[0]["item"] = "verändert"
+    assert kb.query("Stern")[0]["item"] != "verändert"
+
+
+def test_writes_invalidate_the_agent(kb):
+    kb.append_knowledge(ITEMS)
+    assert [hit["item"] for hit in kb.query("Stern")] == [ITEMS[0]]
+    kb.append_knowledge(["Ein Stern fällt."])
+    assert {hit["item"] for hit in kb.query("Stern")} == {ITEMS[0], "Ein Stern fällt."}
+    kb.apply_delta([ITEMS[0]], [])
+    assert [hit["item"] for hit in kb.query("Stern")] == ["Ein Stern fällt."]
+    assert kf.QUERY_CACHE.stats()["hits"] == 0
+
+
+def test_changes_by_other_processes_change_the_generation(kb):
+    kb.append_knowledge(ITEMS)
+    kb.query("Stern")
+    other = kf.KnowledgeBaseManager(kb.agent_path)
+    with open(other.log_file_path, "a", encoding="utf-8") as f: # Ohne invalidate, wie ein fremder Prozess
+        f.write('"Noch ein Stern."\n')
+    assert len(kb.query("Stern")) == 2
+
+
+def test_lru_evicts_oldest_entries():
+    cache = kf.QueryCache(max_entries=2)
+    for number in range(3):
+        cache.put("agent", (), ("bm25", 5, str(number)), [{"position": number}])
+    assert cache.get("agent", (), ("bm25", 5, "0")) is None
+    assert cache.get("agent", (), ("bm25", 5, "2")) == [{"position": 2}]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_only_touches_one_agent():
+    cache = kf.QueryCache()
+    cache.put("a", (), ("k",), [])
+    cache.put("b", (), ("k",), [])
+    cache.invalidate("a")
+    assert cache.get("a", (), ("k",)) is None
+    assert cache.get("b", (), ("k",)) == []
+
+
+def test_off_mode_stores_nothing():
+    cache = kf.QueryCache("off")
+    cache.put("a", (), ("k",), [])
+    assert cache.get("a", (), ("k",)) is None
+    with pytest.raises(kf.KnowledgeFlaskException):
+        cache.configure("redis")
+
+
+def test_disk_tier_survives_a_new_process(kb):
+    kb.append_knowledge(ITEMS)
+    kf.QUERY_CACHE.configure("disk")
+    expected = kb.query("Stern")
+    assert os.path.exists(os.path.join(kb.agent_path, kf.QUERY_CACHE_FILE_NAME))
+    kf.QUERY_CACHE._entries.clear() # Wie ein neuer CLI-Aufruf: nur die Platten-Stufe bleibt
+    assert kb.query("Stern") == expected
+    assert kf.QUERY_CACHE.disk_hits == 1
+
+
+def test_sqlite_backend_keeps_disk_cache_per_agent(tmp_path):
+    app = kf.KnowledgeFlask(str(tmp_path / "base"), backend="sqlite")
+    app.create_agent("A")
+    app.add_knowledge("A", "Die Sonne ist ein Stern.")
+    kf.QUERY_CACHE.configure("disk")
+    expected = app.query_knowledge("A", "Stern")
+
+    kf.QUERY_CACHE._entries.clear() # Wie ein neuer CLI-Aufruf: nur die Platten-Stufe bleibt
+    assert app.query_knowledge("A", "Stern") == expected
+    assert kf.QUERY_CACHE.disk_hits == 1
+    cache_dir = app.storage.cache_key("A")
+    assert os.path.exists(os.path.join(cache_dir, kf.QUERY_CACHE_FILE_NAME))
+
+    app.delete_agent("A")
+    assert not os.path.exists(cache_dir)
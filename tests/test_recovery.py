@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import knowledgeflask as kf
+
+
+class Crash(Exception):
+    """Simulierter Absturz mitten in einem Schreibvorgang."""
+
+
+def crash_after(monkeypatch, kb, method_name):
+    """Lässt die Methode noch ausführen und bricht danach ab."""
+    original = getattr(kb, method_name)
+
+    def crashing(*args, **kwargs):
+        original(*args, **kwargs)
+        raise Crash()
+
+    monkeypatch.setattr(kb, method_name, crashing)
+
+
+@pytest.mark.parametrize("method_name", ["_retire_log", "_write_snapshot"]) # Vor bzw. nach der Übernahme des Snapshots
+def test_crash_during_compaction_keeps_items_exactly_once(monkeypatch, kb, method_name):
+    kb.append_knowledge(["eins", "zwei"])
+    kb.compact()
+    kb.append_knowledge(["drei", "vier"])
+    crash_after(monkeypatch, kb, method_name)
+    with pytest.raises(Crash):
+        kb.compact()
+
+    restarted = kf.KnowledgeBaseManager(kb.agent_path)
+    assert restarted.get_knowledge() == ["eins", "zwei", "drei", "vier"]
+    assert restarted.count_knowledge() == 4
+    restarted.append_knowledge(["fünf"])
+    assert restarted.get_knowledge() == ["eins", "zwei", "drei", "vier", "fünf"]
+    assert restarted.verify() == []
+    leftovers = [name for name in os.listdir(kb.agent_path)
+                 if name.endswith(".tmp") or name.startswith(kf.KNOWLEDGE_LOG_FILE_NAME + ".")]
+    assert leftovers == []
+
+
+def test_crash_during_migration_to_json_keeps_log(monkeypatch, kb):
+    kb.append_knowledge(["eins"])
+    kb.migrate_format("binary")
+    kb.append_knowledge(["zwei"])
+
+    def crash(path):
+        raise Crash()
+
+    monkeypatch.setattr(kb, "_remove_file", crash)
+    with pytest.raises(Crash):
+        kb.migrate_format("json") # knowledge.json ist geschrieben, knowledge.bin noch nicht entfernt
+
+    restarted = kf.KnowledgeBaseManager(kb.agent_path)
+    assert restarted.get_knowledge() == ["eins", "zwei"]
+    restarted.migrate_format("json")
+    assert restarted.get_knowledge() == ["eins", "zwei"]
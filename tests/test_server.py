@@ -0,0 +1,66 @@
+import http.client
+import http.server
+import json
+import os
+import threading
+
+import pytest
+
+import knowledgeflask as kf
+
+
+@pytest.fixture
+def server(app, agent):
+    """Server wie in serve() auf einem freien Port, in einem eigenen Thread."""
+    server_class = type("ThreadPoolHTTPServer", (kf.ThreadPoolServerMixin, http.server.HTTPServer), {})
+    handler_class = type("KnowledgeFlaskRequestHandler", (kf.KnowledgeFlaskHandlerMixin, http.server.BaseHTTPRequestHandler), {})
+    httpd = server_class(("127.0.0.1", 0), handler_class, app, kf.AgentCache(app, 64 * 1024 * 1024), 2)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    thread.join()
+    httpd.server_close()
+
+
+def request(server, method, path, body=None):
+    connection = http.client.HTTPConnection(*server.server_address)
+    try:
+        payload = None if body is None else json.dumps(body)
+        connection.request(method, path, payload, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def post_knowledge(server, body):
+    return request(server, "POST", "/agents/A/knowledge", body)
+
+
+@pytest.mark.parametrize("body", [{"items": "abc"}, {"items": None}, {"items": ["ok", 1]}, {"item": 5}])
+def test_post_knowledge_rejects_invalid_items(server, app, body):
+    status, payload = post_knowledge(server, body)
+    assert status == 400 and "error" in payload
+    assert app.get_knowledge("A") == []
+
+
+def test_post_knowledge_adds_items(server, app):
+    assert post_knowledge(server, {"items": ["eins", "zwei", "eins"]}) == (200, {"added": 2, "skipped": 1})
+    assert post_knowledge(server, {"item": "drei"}) == (200, {"added": 1, "skipped": 0})
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("DELETE", "/agents/%2E%2E", None),
+    ("DELETE", "/agents/.", None),
+    ("GET", "/agents/..%2FA/knowledge", None),
+    ("POST", "/agents", {"name": "../B"}),
+    ("POST", "/agents", {"name": ".."}),
+    ("POST", "/agents", {"name": 5}),
+])
+def test_agent_names_cannot_leave_the_agents_directory(server, app, method, path, body):
+    status, payload = request(server, method, path, body)
+    assert status == 400 and "Agentenname" in payload["error"]
+    assert os.path.isdir(app._get_agent_path("A"))
+    assert os.listdir(app.base_dir) == [kf.AGENTS_DIR_NAME]
+    assert app.list_agents() == ["A"]
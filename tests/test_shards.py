@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+import knowledgeflask as kf
+
+ITEMS = [f"eintrag {i} {'apfel' if i % 3 == 0 else 'birne'} {'rot' if i % 5 == 0 else 'gelb'}" for i in range(60)]
+QUERIES = ["apfel", "birne rot", "eintrag 7", "gelb apfel", "fehlt"]
+
+
+def sharded(app, agent, config):
+    """Teilt die Wissensbasis des Agenten auf (ohne Prozesspool) und gibt sie zurück."""
+    return kf.ShardedKnowledgeBase.reshard(app._get_agent_path(agent), config, workers=1)
+
+
+@pytest.mark.parametrize("query_text", QUERIES)
+def test_sharded_query_finds_same_items_as_unsharded(app, agent, kb, query_text):
+    kb.append_knowledge(ITEMS)
+    expected = {hit["item"] for hit in kb.query(query_text, top_k=len(ITEMS))}
+    sharded_kb = sharded(app, agent, {"mode": "hash", "shards": 3})
+    results = sharded_kb.query(query_text, top_k=len(ITEMS))
+    assert {hit["item"] for hit in results} == expected
+    knowledge = sharded_kb.get_knowledge()
+    assert all(hit["item"] == knowledge[hit["position"]] for hit in results)
+
+
+@pytest.mark.parametrize("query_text", QUERIES)
+def test_single_shard_query_matches_unsharded_scores(app, agent, kb, query_text):
+    kb.append_knowledge(ITEMS)
+    expected = [(hit["item"], round(hit["score"], 9)) for hit in kb.query(query_text, top_k=10)]
+    sharded_kb = sharded(app, agent, {"mode": "range", "shard_size": len(ITEMS)})
+    assert [(hit["item"], round(hit["score"], 9)) for hit in sharded_kb.query(query_text, top_k=10)] == expected
+
+
+def test_failed_sharded_rewrite_keeps_previous_shards(monkeypatch, app, agent, kb):
+    kb.append_knowledge(ITEMS)
+    sharded_kb = sharded(app, agent, {"mode": "hash", "shards": 3})
+    before = sharded_kb.get_knowledge()
+
+    def failing_chunk_sources(self, sources):
+        raise OSError("Platte voll")
+
+    monkeypatch.setattr(kf.ShardedKnowledgeBase, "add_chunk_sources", failing_chunk_sources)
+    with pytest.raises(kf.KnowledgeFlaskException):
+        sharded_kb._save_knowledge_to_file(ITEMS[:10]) # Bricht ab, nachdem shards.new gefüllt ist
+    assert sharded_kb.get_knowledge() == before
+
+    monkeypatch.undo()
+    sharded_kb._save_knowledge_to_file(ITEMS[:10])
+    assert sorted(sharded_kb.get_knowledge()) == sorted(ITEMS[:10])
+    assert not os.path.exists(sharded_kb.shards_dir + ".new")
+
+
+@pytest.mark.parametrize("config", [{"mode": "hash", "shards": 3}, {"mode": "range", "shard_size": 25}])
+def test_restore_applies_delta_per_shard(monkeypatch, app, agent, kb, config):
+    kb.append_knowledge(ITEMS)
+    sharded_kb = sharded(app, agent, config)
+    version_id = app.create_version(agent, "Stand")
+    expected = sharded_kb.get_knowledge()
+    sharded_kb.apply_delta(ITEMS[10:20], ["neu 1", "neu 2"])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Shards vollständig neu geschrieben")
+
+    monkeypatch.setattr(kf.ShardedKnowledgeBase, "_save_knowledge_to_file", fail)
+    monkeypatch.setattr(kf.KnowledgeBaseManager, "_save_knowledge_to_file", fail)
+    app.restore_version(agent, version_id)
+    monkeypatch.undo()
+
+    sharded_kb = kf.open_knowledge_base(app._get_agent_path(agent), workers=1)
+    assert sharded_kb.get_knowledge() == expected
+    assert all(shard.verify() == [] for shard in sharded_kb.shards)
+
+
+def test_reshard_commits_config_with_shards(monkeypatch, app, agent, kb):
+    kb.append_knowledge(ITEMS)
+    sharded(app, agent, {"mode": "hash", "shards": 3})
+    agent_path = app._get_agent_path(agent)
+    save_shard_config = kf.save_shard_config
+
+    def crash_after_swap(directory, config):
+        if directory == agent_path:
+            raise OSError("Abbruch nach dem Austausch der Shards")
+        save_shard_config(directory, config)
+
+    monkeypatch.setattr(kf, "save_shard_config", crash_after_swap)
+    with pytest.raises(kf.KnowledgeFlaskException):
+        sharded(app, agent, {"mode": "hash", "shards": 5})
+    monkeypatch.undo()
+
+    sharded_kb = kf.open_knowledge_base(agent_path, workers=1)
+    assert sharded_kb.shard_count == 5
+    assert sorted(sharded_kb.get_knowledge()) == sorted(ITEMS)
+    assert all(shard.verify() == [] for shard in sharded_kb.shards)
+    assert not [name for name in os.listdir(agent_path) if name.endswith(".tmp")]
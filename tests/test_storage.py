@@ -0,0 +1,26 @@
+import pytest
+
+import knowledgeflask as kf
+
+
+def test_storage_backends_must_implement_the_interface():
+    class Incomplete(kf.StorageBackend):
+        name = "unvollständig"
+
+        def location(self, agent_name):
+            return agent_name
+
+    with pytest.raises(TypeError):
+        Incomplete("basis")
+
+
+@pytest.mark.parametrize("backend", sorted(kf.STORAGE_BACKENDS))
+def test_backends_share_agent_and_version_round_trip(tmp_path, backend):
+    app = kf.KnowledgeFlask(str(tmp_path / "base"), backend=backend)
+    app.create_agent("A")
+    app.add_knowledge("A", "eins")
+    version_id = app.create_version("A", "Stand")
+    app.add_knowledge("A", "zwei")
+    app.restore_version("A", version_id)
+    assert app.get_knowledge("A") == ["eins"]
+    assert app.storage.list_agents() == ["A"]
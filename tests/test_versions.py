@@ -0,0 +1,192 @@
+import os
+import random
+import threading
+from contextlib import closing
+
+import pytest
+
+import knowledgeflask as kf
+
+
+def test_garbage_collection_waits_for_snapshot_reusing_chunks(monkeypatch, app, agent, kb):
+    kb.append_knowledge(["eins", "zwei", "drei"])
+    agent_path = app._get_agent_path(agent)
+    old_version = kf.VersionManager(agent_path).create_version("alt")
+
+    chunks_stored = threading.Event()
+    resume = threading.Event()
+    original_store_chunks = kf.VersionManager.store_chunks.__func__
+
+    def paused_store_chunks(cls, object_store, knowledge):
+        chunks = original_store_chunks(cls, object_store, knowledge) # Vorhandene Chunks werden nur referenziert
+        chunks_stored.set()
+        resume.wait(5)
+        return chunks
+
+    monkeypatch.setattr(kf.VersionManager, "store_chunks", classmethod(paused_store_chunks))
+    created = []
+    creator = threading.Thread(target=lambda: created.append(kf.VersionManager(agent_path).create_version("neu")))
+    creator.start()
+    assert chunks_stored.wait(5)
+
+    deleter = threading.Thread(target=kf.VersionManager(agent_path).delete_version, args=(old_version,))
+    deleter.start()
+    deleter.join(0.2)
+    assert deleter.is_alive() # Die Garbage Collection wartet auf das Manifest der neuen Version
+    resume.set()
+    creator.join()
+    deleter.join()
+
+    assert kf.VersionManager(agent_path)._load_version_items(created[0]) == ["eins", "zwei", "drei"]
+
+
+@pytest.mark.parametrize("live", [
+    ["eins", "drei"], # Entferntes Element aus der Mitte
+    ["eins", "zwei", "drei", "vier"], # Später hinzugefügtes Element
+    ["drei", "eins", "fünf"], # Andere Reihenfolge
+])
+def test_restore_reproduces_version_order(app, agent, kb, live):
+    app.append_knowledge(agent, ["eins", "zwei", "drei"])
+    version_id = app.create_version(agent, "Stand")
+    kb._save_knowledge_to_file(live)
+
+    app.restore_version(agent, version_id)
+
+    assert app.get_knowledge(agent) == ["eins", "zwei", "drei"]
+    assert kb.verify() == []
+    assert [result["item"] for result in app.query_knowledge(agent, "zwei")] == ["zwei"]
+
+
+def test_restore_of_removed_tail_keeps_indexes_incremental(app, agent, kb):
+    app.append_knowledge(agent, ["eins", "zwei", "drei"])
+    version_id = app.create_version(agent, "Stand")
+    kb.apply_delta(["zwei", "drei"], [])
+
+    app.restore_version(agent, version_id) # Nur Anhängen: kein Neuaufbau der Indizes
+
+    assert app.get_knowledge(agent) == ["eins", "zwei", "drei"]
+    with closing(kf.InvertedIndex(kb.agent_path)) as index:
+        assert index.is_current(["eins", "zwei", "drei"])
+
+
+@pytest.mark.parametrize("live", [
+    ["eins", "drei", "vier", "fünf"], # Entferntes Element aus der Mitte
+    ["fünf", "eins", "zwei", "vier", "drei"], # Andere Reihenfolge
+])
+def test_restore_inserts_into_indexes_without_rebuild(monkeypatch, app, agent, kb, live):
+    items = ["eins", "zwei", "drei", "vier", "fünf"]
+    app.configure_near_duplicates(agent, "flag")
+    kb._save_knowledge_to_file(items)
+    version_id = app.create_version(agent, "Stand")
+    kb._save_knowledge_to_file(live)
+    kb.query("eins") # Abgeleitete Indizes zum Live-Stand anlegen
+    kb.query("eins", mode="dense")
+    with closing(kf.NearDuplicateIndex(kb.agent_path)) as near_duplicates:
+        near_duplicates.sync(live)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Wissensbasis bzw. Index vollständig neu geschrieben")
+
+    monkeypatch.setattr(kf.KnowledgeBaseManager, "_save_knowledge_to_file", fail)
+    monkeypatch.setattr(kf.InvertedIndex, "rebuild", fail)
+    monkeypatch.setattr(kf.InvertedIndex, "add_documents", fail)
+    monkeypatch.setattr(kf.NearDuplicateIndex, "add_documents", fail)
+    monkeypatch.setattr(kf.EmbeddingIndex, "_create", fail)
+    app.restore_version(agent, version_id)
+    monkeypatch.undo()
+
+    assert app.get_knowledge(agent) == items
+    assert kb.verify() == []
+    with closing(kf.InvertedIndex(kb.agent_path)) as index:
+        assert index.is_current(items)
+        for position, item in enumerate(items):
+            assert index.search(item, 1)[0][0] == position
+    assert kf.EmbeddingIndex.open_existing(kb.agent_path).search("zwei", 1)[0][0] == 1
+    with closing(kf.NearDuplicateIndex(kb.agent_path)) as near_duplicates:
+        assert near_duplicates.item_count == len(items)
+        assert near_duplicates.find("zwei", items.__getitem__)[0] == 1
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_restore_from_shuffled_live_state(app, agent, kb, seed):
+    rng = random.Random(seed)
+    items = [f"eintrag {i}" for i in range(30)]
+    kb._save_knowledge_to_file(items)
+    version_id = app.create_version(agent, "Stand")
+    live = rng.sample(items, 20) + ["neu 1", "neu 2"]
+    rng.shuffle(live)
+    kb._save_knowledge_to_file(live)
+    kb.query("eintrag")
+
+    app.restore_version(agent, version_id)
+
+    assert app.get_knowledge(agent) == items
+    assert kb.verify() == []
+    with closing(kf.InvertedIndex(kb.agent_path)) as index:
+        assert index.is_current(items)
+        assert [position for position, _ in index.search("eintrag 7", 1)] == [7]
+
+
+def test_diff_reads_only_chunks_around_the_change(monkeypatch, app, agent, kb):
+    items = [f"eintrag {i}" for i in range(20 * kf.VERSION_CHUNK_SIZE)]
+    kb.add_knowledge_bulk(items)
+    versions = kf.VersionManager(app._get_agent_path(agent))
+    version_id = versions.create_version("voll")
+    removed = items[len(items) // 2]
+    kb.apply_delta([removed], [])
+
+    chunks, _ = versions._get_chunks(version_id)
+    live_chunks, _ = versions._get_chunks(kf.LIVE_VERSION_ID)
+    assert len(set(chunks) - set(live_chunks)) == 1 # Die folgenden Chunks behalten ihren Hash
+
+    read_items = []
+    original_iter = kf.KnowledgeBaseManager.iter_knowledge
+
+    def counting_iter(self, offset=0, limit=None):
+        for item in original_iter(self, offset, limit):
+            read_items.append(item)
+            yield item
+
+    monkeypatch.setattr(kf.KnowledgeBaseManager, "iter_knowledge", counting_iter)
+    assert versions.diff(version_id, kf.LIVE_VERSION_ID) == {"added": [], "removed": [removed]}
+    assert len(read_items) < len(items) // 2 # Nur geänderte Chunks und der offene letzte Chunk
+
+
+def test_delete_version_commits_catalog_before_removing_directory(monkeypatch, app, agent, kb):
+    kb.append_knowledge(["eins", "zwei"])
+    versions = kf.VersionManager(app._get_agent_path(agent))
+    version_id = versions.create_version("alt")
+
+    def failing_rmtree(path, *args, **kwargs):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(kf.shutil, "rmtree", failing_rmtree)
+    versions.delete_version(version_id) # Das Verzeichnis bleibt liegen, der Katalog ist bereits aktualisiert
+    assert versions.count_versions() == 0
+    assert os.path.isdir(versions._get_version_path(version_id))
+
+    monkeypatch.undo()
+    versions.delete_version(version_id) # Erneutes Löschen räumt das Verzeichnis auf
+    assert not os.path.exists(versions._get_version_path(version_id))
+
+
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_prune_selects_versions_under_the_lock(monkeypatch, app, agent, kb, dry_run):
+    kb.append_knowledge(["eins"])
+    version_manager = kf.VersionManager(app._get_agent_path(agent))
+    for description in ("alt", "mittel", "neu"):
+        version_manager.create_version(description)
+    holders = []
+    select_versions_to_prune = kf.select_versions_to_prune
+
+    def recording_select(versions, policy, version_objects):
+        me = threading.get_ident()
+        holders.append("exklusiv" if version_manager.lock._writer == me else "geteilt" if me in version_manager.lock._readers else None)
+        return select_versions_to_prune(versions, policy, version_objects)
+
+    monkeypatch.setattr(kf, "select_versions_to_prune", recording_select)
+    result = version_manager.prune({"keep_last": 1}, dry_run=dry_run)
+
+    assert holders == ["geteilt" if dry_run else "exklusiv"]
+    assert [version["description"] for version in result["pruned"]] == ["alt", "mittel"]
+    assert len(version_manager.list_versions()) == (3 if dry_run else 1)